@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+# bench_filetypes.py
+#
+# Microbenchmark of file type detection over a synthetic 50k-file listing:
+# mimetypes.guess_type per entry (previous behaviour) against the frozen
+# extension table in filetypes.py.
+#
+# Usage: python benchmarks/bench_filetypes.py [files]
+
+import sys
+import time
+import mimetypes
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(ROOT / "defaults/py_modules"))
+
+from filesystem import FileSystemEntry
+from filetypes import get_file_type
+
+EXTENSIONS = [
+    ".png", ".jpg", ".mp4", ".m4s", ".mpd", ".vdf", ".acf", ".reg", ".dll",
+    ".chd", ".iso", ".sfc", ".txt", ".json", ".pdf", "", ".foz", ".bin",
+]
+
+
+def mimetypes_type(name: str) -> str:
+    mime, _ = mimetypes.guess_type(name)
+    if not mime:
+        return "unknown"
+    return mime.split("/")[0]
+
+
+def bench(label: str, func, names: list[str]):
+    start = time.perf_counter()
+    for name in names:
+        func(name)
+    elapsed = time.perf_counter() - start
+    print(f"{label:<32} {elapsed * 1000:9.1f} ms  {len(names) / elapsed:12.0f} names/s")
+    return elapsed
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 50_000
+    names = [f"file_{i}{EXTENSIONS[i % len(EXTENSIONS)]}" for i in range(count)]
+
+    # Warm up mimetypes' lazy init so it is not counted
+    mimetypes.guess_type("warmup.txt")
+
+    before = bench("mimetypes.guess_type", mimetypes_type, names)
+    after = bench("filetypes.get_file_type", get_file_type, names)
+    print(f"{'speedup':<32} {before / after:9.1f}x")
+
+    entries = [FileSystemEntry(name, "/home/deck/Pictures", False, True, 1024, 0, i) for i, name in enumerate(names)]
+    start = time.perf_counter()
+    for entry in entries:
+        entry.to_dict()
+    elapsed = time.perf_counter() - start
+    print(f"{'to_dict() over the listing':<32} {elapsed * 1000:9.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+# bench_listing_payload.py
+#
+# Payload size and serialisation time of /api/dir/list for a synthetic
+# listing: the default "objects" format against the opt-in "columnar" one.
+#
+# Usage: python benchmarks/bench_listing_payload.py [files]
+
+import sys
+import gzip
+import json
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(ROOT / "defaults/py_modules"))
+
+from filesystem import FileSystemEntry, encode_columnar
+
+DIRECTORY = "/home/deck/.local/share/Steam/steamapps/compatdata/1245620/pfx/drive_c/users/steamuser/Documents"
+EXTENSIONS = [".png", ".jpg", ".mp4", ".m4s", ".vdf", ".dll", ".txt", ".json", ".sav", ""]
+ROUNDS = 5
+
+
+def build_entries(count: int) -> list[FileSystemEntry]:
+    entries = []
+    for i in range(count):
+        if i % 20 == 0:
+            entries.append(FileSystemEntry(f"folder_{i}", DIRECTORY, True, False, 0, 1_700_000_000_000_000_000 + i, i))
+        else:
+            name = f"file_{i:06d}{EXTENSIONS[i % len(EXTENSIONS)]}"
+            entries.append(FileSystemEntry(name, DIRECTORY, False, True, i * 37, 1_700_000_000_000_000_000 + i, i))
+    return entries
+
+
+def measure(label: str, encode) -> tuple[int, int]:
+    best = float("inf")
+    for _ in range(ROUNDS):
+        start = time.perf_counter()
+        payload = json.dumps(encode()).encode()
+        best = min(best, time.perf_counter() - start)
+
+    compressed = len(gzip.compress(payload, 6))
+    print(f"{label:<10} {len(payload) / 1024:10.1f} KiB {compressed / 1024:10.1f} KiB gz {best * 1000:9.1f} ms")
+    return len(payload), compressed
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 50_000
+    entries = build_entries(count)
+
+    print(f"{count} entries, best of {ROUNDS} (encode + json.dumps)")
+    objects = measure("objects", lambda: [e.to_dict(with_items_count=False) for e in entries])
+    columnar = measure("columnar", lambda: encode_columnar(DIRECTORY, entries, with_items_count=False))
+    print(f"{'ratio':<10} {columnar[0] / objects[0]:14.2f} {columnar[1] / objects[1]:17.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+# bench_parallel_zip.py
+#
+# Wall time, CPU time split and peak writer memory of a ZIP download of
+# compressible, many-file folders (saves, shader caches, logs) with the
+# sequential ZipStreamWriter against ParallelZipWriter with 2, 4 and 8
+# workers. "writer cpu" is spent in the server process, "pool cpu" in the
+# workers; on fewer cores than workers the wall time can not improve.
+#
+# Usage: python benchmarks/bench_parallel_zip.py [megabytes] [mode]
+
+import os
+import random
+import resource
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(ROOT / "decky"))
+sys.path.insert(0, str(ROOT / "defaults/py_modules"))
+
+from compressionpolicy import CompressionPolicy
+from filesystem import FileSystemService
+
+
+def make_tree(root: Path, megabytes: int):
+    rng = random.Random(0)
+    words = [rng.randbytes(rng.randint(2, 10)) for _ in range(2000)]
+
+    def data(size: int) -> bytes:
+        out = bytearray()
+        while len(out) < size:
+            out += rng.choice(words)
+        return bytes(out[:size])
+
+    total = megabytes * 1024 * 1024
+    saves = root / "saves"
+    saves.mkdir()
+    # Half in 1000 small files, half in a few large ones
+    for i in range(1000):
+        (saves / f"slot{i}.sav").write_bytes(data(total // 2000))
+    for i in range(4):
+        (saves / f"cache{i}.foz").write_bytes(data(total // 8))
+
+
+def cpu_seconds(who: int) -> float:
+    usage = resource.getrusage(who)
+    return usage.ru_utime + usage.ru_stime
+
+
+def run(label: str, fs: FileSystemService, mode: str, workers: int) -> float:
+    tracemalloc.start()
+    writer_cpu = cpu_seconds(resource.RUSAGE_SELF)
+    pool_cpu = cpu_seconds(resource.RUSAGE_CHILDREN)
+    start = time.perf_counter()
+
+    size = sum(len(chunk) for chunk in fs.stream_zip(["saves"], mode, workers))
+
+    elapsed = time.perf_counter() - start
+    writer_cpu = cpu_seconds(resource.RUSAGE_SELF) - writer_cpu
+    pool_cpu = cpu_seconds(resource.RUSAGE_CHILDREN) - pool_cpu
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    print(
+        f"{label:<12} {elapsed:6.2f} s  {writer_cpu:6.2f} s writer cpu  {pool_cpu:6.2f} s pool cpu"
+        f"  {size / 2**20:7.1f} MB zip  {peak / 2**20:5.1f} MB peak"
+    )
+    return elapsed
+
+
+def main():
+    megabytes = int(sys.argv[1]) if len(sys.argv) > 1 else 256
+    mode = sys.argv[2] if len(sys.argv) > 2 else "balanced"
+    CompressionPolicy(mode)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        make_tree(root, megabytes)
+        fs = FileSystemService(root)
+        print(f"{megabytes} MB of compressible input, {mode}, {os.cpu_count()} CPUs")
+
+        baseline = run("sequential", fs, mode, 1)
+        for workers in (2, 4, 8):
+            elapsed = run(f"{workers} workers", fs, mode, workers)
+            print(f"{'':<12} {baseline / elapsed:6.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+# bench_resolve.py
+#
+# Compares FileSystemService._resolve throughput when the external-mount check
+# spawns lsblk on every call (previous behaviour) against the in-process MountIndex.
+#
+# Usage: python benchmarks/bench_resolve.py [iterations]
+
+import sys
+import time
+import tempfile
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(ROOT / "defaults/py_modules"))
+
+import filesystem
+from filesystem import FileSystemService, get_linux_drives
+
+
+def lsblk_check(path: Path, base_dir: Path) -> bool:
+    allowed_mount_roots = (Path("/mnt"), Path("/media"), Path("/var/media"), Path("/var/mnt"))
+
+    is_external = any(path.is_relative_to(m) for m in allowed_mount_roots) or any(
+        path.is_relative_to(m.path) for m in get_linux_drives() if m.path != Path("/")
+    )
+    is_user_space = path.is_relative_to(base_dir)
+
+    return not (is_external or is_user_space)
+
+
+def run(fs: FileSystemService, paths: list[str], iterations: int) -> float:
+    start = time.perf_counter()
+    for _ in range(iterations):
+        for p in paths:
+            fs._resolve(p)
+    elapsed = time.perf_counter() - start
+    return (iterations * len(paths)) / elapsed
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+
+    with tempfile.TemporaryDirectory() as tmp:
+        base = Path(tmp)
+        for i in range(10):
+            (base / f"dir{i}").mkdir()
+        paths = [f"dir{i}" for i in range(10)]
+        fs = FileSystemService(tmp)
+
+        original = filesystem.is_path_on_linux_root_and_not_external_or_not_user_space
+
+        filesystem.is_path_on_linux_root_and_not_external_or_not_user_space = lsblk_check
+        try:
+            before = run(fs, paths, iterations)
+        finally:
+            filesystem.is_path_on_linux_root_and_not_external_or_not_user_space = original
+
+        after = run(fs, paths, iterations)
+
+    print(f"_resolve with lsblk:      {before:12.1f} paths/s")
+    print(f"_resolve with MountIndex: {after:12.1f} paths/s")
+    print(f"speedup:                  {after / before:12.1f}x")
+
+
+if __name__ == "__main__":
+    main()
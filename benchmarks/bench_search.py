@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+# bench_search.py
+#
+# Builds a synthetic tree (default 200k files in 2k directories), indexes it
+# with SearchIndex and measures query latency per search mode.
+#
+# Usage: python benchmarks/bench_search.py [files]
+
+import sys
+import tempfile
+import time
+import random
+import statistics
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(ROOT / "decky"))
+sys.path.insert(0, str(ROOT / "defaults/py_modules"))
+
+from searchindex import SearchIndex
+
+WORDS = ["zelda", "mario", "metroid", "shader", "cache", "save", "screenshot", "clip", "prefix", "steam", "proton", "config"]
+EXTENSIONS = [".iso", ".rvz", ".png", ".mp4", ".vdf", ".sav", ".txt", ".foz", ".dll", ""]
+QUERIES = [
+    ("substring", "zeld", None),
+    ("substring", "shader_cache", None),
+    ("substring", "sc", None),
+    ("prefix", "metroid", None),
+    ("extension", "iso", None),
+    ("substring", "save", ".sav"),
+]
+ROUNDS = 50
+
+
+def build_tree(root: Path, files: int, per_dir: int = 100):
+    rng = random.Random(0)
+    for i in range(files):
+        if i % per_dir == 0:
+            directory = root / f"{rng.choice(WORDS)}_{i // per_dir}" / f"{rng.choice(WORDS)}"
+            directory.mkdir(parents=True, exist_ok=True)
+        name = f"{rng.choice(WORDS)}_{rng.choice(WORDS)}_{i}{rng.choice(EXTENSIONS)}"
+        (directory / name).touch()
+
+
+def main():
+    files = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+
+    with tempfile.TemporaryDirectory() as tmp:
+        tree = Path(tmp, "tree")
+        start = time.perf_counter()
+        build_tree(tree, files)
+        print(f"tree: {files} files in {time.perf_counter() - start:.1f} s")
+
+        index = SearchIndex(Path(tmp, "index.sqlite3"), lambda: [tree])
+
+        start = time.perf_counter()
+        index.index_all()
+        print(f"initial index: {time.perf_counter() - start:.2f} s")
+
+        start = time.perf_counter()
+        index.index_all()
+        print(f"unchanged rescan: {time.perf_counter() - start:.2f} s")
+
+        print(f"{'mode':<10} {'query':<14} {'ext':<5} {'rows':>5} {'median ms':>10} {'p95 ms':>8}")
+        for mode, query, ext in QUERIES:
+            timings = []
+            for _ in range(ROUNDS):
+                start = time.perf_counter()
+                rows = index.search(query, mode=mode, extension=ext)
+                timings.append((time.perf_counter() - start) * 1000)
+            timings.sort()
+            p95 = timings[int(len(timings) * 0.95) - 1]
+            print(f"{mode:<10} {query:<14} {ext or '':<5} {len(rows):>5} {statistics.median(timings):>10.2f} {p95:>8.2f}")
+
+        index.close()
+
+
+if __name__ == "__main__":
+    main()
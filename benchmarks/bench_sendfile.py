@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+# bench_sendfile.py
+#
+# Throughput and server CPU time of a single-file download over plain HTTP on
+# localhost: the 64 KB read/write loop (previous behaviour), the double-buffered
+# AsyncFileSystemService.read_file used under TLS, and filesend.send_open_file,
+# which hands the copy to sendfile(2).
+# The server runs in its own process so its CPU time is not mixed with the
+# client's.
+#
+# Usage: python benchmarks/bench_sendfile.py [megabytes] [rounds]
+
+import asyncio
+import multiprocessing
+import os
+import socket
+import sys
+import tempfile
+import time
+from contextlib import aclosing
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(ROOT / "decky"))
+sys.path.insert(0, str(ROOT / "defaults/py_modules"))
+
+import aiohttp
+from aiohttp import web
+
+from asyncfs import AsyncFileSystemService
+from filesend import send_open_file
+from filesystem import FileSystemService
+
+
+def serve(root: Path, port: int, ready):
+    fs = FileSystemService(root)
+    afs = AsyncFileSystemService(fs, 4)
+    path = root / "game.iso"
+
+    async def loop_download(request: web.Request):
+        size = path.stat().st_size
+        response = web.StreamResponse(headers={"Content-Length": str(size)})
+        await response.prepare(request)
+        async for chunk in afs.iterate("read", fs.stream_read("game.iso")):
+            await response.write(chunk)
+        await response.write_eof()
+        return response
+
+    async def readahead_download(request: web.Request):
+        size = path.stat().st_size
+        response = web.StreamResponse(headers={"Content-Length": str(size)})
+        await response.prepare(request)
+        with open(path, "rb") as f:
+            async with aclosing(afs.read_file(f, 0, size)) as chunks:
+                async for chunk in chunks:
+                    await response.write(chunk)
+        await response.write_eof()
+        return response
+
+    async def sendfile_download(request: web.Request):
+        size = path.stat().st_size
+        response = web.StreamResponse(headers={"Content-Length": str(size)})
+        await response.prepare(request)
+        with open(path, "rb") as f:
+            await send_open_file(request, response, afs, f, 0, size)
+        await response.write_eof()
+        return response
+
+    async def cpu(request: web.Request):
+        return web.json_response({"cpu": time.process_time()})
+
+    async def main():
+        app = web.Application()
+        app.router.add_get("/loop", loop_download)
+        app.router.add_get("/readahead", readahead_download)
+        app.router.add_get("/sendfile", sendfile_download)
+        app.router.add_get("/cpu", cpu)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        await web.TCPSite(runner, "127.0.0.1", port).start()
+        ready.set()
+        await asyncio.Event().wait()
+
+    asyncio.run(main())
+
+
+async def bench(session: aiohttp.ClientSession, base: str, route: str, rounds: int):
+    cpu_before = (await (await session.get(f"{base}/cpu")).json())["cpu"]
+    start = time.perf_counter()
+    size = 0
+    for _ in range(rounds):
+        async with session.get(f"{base}/{route}") as res:
+            async for chunk in res.content.iter_chunked(1024 * 1024):
+                size += len(chunk)
+    elapsed = time.perf_counter() - start
+    cpu_after = (await (await session.get(f"{base}/cpu")).json())["cpu"]
+
+    megabytes = size / 2**20
+    server_cpu = cpu_after - cpu_before
+    print(f"{route:<10} {megabytes / elapsed:8.1f} MB/s  server CPU {server_cpu:6.2f} s  ({server_cpu / megabytes * 1000:6.2f} ms/MB)")
+
+
+def main():
+    megabytes = int(sys.argv[1]) if len(sys.argv) > 1 else 512
+    rounds = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        block = os.urandom(1024 * 1024)
+        with open(root / "game.iso", "wb") as f:
+            for _ in range(megabytes):
+                f.write(block)
+
+        # Warm the page cache, so both runs measure the copy and not the disk
+        with open(root / "game.iso", "rb") as f:
+            while f.read(1024 * 1024):
+                pass
+
+        with socket.socket() as s:
+            s.bind(("127.0.0.1", 0))
+            port = s.getsockname()[1]
+
+        ready = multiprocessing.Event()
+        server = multiprocessing.Process(target=serve, args=(root, port, ready), daemon=True)
+        server.start()
+        ready.wait()
+
+        async def run():
+            async with aiohttp.ClientSession() as session:
+                base = f"http://127.0.0.1:{port}"
+                print(f"{megabytes} MB file, {rounds} rounds, page cache warm")
+                await bench(session, base, "loop", rounds)
+                await bench(session, base, "readahead", rounds)
+                await bench(session, base, "sendfile", rounds)
+
+        try:
+            asyncio.run(run())
+        finally:
+            server.terminate()
+            server.join()
+
+
+if __name__ == "__main__":
+    main()
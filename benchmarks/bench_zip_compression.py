@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+# bench_zip_compression.py
+#
+# CPU time, throughput and archive size of a ZIP download of a mixed Deck
+# folder (recordings, screenshots, ROMs, logs, configs) under each
+# compression mode, against deflating every member (previous behaviour).
+#
+# Usage: python benchmarks/bench_zip_compression.py [megabytes]
+
+import os
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(ROOT / "decky"))
+sys.path.insert(0, str(ROOT / "defaults/py_modules"))
+
+from compressionpolicy import COMPRESSION_MODES, CompressionPolicy
+from zipstream import ZipStreamWriter
+
+
+def make_tree(root: Path, megabytes: int):
+    rng = random.Random(0)
+    media = root / "media"
+    media.mkdir()
+    words = [b"Resolution", b"VSync", b"true", b"false", b"1280x800", b"[Settings]", b"\n", b"=", b"Proton"]
+
+    def text(size: int) -> bytes:
+        out = bytearray()
+        while len(out) < size:
+            out += rng.choice(words) + b" "
+        return bytes(out[:size])
+
+    unit = megabytes * 1024 * 1024 // 100
+    # ~60% already compressed video and images, 20% compressed ROMs without a
+    # telling extension, 20% text and saves
+    for i in range(6):
+        (media / f"clip{i}.mp4").write_bytes(b"\x00\x00\x00\x18ftypmp42" + os.urandom(8 * unit))
+    for i in range(12):
+        (media / f"shot{i}.jpg").write_bytes(b"\xff\xd8\xff\xe0" + os.urandom(unit))
+    for i in range(4):
+        (media / f"game{i}.rom").write_bytes(os.urandom(5 * unit))
+    for i in range(20):
+        (media / f"log{i}.txt").write_bytes(text(unit // 2))
+    for i in range(10):
+        (media / f"save{i}.sav").write_bytes(text(unit // 2) + os.urandom(unit // 2))
+
+
+class DeflateAll(CompressionPolicy):
+    def choose(self, name: str, head: bytes) -> int | None:
+        return self.level
+
+
+def run(label: str, policy: CompressionPolicy, root: Path):
+    files = [p for p in (root / "media").iterdir()]
+    total = sum(p.stat().st_size for p in files)
+
+    wall = time.perf_counter()
+    cpu = time.process_time()
+    writer = ZipStreamWriter(policy)
+    size = 0
+    for path in files:
+        with open(path, "rb") as f:
+            for chunk in writer.add_file(f, path.name, os.fstat(f.fileno())):
+                size += len(chunk)
+    for chunk in writer.finish():
+        size += len(chunk)
+    cpu = time.process_time() - cpu
+    wall = time.perf_counter() - wall
+
+    print(f"{label:<24} {cpu:7.2f} s cpu  {total / 2**20 / wall:8.1f} MB/s  {size / total * 100:6.1f}% of input")
+
+
+def main():
+    megabytes = int(sys.argv[1]) if len(sys.argv) > 1 else 256
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        make_tree(root, megabytes)
+        print(f"{megabytes} MB of mixed input")
+        run("deflate everything (6)", DeflateAll("balanced"), root)
+        for mode in COMPRESSION_MODES:
+            run(mode, CompressionPolicy(mode), root)
+
+
+if __name__ == "__main__":
+    main()
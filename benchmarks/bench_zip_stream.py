@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+# bench_zip_stream.py
+#
+# Peak Python memory and throughput of a multi-file ZIP download: zipfile
+# into an io.BytesIO (previous behaviour) against the streaming ZipStreamWriter
+# used by FileSystemService.stream_zip.
+#
+# Usage: python benchmarks/bench_zip_stream.py [megabytes]
+
+import io
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+import zipfile
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(ROOT / "decky"))
+sys.path.insert(0, str(ROOT / "defaults/py_modules"))
+
+from filesystem import FileSystemService
+
+
+def make_tree(root: Path, megabytes: int):
+    clips = root / "clips"
+    clips.mkdir()
+    # Half random (video-like), half compressible (logs, saves)
+    block = os.urandom(1024 * 1024)
+    for i in range(megabytes // 8):
+        with open(clips / f"clip{i}.bin", "wb") as f:
+            for j in range(8):
+                f.write(block if j % 2 else bytes(1024 * 1024))
+
+
+def bytesio_zip(root: Path) -> int:
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as z:
+        for file in (root / "clips").rglob("*"):
+            z.write(file, file.relative_to(root))
+    buffer.seek(0)
+    return len(buffer.read())
+
+
+def streaming_zip(root: Path) -> int:
+    fs = FileSystemService(root)
+    return sum(len(chunk) for chunk in fs.stream_zip(["clips"]))
+
+
+def bench(label: str, func, root: Path):
+    tracemalloc.start()
+    start = time.perf_counter()
+    size = func(root)
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    print(f"{label:<24} {size / 2**20:8.1f} MB zip  {peak / 2**20:9.2f} MB peak  {size / 2**20 / elapsed:7.1f} MB/s")
+
+
+def main():
+    megabytes = int(sys.argv[1]) if len(sys.argv) > 1 else 256
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        make_tree(root, megabytes)
+        print(f"{megabytes} MB of input")
+        bench("BytesIO + zipfile", bytesio_zip, root)
+        bench("ZipStreamWriter", streaming_zip, root)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+from bisect import bisect_right
+from typing import Callable, Iterator
+import hashlib
+import zlib
+
+LAYOUT_READ_SIZE = 64 * 1024  # 64 KB
+LAYOUT_WRITE_SIZE = 64 * 1024  # output is coalesced into chunks of about this size
+
+SEGMENT_BYTES = 0
+SEGMENT_FILE = 1
+SEGMENT_GENERATED = 2
+
+# =========================
+# Layout
+# =========================
+
+class Segment:
+    __slots__ = ("kind", "length", "data", "path", "generate")
+
+    def __init__(self, kind: int, length: int, data: bytes = b"", path: str = "", generate: Callable[[], bytes] | None = None):
+        self.kind = kind
+        self.length = length
+        self.data = data
+        self.path = path
+        self.generate = generate
+
+
+class ArchiveLayout:
+    """
+    Byte layout of an archive whose size is known before any file is read:
+    literal bytes (headers, padding), file contents at the size they were
+    listed with, and generated bytes of known length (records that need the
+    CRC of a file). Any byte range of the archive can be regenerated with
+    read(), so a download can be resumed without a temporary file.
+
+    `token` identifies the listing the layout was built from: the same
+    files with the same sizes, mtimes and inodes give the same token.
+    """
+    def __init__(self, content_type: str):
+        self.content_type = content_type
+        self.size = 0
+        self._segments: list[Segment] = []
+        self._offsets: list[int] = []
+        self._crcs: dict[int, int] = {}
+        self._token = hashlib.blake2b(content_type.encode("utf-8"), digest_size=16)
+
+    # ---- Building ----
+    def _add(self, segment: Segment) -> int:
+        self._segments.append(segment)
+        self._offsets.append(self.size)
+        self.size += segment.length
+        return len(self._segments) - 1
+
+    def add_bytes(self, data: bytes):
+        if data:
+            self._add(Segment(SEGMENT_BYTES, len(data), data=data))
+
+    def add_file(self, path: str, size: int) -> int:
+        """
+        Adds `size` bytes of a file and returns its segment id, for file_crc().
+        """
+        return self._add(Segment(SEGMENT_FILE, size, path=path))
+
+    def add_generated(self, length: int, generate: Callable[[], bytes]):
+        self._add(Segment(SEGMENT_GENERATED, length, generate=generate))
+
+    def add_to_token(self, *parts):
+        self._token.update(repr(parts).encode("utf-8", "surrogateescape"))
+
+    @property
+    def token(self) -> str:
+        return self._token.hexdigest()
+
+    # ---- Reading ----
+    def file_crc(self, segment_id: int) -> int:
+        """
+        CRC-32 of a file segment, remembered from an earlier read() that
+        covered all of it or computed now.
+        """
+        if segment_id not in self._crcs:
+            crc = 0
+            for data in self._read_file(self._segments[segment_id], 0, self._segments[segment_id].length):
+                crc = zlib.crc32(data, crc)
+            self._crcs[segment_id] = crc
+        return self._crcs[segment_id]
+
+    def _read_file(self, segment: Segment, start: int, end: int) -> Iterator[bytes]:
+        # A file that shrank or vanished is padded with zeros and one that
+        # grew is cut, so the layout holds
+        position = start
+        try:
+            f = open(segment.path, "rb")
+        except OSError:
+            f = None
+
+        try:
+            if f is not None:
+                f.seek(start)
+            while position < end:
+                data = f.read(min(LAYOUT_READ_SIZE, end - position)) if f is not None else b""
+                if not data:
+                    data = bytes(min(LAYOUT_READ_SIZE, end - position))
+                position += len(data)
+                yield data
+        finally:
+            if f is not None:
+                f.close()
+
+    def read(self, start: int = 0, end: int | None = None) -> Iterator[bytes]:
+        """
+        Yields bytes [start, end) of the archive, `end` defaulting to its size.
+        """
+        end = self.size if end is None else min(end, self.size)
+        buffer = bytearray()
+        index = max(0, bisect_right(self._offsets, start) - 1)
+
+        while index < len(self._segments) and self._offsets[index] < end:
+            segment = self._segments[index]
+            segment_start = self._offsets[index]
+            lo = max(start, segment_start) - segment_start
+            hi = min(end, segment_start + segment.length) - segment_start
+
+            if segment.kind == SEGMENT_BYTES:
+                buffer += segment.data[lo:hi]
+            elif segment.kind == SEGMENT_GENERATED:
+                buffer += segment.generate()[lo:hi]
+            else:
+                # Whole files get their CRC remembered on the way
+                crc = 0 if lo == 0 and hi == segment.length and index not in self._crcs else None
+                for data in self._read_file(segment, lo, hi):
+                    if crc is not None:
+                        crc = zlib.crc32(data, crc)
+                    buffer += data
+                    if len(buffer) >= LAYOUT_WRITE_SIZE:
+                        yield bytes(buffer)
+                        buffer.clear()
+                if crc is not None:
+                    self._crcs[index] = crc
+
+            if len(buffer) >= LAYOUT_WRITE_SIZE:
+                yield bytes(buffer)
+                buffer.clear()
+            index += 1
+
+        if buffer:
+            yield bytes(buffer)
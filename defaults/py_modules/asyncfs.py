@@ -0,0 +1,324 @@
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, AsyncIterator, BinaryIO, Callable
+import asyncio
+import functools
+import os
+import threading
+import time
+from compressionpolicy import DEFAULT_COMPRESSION_MODE
+from filesystem import FileSystemService, FileSystemObject, get_drive_root
+
+DEFAULT_IO_WORKERS = 4
+DEFAULT_STREAM_WORKERS = 4
+
+# File reads are sized to take about READ_TARGET_SECONDS on the device
+MIN_READ_SIZE = 64 * 1024  # 64 KB
+MAX_READ_SIZE = 1024 * 1024  # 1 MB, two of them in memory per response
+READ_TARGET_SECONDS = 0.02
+
+# =========================
+# Stats
+# =========================
+
+class OperationStats:
+    __slots__ = ("count", "errors", "total_time", "max_time", "total_wait")
+
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.total_time = 0.0
+        self.max_time = 0.0
+        self.total_wait = 0.0
+
+    def record(self, wait: float, elapsed: float, failed: bool):
+        self.count += 1
+        self.errors += int(failed)
+        self.total_time += elapsed
+        self.total_wait += wait
+        self.max_time = max(self.max_time, elapsed)
+
+    def to_dict(self) -> dict:
+        count = self.count or 1
+        return {
+            "count": self.count,
+            "errors": self.errors,
+            "avgMs": round(self.total_time / count * 1000, 3),
+            "maxMs": round(self.max_time * 1000, 3),
+            "avgWaitMs": round(self.total_wait / count * 1000, 3),
+        }
+
+
+# =========================
+# Reads
+# =========================
+
+def read_at(f: BinaryIO, size: int, offset: int) -> bytes:
+    """
+    Positional read: does not move the file position, so an open file can
+    be shared by concurrent readers.
+    """
+    if hasattr(os, "pread"):
+        return os.pread(f.fileno(), size, offset)
+    # Windows: no positional read. Open files are not cached there, so not shared
+    f.seek(offset)
+    return f.read(size)
+
+
+def read_size_for(throughput: float) -> int:
+    """
+    Power of two read size that takes about READ_TARGET_SECONDS at
+    `throughput` bytes/s, between MIN_READ_SIZE and MAX_READ_SIZE.
+    """
+    size = MIN_READ_SIZE
+    while size < MAX_READ_SIZE and size * 2 <= throughput * READ_TARGET_SECONDS:
+        size *= 2
+    return size
+
+
+# =========================
+# Async facade
+# =========================
+
+class AsyncFileSystemService:
+    """
+    Async facade over FileSystemService.
+    Every blocking call runs on a dedicated, fixed-size thread pool so a large
+    copy or delete never blocks the event loop (and the other clients).
+    Long-running streams (archives, folder sizes, searches, see iterate())
+    have a pool of their own, so a few of them never hold up listing,
+    rename or delete. Tracks queue depth and per-operation latency, see stats().
+    """
+    def __init__(self, fs: FileSystemService, max_workers: int = DEFAULT_IO_WORKERS, stream_workers: int = DEFAULT_STREAM_WORKERS):
+        self.fs = fs
+        self.max_workers = max_workers
+        self.stream_workers = stream_workers
+
+        self._executor: ThreadPoolExecutor | None = None
+        self._stream_executor: ThreadPoolExecutor | None = None
+        self._lock = threading.Lock()
+        self._queued = 0
+        self._running = 0
+        self._stats: dict[str, OperationStats] = {}
+        # Measured read throughput (bytes/s) by st_dev, see read_file()
+        self._throughput: dict[int, float] = {}
+
+    async def run(self, operation: str, func: Callable, *args, **kwargs) -> Any:
+        """
+        Runs func(*args, **kwargs) on the pool, accounted under `operation`.
+        """
+        return await self._submit(self._pool(), operation, func, args, kwargs)
+
+    async def run_stream(self, operation: str, func: Callable, *args, **kwargs) -> Any:
+        """
+        Like run(), on the pool of long-running streams.
+        """
+        return await self._submit(self._stream_pool(), operation, func, args, kwargs)
+
+    async def _submit(self, executor: ThreadPoolExecutor, operation: str, func: Callable, args: tuple, kwargs: dict) -> Any:
+        submitted = time.monotonic()
+
+        def call():
+            started = time.monotonic()
+            with self._lock:
+                self._queued -= 1
+                self._running += 1
+
+            failed = True
+            try:
+                result = func(*args, **kwargs)
+                failed = False
+                return result
+            finally:
+                elapsed = time.monotonic() - started
+                with self._lock:
+                    self._running -= 1
+                    self._stats.setdefault(operation, OperationStats()).record(started - submitted, elapsed, failed)
+
+        with self._lock:
+            self._queued += 1
+
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(executor, functools.partial(call))
+
+    def _pool(self) -> ThreadPoolExecutor:
+        # Created on first use, so a server started again after shutdown() gets a new one
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="fs-io")
+        return self._executor
+
+    def _stream_pool(self) -> ThreadPoolExecutor:
+        if self._stream_executor is None:
+            self._stream_executor = ThreadPoolExecutor(max_workers=self.stream_workers, thread_name_prefix="fs-stream")
+        return self._stream_executor
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "workers": self.max_workers,
+                "streamWorkers": self.stream_workers,
+                "queued": self._queued,
+                "running": self._running,
+                "operations": {name: s.to_dict() for name, s in self._stats.items()},
+            }
+
+    def shutdown(self):
+        for executor in (self._executor, self._stream_executor):
+            if executor is not None:
+                executor.shutdown(wait=False, cancel_futures=True)
+        self._executor = None
+        self._stream_executor = None
+
+    # ---- Info ----
+    async def get_object(self, path: str) -> FileSystemObject:
+        return await self.run("get_object", self.fs.get_object, path)
+
+    async def open_file(self, path: str):
+        return await self.run("open", self.fs.open_file, path)
+
+    async def resolve_path(self, path: str):
+        return await self.run("resolve_path", self.fs.resolve_path, path)
+
+    async def get_drive_root(self, path):
+        return await self.run("get_drive_root", get_drive_root, path)
+
+    # ---- Directory operations ----
+    async def list_dir(self, path: str):
+        return await self.run("list_dir", self.fs.list_dir, path)
+
+    async def list_dir_page(self, path: str, **kwargs):
+        return await self.run("list_dir_page", self.fs.list_dir_page, path, **kwargs)
+
+    async def count_items(self, paths: list[str]):
+        return await self.run("count_items", self.fs.count_items, paths)
+
+    async def create_dir(self, path: str):
+        return await self.run("create_dir", self.fs.create_dir, path)
+
+    async def delete_dir(self, path: str):
+        return await self.run("delete_dir", self.fs.delete_dir, path)
+
+    # ---- File operations ----
+    async def delete_file(self, path: str):
+        return await self.run("delete_file", self.fs.delete_file, path)
+
+    async def move(self, src: str, dst: str, overwrite: bool = False):
+        return await self.run("move", self.fs.move, src, dst, overwrite)
+
+    async def copy(self, src: str, dst: str, overwrite: bool = False):
+        return await self.run("copy", self.fs.copy, src, dst, overwrite)
+
+    async def rename(self, path: str, new_name: str):
+        return await self.run("rename", self.fs.rename, path, new_name)
+
+    # ---- Streaming ----
+    async def open_write_stream(self, path: str):
+        return await self.run("open_write_stream", self.fs.open_write_stream, path)
+
+    async def stream_zip(self, paths: list[str], compression: str = DEFAULT_COMPRESSION_MODE, workers: int = 1):
+        return await self.run("stream_zip", self.fs.stream_zip, paths, compression, workers)
+
+    async def stream_tar(self, paths: list[str], zstd_level: int | None = None):
+        return await self.run("stream_tar", self.fs.stream_tar, paths, zstd_level)
+
+    async def archive_layout(self, paths: list[str], archive_format: str):
+        return await self.run("archive_layout", self.fs.archive_layout, paths, archive_format)
+
+    async def iterate(self, operation: str, iterator):
+        """
+        Async iteration over a blocking iterator, one next() per call on
+        the stream pool.
+        The next item is produced on the pool while the caller handles the
+        current one (writes it to a socket); only one is read ahead, so a
+        slow client holds the producer back.
+        """
+        sentinel = object()
+        pending = asyncio.ensure_future(self.run_stream(operation, next, iterator, sentinel))
+        try:
+            while True:
+                # Shielded: a cancelled caller must not abandon a next() still running on the pool
+                item = await asyncio.shield(pending)
+                if item is sentinel:
+                    break
+                pending = asyncio.ensure_future(self.run_stream(operation, next, iterator, sentinel))
+                yield item
+        finally:
+            _close_when_done(pending, iterator)
+
+    async def read_file(self, f: BinaryIO, offset: int, count: int) -> AsyncIterator[bytes]:
+        """
+        Yields `count` bytes of an open file from `offset`, double-buffered
+        like iterate(): the next chunk is read on the pool while the current
+        one is sent. Reads are positional and sized from the throughput
+        measured on the file's device, see read_size_for(). Stops early if
+        the file is shorter. Use it with contextlib.aclosing() and close the
+        file after it.
+        """
+        try:
+            device = os.fstat(f.fileno()).st_dev
+        except OSError:
+            device = -1
+
+        def read(size: int, position: int) -> tuple[bytes, float]:
+            started = time.monotonic()
+            data = read_at(f, size, position)
+            return data, time.monotonic() - started
+
+        end = offset + count
+        position = offset
+        size = read_size_for(self._throughput.get(device, 0.0))
+        pending = asyncio.ensure_future(self.run("read", read, min(size, end - position), position)) if position < end else None
+
+        try:
+            while pending is not None:
+                data, elapsed = await asyncio.shield(pending)
+                pending = None
+                if not data:
+                    break
+                position += len(data)
+
+                # Moving average, so one page cache hit does not jump to the largest size
+                if elapsed > 0 and len(data) >= MIN_READ_SIZE:
+                    previous = self._throughput.get(device)
+                    measured = len(data) / elapsed
+                    self._throughput[device] = measured if previous is None else 0.7 * previous + 0.3 * measured
+                    size = read_size_for(self._throughput[device])
+
+                if position < end:
+                    pending = asyncio.ensure_future(self.run("read", read, min(size, end - position), position))
+                yield data
+        finally:
+            if pending is not None:
+                # Let the read still running on the pool finish before the caller closes the file
+                try:
+                    await pending
+                except Exception:
+                    pass
+
+
+def _retrieve_exception(future: asyncio.Future):
+    if not future.cancelled():
+        future.exception()
+
+
+def _close_when_done(pending: asyncio.Future, iterator):
+    """
+    Closes `iterator` once no next() call on it is running: a generator can
+    not be closed while it executes on the pool.
+    """
+    close = getattr(iterator, "close", None)
+    if close is None:
+        pending.add_done_callback(_retrieve_exception)
+        return
+
+    def close_iterator(future: asyncio.Future):
+        _retrieve_exception(future)
+        try:
+            close()
+        except ValueError:
+            # Generator still running in the pool
+            pass
+
+    if pending.done():
+        close_iterator(pending)
+    else:
+        pending.add_done_callback(close_iterator)
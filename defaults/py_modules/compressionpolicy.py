@@ -0,0 +1,134 @@
+from types import MappingProxyType
+import zlib
+from filetypes import get_extension
+
+COMPRESSION_MODES = ("store", "fastest", "balanced", "smallest")
+DEFAULT_COMPRESSION_MODE = "balanced"
+PROBE_SIZE = 64 * 1024  # 64 KB
+MIN_COMPRESS_SIZE = 64  # deflate overhead outweighs any gain below this
+
+# =========================
+# Known compressed formats
+# =========================
+# Deflating these costs CPU and saves well under 1%, so they are stored.
+
+STORED_EXTENSIONS = frozenset({
+    # Video, including Steam game recordings (DASH)
+    ".mp4", ".m4v", ".m4s", ".mkv", ".webm", ".mov", ".avi",
+    # Images
+    ".jpg", ".jpeg", ".png", ".gif", ".webp", ".avif", ".heic",
+    # Audio
+    ".mp3", ".flac", ".ogg", ".opus", ".m4a", ".aac",
+    # Archives
+    ".zip", ".7z", ".rar", ".gz", ".tgz", ".bz2", ".xz", ".zst", ".lz4", ".jar", ".apk",
+    # Compressed ROM and disc images
+    ".chd", ".cso", ".rvz", ".pbp",
+    # Fonts
+    ".woff", ".woff2",
+})
+
+# (offset, magic) for files whose extension does not tell
+_MAGIC_NUMBERS = (
+    (0, b"PK\x03\x04"),  # zip, jar, apk
+    (0, b"7z\xbc\xaf\x27\x1c"),
+    (0, b"Rar!\x1a\x07"),
+    (0, b"\x1f\x8b"),  # gzip
+    (0, b"BZh"),
+    (0, b"\xfd7zXZ\x00"),
+    (0, b"\x28\xb5\x2f\xfd"),  # zstd
+    (0, b"\x04\x22\x4d\x18"),  # lz4
+    (0, b"MComprHD"),  # chd
+    (0, b"\x89PNG\r\n\x1a\n"),
+    (0, b"\xff\xd8\xff"),  # jpeg
+    (0, b"GIF8"),
+    (0, b"\x1a\x45\xdf\xa3"),  # matroska, webm
+    (0, b"OggS"),
+    (0, b"fLaC"),
+    (0, b"ID3"),  # mp3
+    (4, b"ftyp"),  # mp4, mov, m4a, heic, avif
+)
+
+
+def is_compressed_format(name: str, head: bytes) -> bool:
+    """
+    Whether a file is already compressed, by extension or by the magic
+    number at the start of `head`.
+    """
+    if get_extension(name) in STORED_EXTENSIONS:
+        return True
+    return any(head.startswith(magic, offset) for offset, magic in _MAGIC_NUMBERS)
+
+
+# =========================
+# Policy
+# =========================
+
+class CompressionMode:
+    """
+    level: deflate level.
+    probe_level: deflate level of the compressibility probe.
+    max_ratio: files whose probe does not shrink below this ratio are stored.
+    """
+    __slots__ = ("level", "probe_level", "max_ratio")
+
+    def __init__(self, level: int, probe_level: int, max_ratio: float):
+        self.level = level
+        self.probe_level = probe_level
+        self.max_ratio = max_ratio
+
+
+_MODES = MappingProxyType({
+    # Nothing is deflated: the archive size is known up front, see zip_store_layout()
+    "store": CompressionMode(level=0, probe_level=0, max_ratio=0.0),
+    "fastest": CompressionMode(level=1, probe_level=1, max_ratio=0.90),
+    "balanced": CompressionMode(level=6, probe_level=1, max_ratio=0.95),
+    "smallest": CompressionMode(level=9, probe_level=6, max_ratio=0.99),
+})
+
+
+# zstd levels of tar.zst downloads, for the same modes
+ZSTD_LEVELS = MappingProxyType({
+    "store": 1,
+    "fastest": 1,
+    "balanced": 3,
+    "smallest": 9,
+})
+
+
+class CompressionPolicy:
+    """
+    Picks the compression of each archive member from its name and first
+    block: known compressed formats are stored, anything else is deflated
+    if a quick deflate of the first PROBE_SIZE bytes shrinks it enough.
+    """
+    def __init__(self, mode: str = DEFAULT_COMPRESSION_MODE):
+        if mode not in _MODES:
+            raise ValueError(f"Invalid compression mode: {mode}")
+        self.mode = mode
+        self._mode = _MODES[mode]
+
+    @property
+    def level(self) -> int:
+        return self._mode.level
+
+    def choose(self, name: str, head: bytes) -> int | None:
+        """
+        Returns the deflate level for a member, or None to store it.
+        `head` is its first block, up to PROBE_SIZE bytes.
+        """
+        mode = self._mode
+
+        if mode.level == 0:
+            return None
+        if len(head) < MIN_COMPRESS_SIZE:
+            return None
+        if is_compressed_format(name, head):
+            return None
+
+        probe = head[:PROBE_SIZE]
+        compressor = zlib.compressobj(mode.probe_level, zlib.DEFLATED, -15)
+        compressed = len(compressor.compress(probe)) + len(compressor.flush())
+        if compressed > len(probe) * mode.max_ratio:
+            return None
+
+        return mode.level
@@ -0,0 +1,235 @@
+from fnmatch import fnmatch
+from pathlib import Path
+from typing import Iterator
+import mmap
+import os
+import queue
+import re
+import threading
+from utils import process_pool_context, init_background_worker
+
+DEFAULT_GREP_WORKERS = min(4, os.cpu_count() or 1)
+DEFAULT_MAX_MATCHES = 1000
+MAX_MATCHES_PER_FILE = 100
+MAX_GREP_FILE_SIZE = 256 * 1024 * 1024  # 256 MB
+BINARY_SNIFF_BYTES = 8192
+SNIPPET_BEFORE = 80
+SNIPPET_AFTER = 160
+GREP_BATCH_FILES = 8
+GREP_POLL_SECONDS = 0.25
+GREP_BATCHES_PER_WORKER = 2
+
+
+# =========================
+# Worker
+# =========================
+
+def grep_file(task: tuple[str, bytes, int]) -> tuple[str, list[tuple[int, str]], str | None]:
+    """
+    Runs in a pool process. Matches `pattern` against the mmap'ed file, so
+    files without matches are scanned in place, never copied into Python.
+    Returns (path, [(line number, snippet)], error). Binary files (a NUL byte
+    in the first 8 KB, like grep -I) and empty files are skipped.
+    """
+    path, pattern, flags = task
+    matches = []
+
+    try:
+        with open(path, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            if size == 0 or size > MAX_GREP_FILE_SIZE:
+                return path, matches, None
+
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                if mm.find(b"\0", 0, BINARY_SNIFF_BYTES) != -1:
+                    return path, matches, None
+
+                regex = re.compile(pattern, flags)
+                line = 1
+                counted = 0
+                last_line_start = -1
+
+                for m in regex.finditer(mm):
+                    start = m.start()
+                    line_start = mm.rfind(b"\n", 0, start) + 1
+
+                    # One result per line
+                    if line_start == last_line_start:
+                        continue
+                    last_line_start = line_start
+
+                    line += mm[counted:line_start].count(b"\n")
+                    counted = line_start
+
+                    line_end = mm.find(b"\n", start)
+                    if line_end == -1:
+                        line_end = size
+
+                    snippet = mm[max(line_start, start - SNIPPET_BEFORE):min(line_end, start + SNIPPET_AFTER)]
+                    matches.append((line, snippet.decode("utf-8", errors="replace").rstrip("\r")))
+
+                    if len(matches) >= MAX_MATCHES_PER_FILE:
+                        break
+    except (OSError, ValueError) as e:
+        return path, matches, str(e)
+
+    return path, matches, None
+
+
+def grep_files(task: tuple[list[str], bytes, int]) -> list[tuple[str, list[tuple[int, str]], str | None]]:
+    """
+    grep_file over a batch of paths, to amortize the pool round-trip.
+    """
+    paths, pattern, flags = task
+    return [grep_file((path, pattern, flags)) for path in paths]
+
+
+# =========================
+# Content Search
+# =========================
+
+def compile_pattern(pattern: str, regex: bool = False, ignore_case: bool = False) -> tuple[bytes, int]:
+    """
+    Validates a search pattern and returns its (bytes pattern, flags) form.
+    Raises re.error for an invalid regex.
+    """
+    if not pattern:
+        raise ValueError("Pattern is required")
+
+    raw = os.fsencode(pattern)
+    if not regex:
+        raw = re.escape(raw)
+
+    flags = re.MULTILINE | (re.IGNORECASE if ignore_case else 0)
+    re.compile(raw, flags)
+    return raw, flags
+
+
+class ContentSearch:
+    """
+    grep over a directory tree with a process pool. Files are matched as
+    they are found and results() yields them as soon as a worker is done:
+        {"event": "matches", "path": ..., "matches": [{"line": n, "text": ...}]}
+        {"event": "progress", "files": n, "matches": n}
+        {"event": "end", "files": n, "matches": n, "errors": n, "truncated": bool}
+    A progress event is yielded every GREP_POLL_SECONDS without a finished
+    batch, so the caller's thread is never held until a match turns up.
+    cancel() stops the walk and terminates the workers.
+    """
+    def __init__(
+        self,
+        root: str | Path,
+        pattern: str,
+        regex: bool = False,
+        ignore_case: bool = False,
+        include: str | None = None,
+        max_matches: int = DEFAULT_MAX_MATCHES,
+        workers: int = DEFAULT_GREP_WORKERS,
+    ):
+        self.root = str(root)
+        self.pattern, self.flags = compile_pattern(pattern, regex, ignore_case)
+        self.include = include or None
+        self.max_matches = max(1, int(max_matches))
+        self.workers = workers
+
+        self._cancelled = threading.Event()
+
+    def cancel(self):
+        self._cancelled.set()
+
+    def _tasks(self) -> Iterator[tuple[list[str], bytes, int]]:
+        # Consumed lazily by results(), a few batches ahead of the workers
+        stack = [self.root]
+        batch = []
+
+        while stack and not self._cancelled.is_set():
+            directory = stack.pop()
+            try:
+                with os.scandir(directory) as it:
+                    for entry in it:
+                        try:
+                            if entry.is_dir(follow_symlinks=False):
+                                stack.append(entry.path)
+                            elif entry.is_file(follow_symlinks=False):
+                                if self.include is None or fnmatch(entry.name.lower(), self.include.lower()):
+                                    batch.append(entry.path)
+                        except OSError:
+                            continue
+
+                        if len(batch) >= GREP_BATCH_FILES:
+                            yield batch, self.pattern, self.flags
+                            batch = []
+            except OSError:
+                continue
+
+        if batch and not self._cancelled.is_set():
+            yield batch, self.pattern, self.flags
+
+    def results(self) -> Iterator[dict]:
+        pool = process_pool_context().Pool(self.workers, initializer=init_background_worker)
+        files = 0
+        total = 0
+        errors = 0
+        truncated = False
+
+        done = queue.SimpleQueue()
+        tasks = self._tasks()
+        max_in_flight = max(1, self.workers) * GREP_BATCHES_PER_WORKER
+        in_flight = 0
+        walking = True
+
+        try:
+            while not truncated:
+                if self._cancelled.is_set():
+                    return
+
+                # Keep a bounded window of batches queued on the pool
+                while walking and in_flight < max_in_flight:
+                    task = next(tasks, None)
+                    if task is None:
+                        walking = False
+                        break
+                    pool.apply_async(grep_files, (task,), callback=done.put, error_callback=lambda e: done.put(None))
+                    in_flight += 1
+
+                if not in_flight:
+                    break
+
+                try:
+                    batch = done.get(timeout=GREP_POLL_SECONDS)
+                except queue.Empty:
+                    yield {"event": "progress", "files": files, "matches": total}
+                    continue
+
+                in_flight -= 1
+                if batch is None:
+                    errors += 1
+                    continue
+
+                for path, matches, error in batch:
+                    if self._cancelled.is_set():
+                        return
+
+                    files += 1
+                    errors += int(error is not None)
+                    if not matches:
+                        continue
+
+                    matches = matches[:self.max_matches - total]
+                    total += len(matches)
+
+                    yield {
+                        "event": "matches",
+                        "path": path,
+                        "matches": [{"line": line, "text": text} for line, text in matches],
+                    }
+
+                    if total >= self.max_matches:
+                        truncated = True
+                        break
+
+            yield {"event": "end", "files": files, "matches": total, "errors": errors, "truncated": truncated}
+        finally:
+            self._cancelled.set()
+            pool.terminate()
+            pool.join()
@@ -0,0 +1,281 @@
+from concurrent.futures import ThreadPoolExecutor, Future, wait, FIRST_COMPLETED
+from pathlib import Path
+from typing import Iterator
+import json
+import os
+import sqlite3
+import threading
+import time
+
+DEFAULT_SIZE_WORKERS = 4
+PROGRESS_INTERVAL_SECONDS = 0.25
+
+# =========================
+# Records
+# =========================
+
+class DirRecord:
+    """
+    Size of the files directly inside a directory, plus its subdirectory names.
+    Valid for as long as the directory's (st_ino, st_mtime_ns) does not change.
+    """
+    __slots__ = ("ino", "mtime_ns", "size", "allocated", "files", "subdirs")
+
+    def __init__(self, ino: int, mtime_ns: int, size: int, allocated: int, files: int, subdirs: tuple[str, ...]):
+        self.ino = ino
+        self.mtime_ns = mtime_ns
+        self.size = size
+        self.allocated = allocated
+        self.files = files
+        self.subdirs = subdirs
+
+    def matches(self, st: os.stat_result) -> bool:
+        return self.ino == st.st_ino and self.mtime_ns == st.st_mtime_ns
+
+
+def scan_directory(path: str, device: int, cached: DirRecord | None) -> tuple[DirRecord | None, bool]:
+    """
+    Returns the record of a single directory and whether it came from `cached`.
+    Symlinks are not followed and mount points are not crossed (like du -x).
+    Returns (None, False) if the directory can't be read.
+    """
+    try:
+        st = os.stat(path, follow_symlinks=False)
+    except OSError:
+        return None, False
+
+    if cached is not None and cached.matches(st):
+        return cached, True
+
+    size = 0
+    allocated = 0
+    files = 0
+    subdirs = []
+
+    try:
+        with os.scandir(path) as it:
+            for entry in it:
+                try:
+                    entry_st = entry.stat(follow_symlinks=False)
+                except OSError:
+                    continue
+
+                if entry.is_dir(follow_symlinks=False):
+                    if entry_st.st_dev == device:
+                        subdirs.append(entry.name)
+                    continue
+
+                size += entry_st.st_size
+                # st_blocks is not available on Windows
+                allocated += getattr(entry_st, "st_blocks", 0) * 512
+                files += 1
+    except OSError:
+        return None, False
+
+    # mtime from before the scan: a change while scanning forces a rescan next time
+    return DirRecord(st.st_ino, st.st_mtime_ns, size, allocated, files, tuple(subdirs)), False
+
+
+# =========================
+# Persistent cache
+# =========================
+
+class DirSizeStore:
+    """
+    SQLite store of DirRecord by absolute directory path.
+    The connection is opened on first use and shared between threads.
+    """
+    def __init__(self, db_path: str | Path):
+        self.db_path = Path(db_path)
+        self._conn: sqlite3.Connection | None = None
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.db_path.parent.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS dirs (
+                    path TEXT PRIMARY KEY,
+                    ino INTEGER NOT NULL,
+                    mtime_ns INTEGER NOT NULL,
+                    size INTEGER NOT NULL,
+                    allocated INTEGER NOT NULL,
+                    files INTEGER NOT NULL,
+                    subdirs TEXT NOT NULL
+                )
+            """)
+            self._conn.commit()
+        return self._conn
+
+    def load_tree(self, root: str) -> dict[str, DirRecord]:
+        """
+        Records of `root` and every directory below it.
+        """
+        prefix = root.rstrip(os.sep) + os.sep
+        # Range scan on the primary key instead of LIKE, which would need escaping
+        upper = prefix[:-1] + chr(ord(os.sep) + 1)
+
+        with self._lock:
+            rows = self._connect().execute(
+                "SELECT path, ino, mtime_ns, size, allocated, files, subdirs FROM dirs "
+                "WHERE path = ? OR (path >= ? AND path < ?)",
+                (root, prefix, upper),
+            ).fetchall()
+
+        return {
+            path: DirRecord(ino, mtime_ns, size, allocated, files, tuple(json.loads(subdirs)))
+            for path, ino, mtime_ns, size, allocated, files, subdirs in rows
+        }
+
+    def save_tree(self, root: str, records: dict[str, DirRecord], stale: list[str]):
+        with self._lock:
+            conn = self._connect()
+            with conn:
+                conn.executemany("DELETE FROM dirs WHERE path = ?", ((p,) for p in stale))
+                conn.executemany(
+                    "INSERT OR REPLACE INTO dirs VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (
+                        (path, r.ino, r.mtime_ns, r.size, r.allocated, r.files, json.dumps(r.subdirs))
+                        for path, r in records.items()
+                    ),
+                )
+
+    def delete(self, path: str):
+        with self._lock:
+            if self._conn is None and not self.db_path.exists():
+                return
+            conn = self._connect()
+            with conn:
+                conn.execute("DELETE FROM dirs WHERE path = ?", (path,))
+
+    def count(self) -> int:
+        with self._lock:
+            return self._connect().execute("SELECT COUNT(*) FROM dirs").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+# =========================
+# Directory Size Service
+# =========================
+
+class DirectorySizeService:
+    """
+    Recursive folder sizes (du). Directories are scanned in parallel by a
+    scandir pool; each one's own file total is cached on disk keyed by its
+    inode and mtime, so a repeated walk only stats unchanged directories and
+    re-scans the ones that changed.
+
+    The mtime of a directory does not change when a file inside it is
+    rewritten in place, so the server reports its own writes with invalidate()
+    and `refresh=True` forces a full walk.
+    """
+    def __init__(self, db_path: str | Path, max_workers: int = DEFAULT_SIZE_WORKERS):
+        self.store = DirSizeStore(db_path)
+        self.max_workers = max_workers
+        self._executor: ThreadPoolExecutor | None = None
+        self._lock = threading.Lock()
+
+    def invalidate(self, path: str | Path):
+        """
+        Forgets the record of the directory containing `path`.
+        """
+        self.store.delete(str(Path(path).parent))
+
+    def walk(
+        self,
+        directory: str | Path,
+        refresh: bool = False,
+        progress_interval: float = PROGRESS_INTERVAL_SECONDS,
+        cancel: threading.Event | None = None,
+    ) -> Iterator[dict]:
+        """
+        Yields running totals at most every `progress_interval` seconds while
+        the walk runs, then the final result with "done": True and the total of
+        each immediate subdirectory in "children".
+        """
+        root = str(directory)
+        device = os.stat(root).st_dev
+        cached = self.store.load_tree(root)
+
+        totals = {"size": 0, "allocated": 0, "files": 0, "dirs": 0, "reused": 0, "errors": 0}
+        children: dict[str, int] = {}
+        records: dict[str, DirRecord] = {}
+        pending: dict[Future, tuple[str, str | None]] = {}
+
+        def submit(path: str, child: str | None):
+            future = self._pool().submit(scan_directory, path, device, None if refresh else cached.get(path))
+            pending[future] = (path, child)
+
+        submit(root, None)
+        last_progress = time.monotonic()
+        complete = False
+
+        try:
+            while pending:
+                if cancel is not None and cancel.is_set():
+                    return
+
+                done, _ = wait(pending, timeout=progress_interval, return_when=FIRST_COMPLETED)
+
+                for future in done:
+                    path, child = pending.pop(future)
+                    record, reused = future.result()
+
+                    if record is None:
+                        totals["errors"] += 1
+                        continue
+
+                    records[path] = record
+                    totals["size"] += record.size
+                    totals["allocated"] += record.allocated
+                    totals["files"] += record.files
+                    totals["dirs"] += 1
+                    totals["reused"] += int(reused)
+
+                    if child is not None:
+                        children[child] = children.get(child, 0) + record.size
+
+                    for name in record.subdirs:
+                        subdir = os.path.join(path, name)
+                        if child is None:
+                            children.setdefault(name, 0)
+                        submit(subdir, child if child is not None else name)
+
+                now = time.monotonic()
+                if pending and now - last_progress >= progress_interval:
+                    last_progress = now
+                    yield {"done": False, **totals}
+
+            complete = True
+            yield {"done": True, **totals, "children": children}
+        finally:
+            for future in pending:
+                future.cancel()
+
+            # Records of a cancelled walk are still valid, but only a complete
+            # walk knows which cached directories no longer exist
+            stale = [path for path in cached if path not in records] if complete else []
+            self.store.save_tree(root, records, stale)
+
+    def _pool(self) -> ThreadPoolExecutor:
+        # Walks run on the I/O pool, several may start at once
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="dir-size")
+            return self._executor
+
+    def shutdown(self):
+        """
+        Stops the scandir pool and closes the store; both come back on the next walk.
+        """
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+        self.store.close()
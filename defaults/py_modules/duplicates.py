@@ -0,0 +1,383 @@
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Iterator
+import hashlib
+import multiprocessing
+import os
+import sqlite3
+import threading
+from filesystem import FileSystemEntry
+from utils import process_pool_context, init_background_worker
+
+PARTIAL_HASH_BYTES = 64 * 1024  # head and tail
+HASH_READ_SIZE = 1024 * 1024
+DEFAULT_MIN_DUPLICATE_SIZE = 1
+DEFAULT_PARTIAL_WORKERS = 4
+DEFAULT_HASH_WORKERS = min(4, os.cpu_count() or 1)
+DUPLICATES_POLL_SECONDS = 0.25
+PROGRESS_EVERY_FILES = 256
+
+
+# =========================
+# Hashing
+# =========================
+
+def _new_hash():
+    return hashlib.blake2b(digest_size=16)
+
+def partial_hash(path: str, size: int) -> bytes:
+    """
+    Hash of the first and last 64 KB. For files up to 128 KB this reads the
+    whole file, so it is also the full hash.
+    """
+    h = _new_hash()
+    with open(path, "rb") as f:
+        if size <= 2 * PARTIAL_HASH_BYTES:
+            h.update(f.read())
+        else:
+            h.update(f.read(PARTIAL_HASH_BYTES))
+            f.seek(size - PARTIAL_HASH_BYTES)
+            h.update(f.read(PARTIAL_HASH_BYTES))
+    return h.digest()
+
+def full_hash(path: str) -> tuple[str, bytes | None]:
+    """
+    Runs in a pool process. Returns (path, digest), digest None if unreadable.
+    """
+    h = _new_hash()
+    buffer = bytearray(HASH_READ_SIZE)
+    view = memoryview(buffer)
+
+    try:
+        with open(path, "rb", buffering=0) as f:
+            while n := f.readinto(buffer):
+                h.update(view[:n])
+    except OSError:
+        return path, None
+
+    return path, h.digest()
+
+
+# =========================
+# Persistent cache
+# =========================
+
+class HashStore:
+    """
+    SQLite cache of partial and full hashes. A row is only trusted while the
+    file's (st_dev, st_ino, size, mtime_ns) is unchanged.
+    """
+    def __init__(self, db_path: str | Path):
+        self.db_path = Path(db_path)
+        self._conn: sqlite3.Connection | None = None
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.db_path.parent.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS hashes (
+                    dev INTEGER NOT NULL,
+                    ino INTEGER NOT NULL,
+                    size INTEGER NOT NULL,
+                    mtime_ns INTEGER NOT NULL,
+                    partial BLOB,
+                    full BLOB,
+                    PRIMARY KEY (dev, ino)
+                )
+            """)
+            self._conn.commit()
+        return self._conn
+
+    def get(self, keys: list[tuple[int, int, int, int]]) -> dict[tuple, tuple[bytes | None, bytes | None]]:
+        """
+        (dev, ino, size, mtime_ns) -> (partial, full) for the keys still valid.
+        """
+        found = {}
+        with self._lock:
+            conn = self._connect()
+            for key in keys:
+                row = conn.execute(
+                    "SELECT partial, full FROM hashes WHERE dev = ? AND ino = ? AND size = ? AND mtime_ns = ?",
+                    key,
+                ).fetchone()
+                if row:
+                    found[key] = row
+        return found
+
+    def put(self, rows: dict[tuple[int, int, int, int], tuple[bytes | None, bytes | None]]):
+        with self._lock:
+            conn = self._connect()
+            with conn:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO hashes VALUES (?, ?, ?, ?, ?, ?)",
+                    (key + value for key, value in rows.items()),
+                )
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+# =========================
+# Duplicate Finder
+# =========================
+
+def _listing_items(paths: list[str]) -> list[dict]:
+    # Same shape as /api/dir/list entries, so the web UI can render them
+    items = []
+    for path in paths:
+        try:
+            entry = FileSystemEntry.from_path(os.path.dirname(path), os.path.basename(path))
+        except OSError:
+            continue
+        items.append(entry.to_dict(with_items_count=False))
+    return items
+
+
+class FileRecord:
+    __slots__ = ("path", "key", "partial", "full")
+
+    def __init__(self, path: str, key: tuple[int, int, int, int]):
+        self.path = path
+        self.key = key  # (st_dev, st_ino, size, mtime_ns)
+        self.partial: bytes | None = None
+        self.full: bytes | None = None
+
+    @property
+    def size(self) -> int:
+        return self.key[2]
+
+
+class DuplicateFinder:
+    """
+    Finds duplicate files below a directory in stages, each one only looking
+    at what the previous one could not tell apart:
+      1. bucket by size (hard links to the same inode count once)
+      2. hash the first and last 64 KB on a thread pool
+      3. fully hash the remaining candidates on a process pool
+    Hashes are cached in `store`, so a repeat scan only hashes changed files.
+
+    results() yields:
+        {"event": "progress", "stage": "scan" | "partial" | "full", "done": n, "total": n}
+        {"event": "group", "size": n, "paths": [...], "items": [listing entries], "reclaimable": n}
+        {"event": "end", "files": n, "groups": n, "reclaimable": n, "hashed": n, "cached": n}
+    """
+    def __init__(
+        self,
+        root: str | Path,
+        store: HashStore,
+        min_size: int = DEFAULT_MIN_DUPLICATE_SIZE,
+        partial_workers: int = DEFAULT_PARTIAL_WORKERS,
+        hash_workers: int = DEFAULT_HASH_WORKERS,
+    ):
+        self.root = str(root)
+        self.store = store
+        self.min_size = max(1, int(min_size))
+        self.partial_workers = partial_workers
+        self.hash_workers = hash_workers
+
+        self.files = 0
+        self.groups = 0
+        self.reclaimable = 0
+        self.hashed = 0
+        self.cached = 0
+        self._cancelled = threading.Event()
+
+    def cancel(self):
+        self._cancelled.set()
+
+    # ---- Stage 1 ----
+    def _scan(self) -> Iterator[dict | list[FileRecord]]:
+        """
+        Yields progress events, then the size buckets with more than one inode.
+        """
+        by_size: dict[int, dict[tuple[int, int], FileRecord]] = {}
+        stack = [self.root]
+        files = 0
+
+        while stack:
+            if self._cancelled.is_set():
+                return
+
+            directory = stack.pop()
+            try:
+                with os.scandir(directory) as it:
+                    for entry in it:
+                        try:
+                            if entry.is_dir(follow_symlinks=False):
+                                stack.append(entry.path)
+                                continue
+                            if not entry.is_file(follow_symlinks=False):
+                                continue
+                            st = entry.stat(follow_symlinks=False)
+                        except OSError:
+                            continue
+
+                        if st.st_size < self.min_size:
+                            continue
+
+                        key = (st.st_dev, st.st_ino, st.st_size, st.st_mtime_ns)
+                        # setdefault: hard links keep the first path seen
+                        by_size.setdefault(st.st_size, {}).setdefault((st.st_dev, st.st_ino), FileRecord(entry.path, key))
+
+                        files += 1
+                        if files % PROGRESS_EVERY_FILES == 0:
+                            yield {"event": "progress", "stage": "scan", "done": files, "total": None}
+            except OSError:
+                continue
+
+        self.files = files
+        yield [list(bucket.values()) for bucket in by_size.values() if len(bucket) > 1]
+
+    # ---- Stage 2 ----
+    def _partial_hashes(self, records: list[FileRecord]) -> Iterator[dict]:
+        todo = [r for r in records if r.partial is None]
+
+        def work(record: FileRecord):
+            try:
+                record.partial = partial_hash(record.path, record.size)
+            except OSError:
+                pass
+            # Small files were read whole
+            if record.partial is not None and record.size <= 2 * PARTIAL_HASH_BYTES:
+                record.full = record.partial
+
+        with ThreadPoolExecutor(self.partial_workers, thread_name_prefix="dup-partial") as executor:
+            for done, _ in enumerate(executor.map(work, todo), 1):
+                if self._cancelled.is_set():
+                    executor.shutdown(wait=False, cancel_futures=True)
+                    return
+                self.hashed += 1
+                if done % PROGRESS_EVERY_FILES == 0:
+                    yield {"event": "progress", "stage": "partial", "done": done, "total": len(todo)}
+
+    # ---- Stage 3 ----
+    def _full_hashes(self, groups: list[list[FileRecord]]) -> Iterator[dict]:
+        """
+        Hashes what the partial hash could not decide and yields each
+        candidate group's duplicates as soon as all its members are hashed.
+        """
+        remaining = [sum(r.full is None for r in group) for group in groups]
+        group_of: dict[str, int] = {}
+
+        for i, group in enumerate(groups):
+            if remaining[i] == 0:
+                yield from self._group_events(group)
+            for r in group:
+                if r.full is None:
+                    group_of[r.path] = i
+
+        if not group_of:
+            return
+
+        records = {r.path: r for group in groups for r in group}
+        pool = process_pool_context().Pool(self.hash_workers, initializer=init_background_worker)
+        try:
+            # Largest first: the long hashes overlap with the short ones
+            paths = sorted(group_of, key=lambda p: records[p].size, reverse=True)
+            it = pool.imap_unordered(full_hash, paths)
+
+            for done in range(1, len(paths) + 1):
+                while True:
+                    if self._cancelled.is_set():
+                        return
+                    try:
+                        path, digest = it.next(timeout=DUPLICATES_POLL_SECONDS)
+                        break
+                    except multiprocessing.TimeoutError:
+                        # Hand the caller's thread back while a large file hashes
+                        yield {"event": "progress", "stage": "full", "done": done - 1, "total": len(paths)}
+
+                records[path].full = digest
+                self.hashed += 1
+                yield {"event": "progress", "stage": "full", "done": done, "total": len(paths)}
+
+                i = group_of[path]
+                remaining[i] -= 1
+                if remaining[i] == 0:
+                    yield from self._group_events(groups[i])
+        finally:
+            pool.terminate()
+            pool.join()
+
+    def _group_events(self, candidates: list[FileRecord]) -> Iterator[dict]:
+        by_full: dict[bytes, list[FileRecord]] = {}
+        for r in candidates:
+            if r.full is not None:
+                by_full.setdefault(r.full, []).append(r)
+
+        for same in by_full.values():
+            if len(same) < 2:
+                continue
+
+            size = same[0].size
+            reclaimable = size * (len(same) - 1)
+            self.groups += 1
+            self.reclaimable += reclaimable
+
+            paths = sorted(r.path for r in same)
+            yield {
+                "event": "group",
+                "size": size,
+                "paths": paths,
+                "items": _listing_items(paths),
+                "reclaimable": reclaimable,
+            }
+
+    # ---- Pipeline ----
+    def results(self) -> Iterator[dict]:
+        self.files = 0
+        self.groups = 0
+        self.reclaimable = 0
+        self.hashed = 0
+        self.cached = 0
+        buckets: list[list[FileRecord]] = []
+
+        for item in self._scan():
+            if isinstance(item, dict):
+                yield item
+            else:
+                buckets = item
+
+        if self._cancelled.is_set():
+            return
+
+        records = [r for bucket in buckets for r in bucket]
+        cached = self.store.get([r.key for r in records])
+        for r in records:
+            if r.key in cached:
+                r.partial, r.full = cached[r.key]
+                self.cached += 1
+
+        try:
+            yield from self._partial_hashes(records)
+            if self._cancelled.is_set():
+                return
+
+            candidates = []
+            for bucket in buckets:
+                by_partial: dict[bytes, list[FileRecord]] = {}
+                for r in bucket:
+                    if r.partial is not None:
+                        by_partial.setdefault(r.partial, []).append(r)
+                candidates += [group for group in by_partial.values() if len(group) > 1]
+
+            yield from self._full_hashes(candidates)
+            if self._cancelled.is_set():
+                return
+        finally:
+            # Hashes computed before a cancel are still valid
+            self.store.put({r.key: (r.partial, r.full) for r in records if r.partial is not None})
+
+        yield {
+            "event": "end",
+            "files": self.files,
+            "groups": self.groups,
+            "reclaimable": self.reclaimable,
+            "hashed": self.hashed,
+            "cached": self.cached,
+        }
@@ -0,0 +1,259 @@
+from typing import BinaryIO
+from aiohttp import ClientConnectionResetError, web
+from contextlib import aclosing
+from email.utils import formatdate, parsedate_to_datetime
+import asyncio
+import os
+import secrets
+from asyncfs import AsyncFileSystemService
+from transferqos import Transfer, THROTTLE_SLICE
+
+MAX_RANGES = 16  # more ranges than this in one request and the whole file is sent
+
+# Set to disable the zero-copy path, as for aiohttp's FileResponse
+NOSENDFILE = bool(os.environ.get("AIOHTTP_NOSENDFILE"))
+
+# =========================
+# Exceptions
+# =========================
+
+class RangeNotSatisfiableError(Exception):
+    pass
+
+
+# =========================
+# Validators
+# =========================
+
+def file_etag(st: os.stat_result) -> str:
+    """
+    Strong ETag of a file: a different inode, size or mtime is a new one.
+    """
+    return f'"{st.st_ino:x}-{st.st_size:x}-{st.st_mtime_ns:x}"'
+
+
+def http_date(timestamp: float) -> str:
+    return formatdate(int(timestamp), usegmt=True)
+
+
+def _parse_http_date(value: str) -> float | None:
+    try:
+        return parsedate_to_datetime(value).timestamp()
+    except (TypeError, ValueError, IndexError):
+        return None
+
+
+def _etag_list(header: str) -> list[str]:
+    return [tag.strip() for tag in header.split(",") if tag.strip()]
+
+
+def is_not_modified(request: web.BaseRequest, etag: str, mtime: float) -> bool:
+    """
+    Whether a GET can be answered with 304: If-None-Match (weak comparison)
+    when sent, else If-Modified-Since against the second of `mtime`.
+    """
+    if_none_match = request.headers.get("If-None-Match")
+    if if_none_match is not None:
+        tags = _etag_list(if_none_match)
+        return "*" in tags or any(tag.removeprefix("W/") == etag for tag in tags)
+
+    if_modified_since = request.headers.get("If-Modified-Since")
+    if if_modified_since is not None:
+        since = _parse_http_date(if_modified_since)
+        return since is not None and int(mtime) <= since
+    return False
+
+
+def if_range_matches(request: web.BaseRequest, etag: str, mtime: float) -> bool:
+    """
+    Whether the Range header applies: no If-Range, or one naming the current
+    ETag (strong comparison) or exactly the current Last-Modified date.
+    """
+    if_range = request.headers.get("If-Range")
+    if if_range is None:
+        return True
+
+    if_range = if_range.strip()
+    if if_range.startswith('"'):
+        return if_range == etag
+
+    date = _parse_http_date(if_range)
+    return date is not None and date == int(mtime)
+
+
+# =========================
+# Ranges
+# =========================
+
+def parse_byte_ranges(header: str, size: int) -> list[tuple[int, int]] | None:
+    """
+    (start, end) of each range of a "bytes=" header, end inclusive and
+    clamped to `size`, in order with overlapping or adjacent ones merged.
+    Returns None for a header that should be ignored (malformed, or more
+    than MAX_RANGES ranges): the whole content is sent instead.
+    Raises RangeNotSatisfiableError if no range overlaps the content.
+    """
+    unit, _, specs = header.partition("=")
+    if unit.strip().lower() != "bytes":
+        return None
+
+    specs = [spec.strip() for spec in specs.split(",") if spec.strip()]
+    if not specs or len(specs) > MAX_RANGES:
+        return None
+
+    ranges = []
+    for spec in specs:
+        first, sep, last = spec.partition("-")
+        if not sep:
+            return None
+
+        try:
+            if not first:
+                # Suffix range: the last N bytes
+                length = int(last)
+                if length > 0 and size > 0:
+                    ranges.append((max(0, size - length), size - 1))
+                continue
+
+            start = int(first)
+            end = int(last) if last else None
+        except ValueError:
+            return None
+
+        if start < 0 or (end is not None and end < start):
+            return None
+        if end is None:
+            end = size - 1
+        if start < size:
+            ranges.append((start, min(end, size - 1)))
+
+    if not ranges:
+        raise RangeNotSatisfiableError(header)
+
+    merged = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1] + 1:
+            merged[-1] = (merged[-1][0], max(end, merged[-1][1]))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def parse_byte_range(header: str, size: int) -> tuple[int, int] | None:
+    """
+    Like parse_byte_ranges(), for content served as a single range: a
+    header asking for several is ignored.
+    """
+    ranges = parse_byte_ranges(header, size)
+    if ranges is None or len(ranges) > 1:
+        return None
+    return ranges[0]
+
+
+class MultipartRanges:
+    """
+    Framing of a multipart/byteranges body: a part header before each
+    range and a closing delimiter, with the exact body length.
+    """
+    def __init__(self, ranges: list[tuple[int, int]], content_type: str, size: int):
+        self.ranges = ranges
+        self.boundary = secrets.token_hex(16)
+        self.content_type = f"multipart/byteranges; boundary={self.boundary}"
+        self.part_headers = [
+            (
+                f"\r\n--{self.boundary}\r\n"
+                f"Content-Type: {content_type}\r\n"
+                f"Content-Range: bytes {start}-{end}/{size}\r\n\r\n"
+            ).encode("latin-1")
+            for start, end in ranges
+        ]
+        self.closing = f"\r\n--{self.boundary}--\r\n".encode("latin-1")
+        self.length = (
+            sum(len(header) for header in self.part_headers)
+            + sum(end - start + 1 for start, end in ranges)
+            + len(self.closing)
+        )
+
+
+# =========================
+# File responses
+# =========================
+
+def can_sendfile(request: web.BaseRequest) -> bool:
+    """
+    Whether the kernel can copy the file straight to the socket: plain TCP
+    only. asyncio encrypts TLS in user space (memory BIOs), so an HTTPS
+    connection always goes through the copy loop.
+    """
+    transport = request.transport
+    if NOSENDFILE or transport is None:
+        return False
+    return transport.get_extra_info("sslcontext") is None
+
+
+async def send_open_file(
+    request: web.BaseRequest,
+    response: web.StreamResponse,
+    afs: AsyncFileSystemService,
+    f: BinaryIO,
+    offset: int,
+    count: int,
+    transfer: Transfer | None = None,
+):
+    """
+    Writes `count` bytes of an open file at `offset` to a prepared
+    response, with sendfile(2) when the connection allows it, else with
+    AsyncFileSystemService.read_file(). Reads are positional, so `f` can
+    be shared by concurrent responses. A file that shrank ends the body
+    early. With a rate limited `transfer`, sendfile goes in THROTTLE_SLICE
+    pieces and every piece waits for the scheduler.
+    A client that went away raises ClientConnectionResetError, or a builtin
+    ConnectionError from sendfile(2) itself.
+    """
+    position = offset
+    end = offset + count
+
+    if count > 0 and can_sendfile(request):
+        loop = asyncio.get_running_loop()
+        limited = transfer is not None and transfer.limited
+        try:
+            while position < end:
+                size = min(THROTTLE_SLICE, end - position) if limited else end - position
+                if limited:
+                    await transfer.throttle(size)
+                # loop.sendfile raises RuntimeError on a closing transport
+                if request.transport is None or request.transport.is_closing():
+                    raise ClientConnectionResetError("Connection closed during sendfile")
+                # Headers were sent by prepare(); sendfile waits for them to drain
+                sent = await loop.sendfile(request.transport, f, position, size, fallback=False)
+                position += sent
+                if sent < size:
+                    break
+            return
+        except asyncio.SendfileNotAvailableError:
+            # Not a socket transport this loop can sendfile on (e.g. uvloop)
+            pass
+
+    # Each write waits for the socket to drain; one chunk is read ahead meanwhile
+    async with aclosing(afs.read_file(f, position, end - position)) as chunks:
+        async for data in chunks:
+            if transfer is not None:
+                await transfer.throttle(len(data))
+            await response.write(data)
+
+
+async def send_file_ranges(
+    request: web.BaseRequest,
+    response: web.StreamResponse,
+    afs: AsyncFileSystemService,
+    f: BinaryIO,
+    parts: MultipartRanges,
+    transfer: Transfer | None = None,
+):
+    """
+    Writes the multipart/byteranges body of `parts` to a prepared response.
+    """
+    for header, (start, end) in zip(parts.part_headers, parts.ranges):
+        await response.write(header)
+        await send_open_file(request, response, afs, f, start, end - start + 1, transfer)
+    await response.write(parts.closing)
@@ -1,14 +1,38 @@
 from pathlib import Path
-from typing import List
+from typing import Callable, Iterator, List
 import shutil
-import mimetypes
 from aiohttp import web
-import zipfile
-import io
 import os, subprocess, json
+import stat
+import re
+import select
+import threading
+import time
+import base64
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from filetypes import get_extension, get_file_type, guess_mime_type, DEFAULT_MIME_TYPE
+from compressionpolicy import CompressionPolicy, DEFAULT_COMPRESSION_MODE
+from zipstream import ZipStreamWriter, zip_store_layout
+from parallelzip import ParallelZipWriter
+from tarstream import tar_members, tar_size, tar_layout, stream_tar, zstd_compress
+from archivelayout import ArchiveLayout
+from openfiles import OpenFile, OpenFileCache, OPEN_FILE_CACHE_SIZE
 
 DEFAULT_CHUNK_SIZE = 64 * 1024  # 64 KB
 
+ITEMS_COUNT_CAP = 10_000
+ITEMS_COUNT_TIMEOUT_SECONDS = 2.0
+ITEMS_COUNT_WORKERS = 4
+
+DEFAULT_PAGE_SIZE = 500
+MAX_PAGE_SIZE = 5000
+LISTING_SORT_KEYS = ("name", "size", "mtime", "type")
+LISTING_VIEW_CACHE_SIZE = 16
+STREAM_BATCH_SIZE = 256
+ARCHIVE_FORMATS = ("zip", "tar", "tar.zst")
+DEFAULT_LISTING_CACHE_BYTES = 32 * 1024 * 1024  # 32 MB
+
 
 # =========================
 # Exceptions
@@ -20,6 +44,9 @@ class FileSystemError(Exception):
 class FileAlreadyExistsError(Exception):
     pass
 
+class NotAFileError(FileSystemError):
+    pass
+
 # =========================
 # Classes
 # =========================
@@ -121,7 +148,7 @@ def get_linux_drives(_show_only_accessible = True) -> list[DriveInfo]:
         if dev.get("type") not in ("part", "disk"):
             continue
 
-        if dev.get("fstype") in ("swap"):
+        if dev.get("fstype") in ("swap",):
             continue
 
         if _show_only_accessible:
@@ -152,9 +179,7 @@ def is_path_on_linux_root_and_not_external_or_not_user_space(path: Path, base_di
         Path("/var/mnt")
     )
 
-    external_mounts = get_linux_drives()
-
-    if any(path.is_relative_to(m) for m in allowed_mount_roots) or any(path.is_relative_to(m.path) for m in external_mounts):
+    if any(path.is_relative_to(m) for m in allowed_mount_roots) or get_mount_index().is_external(path):
         is_external = True
 
     if path.is_relative_to(base_dir or Path(os.path.expanduser("~"))):
@@ -163,6 +188,210 @@ def is_path_on_linux_root_and_not_external_or_not_user_space(path: Path, base_di
     return not (is_external or is_user_space)
 
 
+# ----- MOUNT TABLE -----
+MOUNTINFO_PATH = "/proc/self/mountinfo"
+MOUNTS_PATH = "/proc/self/mounts"
+
+# Block devices that are never a drive of their own
+NON_DRIVE_DEVICES = ("/dev/loop", "/dev/ram", "/dev/zram")
+
+_MOUNT_ESCAPE = re.compile(r"\\([0-7]{3})")
+
+class MountEntry:
+    __slots__ = ("mount_point", "device", "fstype", "source", "is_external")
+
+    def __init__(self, mount_point: str, device: int, fstype: str, source: str, is_external: bool):
+        self.mount_point = mount_point
+        self.device = device
+        self.fstype = fstype
+        self.source = source
+        self.is_external = is_external
+
+
+def _unescape_mount_field(value: str) -> str:
+    # mountinfo escapes space, tab, newline and backslash as octal (\040, \011...)
+    return _MOUNT_ESCAPE.sub(lambda m: chr(int(m.group(1), 8)), value)
+
+def parse_mountinfo(text: str, _show_only_accessible = True) -> list[MountEntry]:
+    """
+    Parses the content of /proc/self/mountinfo.
+    A mount is considered external when it mounts the root of a block device
+    filesystem, other than the root filesystem, swap and RAM or loop devices.
+    This approximates the partitions and disks get_linux_drives() reports:
+    bind mounts of part of a filesystem (mountinfo root other than "/", such as
+    the SteamOS offload binds at /opt or /var/log) and loop mounts (snaps,
+    mounted images) are not external.
+    """
+    entries = []
+
+    for line in text.splitlines():
+        fields = line.split(" ")
+        try:
+            separator = fields.index("-")
+            major, minor = fields[2].split(":")
+            root = _unescape_mount_field(fields[3])
+            mount_point = _unescape_mount_field(fields[4])
+            fstype = fields[separator + 1]
+            source = _unescape_mount_field(fields[separator + 2])
+        except (ValueError, IndexError):
+            continue
+
+        is_external = (
+            source.startswith("/dev/")
+            and not source.startswith(NON_DRIVE_DEVICES)
+            and root == "/"
+            and fstype != "swap"
+            and mount_point != "/"
+        )
+
+        if is_external and _show_only_accessible:
+            is_external = os.access(mount_point, os.R_OK | os.X_OK)
+
+        entries.append(
+            MountEntry(
+                mount_point=mount_point,
+                device=os.makedev(int(major), int(minor)),
+                fstype=fstype,
+                source=source,
+                is_external=is_external,
+            )
+        )
+
+    return entries
+
+
+class MountIndex:
+    """
+    In-process index of the mount table.
+    The table is parsed once and re-read only after the kernel signals a change
+    on /proc/self/mounts (POLLPRI), so lookups never spawn a subprocess.
+    """
+    def __init__(self, mountinfo_path: str = MOUNTINFO_PATH, mounts_path: str = MOUNTS_PATH):
+        self.mountinfo_path = mountinfo_path
+        self.mounts_path = mounts_path
+        self.reload_count = 0
+
+        self._lock = threading.Lock()
+        self._mounts: dict[str, MountEntry] = {}
+        self._by_device: dict[int, list[str]] = {}
+        self._loaded = False
+        self._poller = None
+        self._watch_fd = None
+
+        try:
+            self._watch_fd = os.open(mounts_path, os.O_RDONLY)
+            self._poller = select.poll()
+            self._poller.register(self._watch_fd, select.POLLPRI | select.POLLERR)
+            # The first poll reports the current table as "changed", consume it
+            self._poller.poll(0)
+        except (OSError, AttributeError):
+            # No change notification available, the table is re-read on every lookup
+            self._poller = None
+
+    def _is_stale(self) -> bool:
+        if not self._loaded or self._poller is None:
+            return True
+        return bool(self._poller.poll(0))
+
+    def reload(self):
+        with open(self.mountinfo_path, "r") as f:
+            entries = parse_mountinfo(f.read())
+
+        # Later entries shadow earlier ones mounted on the same point
+        mounts = {e.mount_point: e for e in entries}
+
+        by_device: dict[int, list[str]] = {}
+        for entry in mounts.values():
+            by_device.setdefault(entry.device, []).append(entry.mount_point)
+
+        # Longest mount points first, so the deepest bind mount wins
+        for points in by_device.values():
+            points.sort(key=len, reverse=True)
+
+        self._mounts = mounts
+        self._by_device = by_device
+        self._loaded = True
+        self.reload_count += 1
+
+    def mounts(self) -> dict[str, MountEntry]:
+        with self._lock:
+            if self._is_stale():
+                self.reload()
+            return self._mounts
+
+    def find_mount(self, path: str | Path) -> MountEntry | None:
+        """
+        Returns the mount containing the given absolute path (longest prefix match).
+        """
+        mounts = self.mounts()
+        p = os.path.normpath(str(path))
+
+        while True:
+            entry = mounts.get(p)
+            if entry is not None:
+                return entry
+
+            parent = os.path.dirname(p)
+            if parent == p:
+                return None
+            p = parent
+
+    def is_external(self, path: str | Path) -> bool:
+        """
+        True if the path is on, or below, an external mount.
+        """
+        mounts = self.mounts()
+        p = os.path.normpath(str(path))
+
+        while True:
+            entry = mounts.get(p)
+            if entry is not None and entry.is_external:
+                return True
+
+            parent = os.path.dirname(p)
+            if parent == p:
+                return False
+            p = parent
+
+    def drive_root(self, path: str | Path) -> str | None:
+        """
+        Returns the mount point of the filesystem holding the given absolute path.
+        Costs one stat() plus a lookup by device id; falls back to a longest prefix
+        match when the device is unknown (e.g. btrfs subvolumes or missing paths).
+        """
+        p = os.path.normpath(str(path))
+        self.mounts()
+        by_device = self._by_device
+
+        try:
+            candidates = by_device.get(os.stat(p).st_dev)
+        except OSError:
+            candidates = None
+
+        if candidates:
+            for mount_point in candidates:
+                if mount_point == "/" or p == mount_point or p.startswith(mount_point + "/"):
+                    return mount_point
+
+        entry = self.find_mount(p)
+        return entry.mount_point if entry else None
+
+    def close(self):
+        if self._watch_fd is not None:
+            os.close(self._watch_fd)
+            self._watch_fd = None
+            self._poller = None
+
+
+_mount_index: MountIndex | None = None
+
+def get_mount_index() -> MountIndex:
+    global _mount_index
+    if _mount_index is None:
+        _mount_index = MountIndex()
+    return _mount_index
+
+
 def get_all_drives() -> list[DriveInfo]:
     if os.name == "nt":
         return get_windows_drives()
@@ -176,14 +405,8 @@ def get_drive_root(path: str | Path) -> Path:
     if os.name == "nt":
         return Path(path.drive + "\\")
 
-    result = subprocess.run(
-        ["findmnt", "-n", "-o", "TARGET", "--target", str(path)],
-        capture_output=True,
-        text=True,
-        check=True
-    )
-
-    return Path(result.stdout.strip())
+    mount_point = get_mount_index().drive_root(path)
+    return Path(mount_point or path.anchor)
 
 
 # =========================
@@ -225,10 +448,7 @@ class FileSystemObject:
     def getItemsCount(self) -> int:
         if not self.isDir():
             raise NotADirectoryError("This object is not a directory")
-        try:
-            return sum(1 for _ in self.path.iterdir())
-        except PermissionError:
-            return 0
+        return count_dir_items(str(self.path))[0]
 
     def getFileName(self) -> str:
         if not self.isFile():
@@ -249,11 +469,7 @@ class FileSystemObject:
         if not self.isFile():
             raise IsADirectoryError("Directories do not have a file type")
 
-        mime, _ = mimetypes.guess_type(self.path)
-        if not mime:
-            return "unknown"
-
-        return mime.split("/")[0] 
+        return get_file_type(self.path.name)
 
     def to_dict(self) -> dict:
         data = {
@@ -281,19 +497,400 @@ class FileSystemObject:
         return data
 
 
+# =========================
+# Directory Listing Entry
+# =========================
+
+def count_dir_items(path: str, cap: int | None = None, deadline: float | None = None) -> tuple[int, bool]:
+    """
+    Counts the entries of a directory.
+    Stops early once `cap` entries were seen or the monotonic `deadline` passed.
+    Returns the count and whether it is complete.
+    """
+    count = 0
+    try:
+        with os.scandir(path) as it:
+            for _ in it:
+                count += 1
+                if cap is not None and count >= cap:
+                    return count, False
+                if deadline is not None and count % 256 == 0 and time.monotonic() > deadline:
+                    return count, False
+    except OSError:
+        return 0, True
+    return count, True
+
+_count_executor: ThreadPoolExecutor | None = None
+
+def _get_count_executor() -> ThreadPoolExecutor:
+    global _count_executor
+    if _count_executor is None:
+        _count_executor = ThreadPoolExecutor(max_workers=ITEMS_COUNT_WORKERS, thread_name_prefix="items-count")
+    return _count_executor
+
+def shutdown_count_executor():
+    """
+    Stops the item count threads; the next count_items() starts new ones.
+    """
+    global _count_executor
+    if _count_executor is not None:
+        _count_executor.shutdown(wait=False, cancel_futures=True)
+        _count_executor = None
+
+
+class FileSystemEntry:
+    """
+    Compact listing record built from an os.DirEntry.
+    Type checks reuse the d_type bits from scandir and the metadata comes from
+    a single stat() call, so building an entry costs at most one syscall.
+    """
+    __slots__ = ("name", "directory", "is_dir", "is_file", "size", "mtime_ns", "inode")
+
+    def __init__(
+        self,
+        name: str,
+        directory: str,
+        is_dir: bool,
+        is_file: bool,
+        size: int = 0,
+        mtime_ns: int = 0,
+        inode: int = 0
+    ):
+        self.name = name
+        self.directory = directory
+        self.is_dir = is_dir
+        self.is_file = is_file
+        self.size = size
+        self.mtime_ns = mtime_ns
+        self.inode = inode
+
+    @classmethod
+    def from_dir_entry(cls, entry: os.DirEntry, directory: str) -> "FileSystemEntry":
+        try:
+            # Both follow symlinks; for regular entries no syscall is needed
+            is_dir = entry.is_dir()
+            is_file = not is_dir and entry.is_file()
+            st = entry.stat()
+        except OSError:
+            # Broken symlink or entry removed while listing
+            return cls(entry.name, directory, False, False)
+
+        return cls(
+            entry.name,
+            directory,
+            is_dir,
+            is_file,
+            st.st_size if is_file else 0,
+            st.st_mtime_ns,
+            st.st_ino,
+        )
+
+    @classmethod
+    def from_path(cls, directory: str, name: str) -> "FileSystemEntry":
+        """
+        Builds an entry for a single name, raises FileNotFoundError if it is gone.
+        """
+        path = os.path.join(directory, name)
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            # Broken symlinks are still listed
+            os.lstat(path)
+            return cls(name, directory, False, False)
+
+        is_dir = stat.S_ISDIR(st.st_mode)
+        is_file = stat.S_ISREG(st.st_mode)
+
+        return cls(
+            name,
+            directory,
+            is_dir,
+            is_file,
+            st.st_size if is_file else 0,
+            st.st_mtime_ns,
+            st.st_ino,
+        )
+
+    @property
+    def path(self) -> Path:
+        return Path(self.directory, self.name)
+
+    def path_str(self) -> str:
+        return os.path.join(self.directory, self.name)
+
+    # ---- Type checks ----
+    def isDir(self) -> bool:
+        return self.is_dir
+
+    def isFile(self) -> bool:
+        return self.is_file
+
+    def isHidden(self) -> bool:
+        return self.name.startswith(".")
+
+    def to_dict(self, with_items_count: bool = True) -> dict:
+        """
+        With `with_items_count` False, directories report itemsCount as None and
+        the count is left to FileSystemService.count_items.
+        """
+        path = self.path_str()
+
+        data = {
+            "path": path,
+            "isDir": self.is_dir,
+            "isFile": self.is_file,
+            "isHidden": self.isHidden(),
+            "directory": path if self.is_dir else self.directory,
+        }
+
+        if self.is_dir:
+            data["itemsCount"] = count_dir_items(path)[0] if with_items_count else None
+
+        if self.is_file:
+            data.update({
+                "name": self.name,
+                "extension": get_extension(self.name),
+                "size": self.size,
+                "type": get_file_type(self.name),
+            })
+
+        return data
+
+
+# =========================
+# Directory Listing Pages
+# =========================
+
+_SORT_KEYS = {
+    "name": lambda e: (e.name.casefold(), e.name),
+    "size": lambda e: (e.size, e.name.casefold(), e.name),
+    "mtime": lambda e: (e.mtime_ns, e.name.casefold(), e.name),
+    "type": lambda e: (get_extension(e.name) if e.is_file else "", e.name.casefold(), e.name),
+}
+
+def sort_entries(entries: list[FileSystemEntry], sort: str = "name", descending: bool = False) -> list[FileSystemEntry]:
+    """
+    Sorts listing entries with directories always first.
+    """
+    key = _SORT_KEYS.get(sort)
+    if key is None:
+        raise FileSystemError(f"Invalid sort key '{sort}'")
+
+    dirs = sorted((e for e in entries if e.is_dir), key=key, reverse=descending)
+    files = sorted((e for e in entries if not e.is_dir), key=key, reverse=descending)
+    return dirs + files
+
+def encode_cursor(offset: int, name: str) -> str:
+    raw = json.dumps([offset, name]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> tuple[int, str]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        offset, name = json.loads(raw)
+        if not isinstance(offset, int) or not isinstance(name, str) or offset < 0:
+            raise ValueError
+        return offset, name
+    except ValueError:
+        raise FileSystemError("Invalid cursor")
+
+
+class DirectoryView:
+    """
+    A sorted and filtered snapshot of a directory, reused across page requests
+    for as long as the directory's (st_mtime_ns, st_ino) does not change.
+    """
+    __slots__ = ("version", "entries", "_positions")
+
+    def __init__(self, version: tuple[int, int], entries: list[FileSystemEntry]):
+        self.version = version
+        self.entries = entries
+        self._positions: dict[str, int] | None = None
+
+    def position_of(self, name: str) -> int | None:
+        if self._positions is None:
+            self._positions = {e.name: i for i, e in enumerate(self.entries)}
+        return self._positions.get(name)
+
+
+class DirectoryPage:
+    def __init__(self, entries: list[FileSystemEntry], total: int, next_cursor: str | None):
+        self.entries = entries
+        self.total = total
+        self.next_cursor = next_cursor
+
+
+# =========================
+# Columnar Listings
+# =========================
+
+LISTING_FORMATS = ("objects", "columnar")
+
+# Bits of the columnar "flags" array
+FLAG_DIR = 1
+FLAG_FILE = 2
+FLAG_HIDDEN = 4
+
+def encode_columnar(directory: str, entries: list[FileSystemEntry], with_items_count: bool = True) -> dict:
+    """
+    Encodes a listing as parallel arrays instead of one object per entry.
+    The parent path and key names are sent once; `types` indexes into
+    `typeNames`. Clients rebuild the object form with the same rules as
+    FileSystemEntry.to_dict (path = directory + separator + name).
+    """
+    names = []
+    flags = []
+    sizes = []
+    mtimes = []
+    types = []
+    items_counts = []
+    type_names = []
+    type_codes: dict[str, int] = {}
+
+    for entry in entries:
+        name = entry.name
+        names.append(name)
+        flags.append(
+            (FLAG_DIR if entry.is_dir else 0)
+            | (FLAG_FILE if entry.is_file else 0)
+            | (FLAG_HIDDEN if name.startswith(".") else 0)
+        )
+        sizes.append(entry.size)
+        mtimes.append(entry.mtime_ns // 1_000_000)
+
+        if entry.is_file:
+            file_type = get_file_type(name)
+            code = type_codes.get(file_type)
+            if code is None:
+                code = type_codes[file_type] = len(type_names)
+                type_names.append(file_type)
+            types.append(code)
+        else:
+            types.append(-1)
+
+        if entry.is_dir and with_items_count:
+            items_counts.append(count_dir_items(entry.path_str())[0])
+        else:
+            items_counts.append(None)
+
+    return {
+        "directory": directory,
+        "separator": os.sep,
+        "names": names,
+        "flags": flags,
+        "sizes": sizes,
+        "mtimes": mtimes,
+        "types": types,
+        "typeNames": type_names,
+        "itemsCounts": items_counts,
+    }
+
+
+# =========================
+# Listing Cache
+# =========================
+
+class ListingCache:
+    """
+    LRU cache of directory listings keyed by (path, st_mtime_ns, st_ino).
+    The directory mtime only changes when entries are added, removed or renamed,
+    so the server must also invalidate it on its own writes.
+    Memory use is an estimate, bounded by `budget_bytes`.
+    """
+    # FileSystemEntry + its ints + name str header + list slot
+    ENTRY_OVERHEAD_BYTES = 220
+
+    def __init__(self, budget_bytes: int = DEFAULT_LISTING_CACHE_BYTES):
+        self.budget_bytes = budget_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self._items: OrderedDict[str, tuple[tuple[int, int], list[FileSystemEntry], int]] = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def estimate_size(cls, entries: list[FileSystemEntry]) -> int:
+        return sum(cls.ENTRY_OVERHEAD_BYTES + len(e.name) for e in entries)
+
+    def get(self, path: str, version: tuple[int, int]) -> list[FileSystemEntry] | None:
+        with self._lock:
+            item = self._items.get(path)
+            if item is None or item[0] != version:
+                self.misses += 1
+                return None
+
+            self._items.move_to_end(path)
+            self.hits += 1
+            return item[1]
+
+    def put(self, path: str, version: tuple[int, int], entries: list[FileSystemEntry]):
+        size = self.estimate_size(entries)
+
+        with self._lock:
+            self._remove(path)
+
+            if size > self.budget_bytes:
+                return
+
+            self._items[path] = (version, entries, size)
+            self._bytes += size
+
+            while self._bytes > self.budget_bytes:
+                _, (_, _, evicted_size) = self._items.popitem(last=False)
+                self._bytes -= evicted_size
+                self.evictions += 1
+
+    def _remove(self, path: str):
+        item = self._items.pop(path, None)
+        if item is not None:
+            self._bytes -= item[2]
+
+    def invalidate(self, path: str, recursive: bool = False):
+        with self._lock:
+            self._remove(path)
+
+            if recursive:
+                prefix = path.rstrip(os.sep) + os.sep
+                for key in [k for k in self._items if k.startswith(prefix)]:
+                    self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self._bytes = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "directories": len(self._items),
+                "bytes": self._bytes,
+                "budgetBytes": self.budget_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hitRate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+            }
+
+
 # =========================
 # Write Stream Wrapper
 # =========================
 
 class FileWriteStream:
-    def __init__(self, file):
+    def __init__(self, file, on_close=None):
         self._file = file
+        self._on_close = on_close
 
     def write(self, data: bytes):
         self._file.write(data)
 
     def close(self):
         self._file.close()
+        if self._on_close:
+            self._on_close()
 
 
 # =========================
@@ -301,12 +898,30 @@ class FileWriteStream:
 # =========================
 
 class FileSystemService:
-    def __init__(self, base_dir: str):
+    def __init__(self, base_dir: str, listing_cache_bytes: int = DEFAULT_LISTING_CACHE_BYTES):
         self.base_dir = Path(base_dir).resolve()
 
         if not self.base_dir.exists():
             raise FileSystemError("Base directory does not exist")
-        
+
+        self.listing_cache = ListingCache(listing_cache_bytes)
+        # Files being served by view_file, kept open between Range requests.
+        # Not on Windows: sharing an open file needs positional reads (os.pread)
+        self.open_files = OpenFileCache(0 if os.name == "nt" else OPEN_FILE_CACHE_SIZE)
+
+        self._views: OrderedDict[tuple, DirectoryView] = OrderedDict()
+        self._views_lock = threading.Lock()
+
+        # Other caches keyed on paths, told about every write, see _invalidate
+        self._invalidation_listeners: list[Callable[[Path], None]] = []
+
+    def resolve_path(self, user_path: str) -> Path:
+        """
+        The absolute, symlink-free path of `user_path`, raises FileSystemError
+        if it is not allowed. Resolving hits the disk.
+        """
+        return self._resolve(user_path)
+
     def _resolve(self, user_path: str) -> Path:
         if not user_path:
             raise FileSystemError("Path is required")
@@ -340,23 +955,197 @@ class FileSystemService:
             
         return p
 
+    def _invalidate(self, *paths: Path):
+        """
+        Drops cached listings affected by a write to the given paths:
+        their parent directories and everything cached below them.
+        """
+        for path in paths:
+            self.listing_cache.invalidate(str(path.parent))
+            self.listing_cache.invalidate(str(path), recursive=True)
+
+        with self._views_lock:
+            for key in list(self._views):
+                if any(key[0] == str(p.parent) or Path(key[0]).is_relative_to(p) for p in paths):
+                    del self._views[key]
+
+        for path in paths:
+            self.open_files.invalidate(path)
+
+        for listener in self._invalidation_listeners:
+            for path in paths:
+                listener(path)
+
+    def add_invalidation_listener(self, listener: Callable[[Path], None]):
+        """
+        Calls listener(path) for every path written by this service.
+        """
+        self._invalidation_listeners.append(listener)
+
+    def invalidate_listing(self, directory: str | Path):
+        """
+        Drops the cached listing and sorted views of a single directory.
+        """
+        directory = str(directory)
+        self.listing_cache.invalidate(directory)
+
+        with self._views_lock:
+            for key in [k for k in self._views if k[0] == directory]:
+                del self._views[key]
 
     # ---- Directory operations ----
-    def list_dir(self, path: str = "") -> List[FileSystemObject]:
+    def list_dir(self, path: str = "") -> List[FileSystemEntry]:
         directory = self._resolve(path)
+        return list(self._scan_dir(directory, self._dir_version(directory)))
+
+    def _dir_version(self, directory: Path) -> tuple[int, int]:
+        try:
+            st = directory.stat()
+        except FileNotFoundError:
+            raise FileNotFoundError("Directory not found")
 
-        if not directory.exists() or not directory.is_dir():
+        if not stat.S_ISDIR(st.st_mode):
             raise FileNotFoundError("Directory not found")
 
-        return [FileSystemObject(p) for p in directory.iterdir()]
+        return st.st_mtime_ns, st.st_ino
+
+    def _scan_dir(self, directory: Path, version: tuple[int, int]) -> list[FileSystemEntry]:
+        """
+        Returns the (shared, read-only) entries of a directory, from the listing
+        cache when the directory did not change since it was last scanned.
+        """
+        parent = str(directory)
+
+        entries = self.listing_cache.get(parent, version)
+        if entries is not None:
+            return entries
+
+        with os.scandir(parent) as it:
+            entries = [FileSystemEntry.from_dir_entry(entry, parent) for entry in it]
+
+        self.listing_cache.put(parent, version, entries)
+        return entries
+
+    def list_dir_page(
+        self,
+        path: str = "",
+        sort: str = "name",
+        descending: bool = False,
+        show_hidden: bool = True,
+        prefix: str = "",
+        cursor: str | None = None,
+        limit: int = DEFAULT_PAGE_SIZE
+    ) -> DirectoryPage:
+        """
+        Returns one page of a sorted and filtered listing.
+        The sorted view is cached per directory, so following pages only cost
+        a stat() of the directory plus a slice of the cached view.
+        """
+        if sort not in LISTING_SORT_KEYS:
+            raise FileSystemError(f"Invalid sort key '{sort}'")
+
+        limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+        directory = self._resolve(path)
+        version = self._dir_version(directory)
+        cache_key = (str(directory), sort, descending, show_hidden, prefix.casefold())
+
+        with self._views_lock:
+            view = self._views.get(cache_key)
+            if view is not None:
+                self._views.move_to_end(cache_key)
+
+        if view is None or view.version != version:
+            entries = self._scan_dir(directory, version)
+            folded_prefix = prefix.casefold()
+
+            if not show_hidden:
+                entries = [e for e in entries if not e.name.startswith(".")]
+            if folded_prefix:
+                entries = [e for e in entries if e.name.casefold().startswith(folded_prefix)]
+
+            view = DirectoryView(version, sort_entries(entries, sort, descending))
+
+            with self._views_lock:
+                self._views[cache_key] = view
+                self._views.move_to_end(cache_key)
+                while len(self._views) > LISTING_VIEW_CACHE_SIZE:
+                    self._views.popitem(last=False)
+
+        start = 0
+        if cursor:
+            offset, name = decode_cursor(cursor)
+            start = offset
+            # The directory changed since the cursor was issued, find where it left off
+            if offset >= len(view.entries) or view.entries[offset].name != name:
+                position = view.position_of(name)
+                start = position if position is not None else min(offset, len(view.entries))
+
+        page = view.entries[start:start + limit]
+        end = start + len(page)
+
+        next_cursor = None
+        if end < len(view.entries):
+            next_cursor = encode_cursor(end, view.entries[end].name)
+
+        return DirectoryPage(page, len(view.entries), next_cursor)
+
+    def count_items(
+        self,
+        paths: list[str],
+        cap: int = ITEMS_COUNT_CAP,
+        timeout: float = ITEMS_COUNT_TIMEOUT_SECONDS
+    ) -> list[dict]:
+        """
+        Counts the entries of several directories in a background pool.
+        Each count stops at `cap` entries and the whole batch at `timeout` seconds;
+        directories that could not be counted in time report itemsCount as None.
+        """
+        deadline = time.monotonic() + timeout
+        executor = _get_count_executor()
+        pending = []
+
+        for path in paths:
+            try:
+                directory = self._resolve(path)
+            except FileSystemError:
+                pending.append((path, None))
+                continue
+
+            if not directory.is_dir():
+                pending.append((path, None))
+                continue
+
+            pending.append((path, executor.submit(count_dir_items, str(directory), cap, deadline)))
+
+        results = []
+        for path, future in pending:
+            count, complete = None, False
+
+            if future is not None:
+                try:
+                    count, complete = future.result(timeout=max(0, deadline - time.monotonic()))
+                except FutureTimeoutError:
+                    future.cancel()
+
+            results.append({
+                "path": path,
+                "itemsCount": count,
+                "complete": complete,
+            })
+
+        return results
 
     def create_dir(self, path: str):
         directory = self._resolve(path)
         directory.mkdir(parents=True, exist_ok=False)
+        self._invalidate(directory)
 
     def delete_dir(self, path: str):
         directory = self._resolve(path)
-        shutil.rmtree(directory)
+        try:
+            shutil.rmtree(directory)
+        finally:
+            self._invalidate(directory)
 
     # ---- File operations ----
     def create_file(self, path: str, content: bytes = b""):
@@ -366,6 +1155,8 @@ class FileSystemService:
         with open(file_path, "wb") as f:
             f.write(content)
 
+        self._invalidate(file_path)
+
     def delete_file(self, path: str):
         file_path = self._resolve(path)
 
@@ -373,6 +1164,7 @@ class FileSystemService:
             raise FileNotFoundError("File not found")
 
         file_path.unlink()
+        self._invalidate(file_path)
 
     def move(self, src: str, dst: str, overwrite: bool = False):
         src_path = self._resolve(src)
@@ -381,13 +1173,16 @@ class FileSystemService:
         if dst_path.exists() and not overwrite:
             raise FileAlreadyExistsError(f"{dst_path.name} already exists")
 
-        if dst_path.exists() and overwrite:
-            if dst_path.is_dir():
-                shutil.rmtree(dst_path)
-            else:
-                dst_path.unlink()
+        try:
+            if dst_path.exists() and overwrite:
+                if dst_path.is_dir():
+                    shutil.rmtree(dst_path)
+                else:
+                    dst_path.unlink()
 
-        shutil.move(src_path, dst_path)
+            shutil.move(src_path, dst_path)
+        finally:
+            self._invalidate(src_path, dst_path)
 
     def copy(self, src: str, dst: str, overwrite: bool = False):
         src_path = self._resolve(src)
@@ -396,18 +1191,22 @@ class FileSystemService:
         if dst_path.exists() and not overwrite:
             raise FileAlreadyExistsError(f"{dst_path.name} already exists")
 
-        if src_path.is_dir():
-            if dst_path.exists() and overwrite:
-                shutil.rmtree(dst_path)
-            shutil.copytree(src_path, dst_path)
-        else:
-            dst_path.parent.mkdir(parents=True, exist_ok=True)
-            shutil.copy2(src_path, dst_path)
+        try:
+            if src_path.is_dir():
+                if dst_path.exists() and overwrite:
+                    shutil.rmtree(dst_path)
+                shutil.copytree(src_path, dst_path)
+            else:
+                dst_path.parent.mkdir(parents=True, exist_ok=True)
+                shutil.copy2(src_path, dst_path)
+        finally:
+            self._invalidate(dst_path)
 
     def rename(self, path: str, new_name: str):
         src = self._resolve(path)
         dst = src.parent / new_name
         src.rename(dst)
+        self._invalidate(src, dst)
 
     # ---- Info ----
     def get_object(self, path: str) -> FileSystemObject:
@@ -418,7 +1217,92 @@ class FileSystemService:
 
         return FileSystemObject(p)
 
+    def open_file(self, path: str) -> OpenFile:
+        """
+        The file at `path` opened for reading, with its stat and MIME type,
+        shared through the open file cache. Call release() on it when done.
+        Raises NotAFileError for directories and special files.
+        """
+        return self.open_files.acquire(path, lambda: self._open_file(path))
+
+    def _open_file(self, path: str) -> OpenFile:
+        p = self._resolve(path)
+        st = p.stat()
+        if not stat.S_ISREG(st.st_mode):
+            # Opening a FIFO would block
+            raise NotAFileError("Not a file")
+
+        f = open(p, "rb")
+        try:
+            st = os.fstat(f.fileno())
+        except OSError:
+            f.close()
+            raise
+        return OpenFile(p, f, st, guess_mime_type(p) or DEFAULT_MIME_TYPE)
+
     # ---- Streaming ----
+    def stream_dir(self, path: str = "", show_hidden: bool = True, batch_size: int = STREAM_BATCH_SIZE):
+        """
+        Yields a directory listing in two phases, batch by batch:
+          ("entries", [...]) - name and type only, straight from scandir's d_type
+          ("meta", [...])    - size, mtime (milliseconds, as in encode_columnar)
+                               and file type, one stat() per entry
+        Each batch is produced on demand, so the caller can send it while the
+        next one is being read.
+        """
+        directory = self._resolve(path)
+
+        if not directory.is_dir():
+            raise FileNotFoundError("Directory not found")
+
+        parent = str(directory)
+        scanned: list[os.DirEntry] = []
+        batch = []
+
+        with os.scandir(parent) as it:
+            for entry in it:
+                if not show_hidden and entry.name.startswith("."):
+                    continue
+
+                try:
+                    is_dir = entry.is_dir()
+                    is_file = not is_dir and entry.is_file()
+                except OSError:
+                    is_dir = is_file = False
+
+                scanned.append(entry)
+                batch.append({
+                    "path": entry.path,
+                    "name": entry.name,
+                    "isDir": is_dir,
+                    "isFile": is_file,
+                    "isHidden": entry.name.startswith("."),
+                })
+
+                if len(batch) >= batch_size:
+                    yield "entries", batch
+                    batch = []
+
+        if batch:
+            yield "entries", batch
+
+        for i in range(0, len(scanned), batch_size):
+            meta = []
+            for entry in scanned[i:i + batch_size]:
+                item = FileSystemEntry.from_dir_entry(entry, parent)
+                data = {
+                    "path": entry.path,
+                    "mtime": item.mtime_ns // 1_000_000,
+                }
+                if item.is_file:
+                    data.update({
+                        "size": item.size,
+                        "extension": get_extension(item.name),
+                        "type": get_file_type(item.name),
+                    })
+                meta.append(data)
+            yield "meta", meta
+
     def stream_read(self, path: str, chunk_size: int = DEFAULT_CHUNK_SIZE):
         """
         Yields file content chunk by chunk (bytes).
@@ -444,38 +1328,95 @@ class FileSystemService:
         if Path(file_path).is_file():
             raise FileAlreadyExistsError("File already exists")
         file_path.parent.mkdir(parents=True, exist_ok=True)
-        return FileWriteStream(open(file_path, "wb"))
+        stream = FileWriteStream(open(file_path, "wb"), on_close=lambda: self._invalidate(file_path))
+        self._invalidate(file_path)
+        return stream
 
     def copy_streamed(self, src: str, dst: str, chunk_size=DEFAULT_CHUNK_SIZE):
         src_path = self._resolve(src)
         dst_path = self._resolve(dst)
         dst_path.parent.mkdir(parents=True, exist_ok=True)
 
-        with open(src_path, "rb") as r, open(dst_path, "wb") as w:
-            while chunk := r.read(chunk_size):
-                w.write(chunk)
+        try:
+            with open(src_path, "rb") as r, open(dst_path, "wb") as w:
+                while chunk := r.read(chunk_size):
+                    w.write(chunk)
+        finally:
+            self._invalidate(dst_path)
+
+    def stream_zip(
+        self,
+        paths: list[str],
+        compression: str = DEFAULT_COMPRESSION_MODE,
+        workers: int = 1,
+    ) -> Iterator[bytes]:
+        """
+        Returns an iterator over the chunks of a zip containing the given
+        files/directories. The paths are resolved up front, so invalid ones
+        raise before anything is sent; the archive itself is written while it
+        is iterated and is never held in memory.
+        `compression` is one of COMPRESSION_MODES. With more than one worker,
+        members are deflated in parallel by a process pool.
+        """
+        policy = CompressionPolicy(compression)
+        resolved = [self._resolve(p) for p in paths]
+
+        if workers > 1:
+            return ParallelZipWriter(policy, workers).write(self._archive_files(resolved))
+        return self._zip_chunks(self._archive_files(resolved), policy)
 
-    def stream_zip(self, paths: list[str]):
+    def _archive_files(self, resolved: list[Path]) -> Iterator[tuple[Path, str]]:
         """
-        Streams a zip containing the given files/directories.
+        (path, arcname) of every file to archive, directories relative to
+        their parent.
         """
-        buffer = io.BytesIO()
+        for root in resolved:
+            if root.is_file():
+                yield root, root.name
+            elif root.is_dir():
+                for file in root.rglob("*"):
+                    if file.is_file():
+                        yield file, str(file.relative_to(root.parent))
+
+    def _zip_chunks(self, files: Iterator[tuple[Path, str]], policy: CompressionPolicy) -> Iterator[bytes]:
+        writer = ZipStreamWriter(policy)
+
+        for file, arcname in files:
+            try:
+                f = open(file, "rb")
+            except OSError:
+                # Removed or unreadable since it was listed
+                continue
+            with f:
+                yield from writer.add_file(f, arcname, os.fstat(f.fileno()))
 
-        with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as zipf:
-            for p in paths:
-                resolved = self._resolve(p)
+        yield from writer.finish()
 
-                if resolved.is_file():
-                    zipf.write(resolved, resolved.name)
+    def stream_tar(self, paths: list[str], zstd_level: int | None = None) -> tuple[int | None, Iterator[bytes]]:
+        """
+        Returns (size, chunks) of a tar of the given files/directories, with
+        permissions, ownership and symlinks kept. The members are listed up
+        front, so the size of a plain tar is exact; it is None when the tar
+        is compressed with zstd at `zstd_level`.
+        Raises ZstdUnavailableError if zstd is asked for but not available.
+        """
+        members = tar_members(self._resolve(p) for p in paths)
+        chunks = stream_tar(members)
 
-                elif resolved.is_dir():
-                    for file in resolved.rglob("*"):
-                        if file.is_file():
-                            arcname = file.relative_to(resolved.parent)
-                            zipf.write(file, arcname)
+        if zstd_level is None:
+            return tar_size(members), chunks
+        return None, zstd_compress(chunks, zstd_level)
 
-        buffer.seek(0)
-        return buffer
+    def archive_layout(self, paths: list[str], archive_format: str) -> ArchiveLayout:
+        """
+        Layout of a plain tar ("tar") or stored zip ("zip") of the given
+        files/directories: its exact size, a token of the files it was
+        listed from and any byte range of it, read on demand.
+        """
+        resolved = [self._resolve(p) for p in paths]
+        if archive_format == "tar":
+            return tar_layout(tar_members(resolved))
+        return zip_store_layout(self._archive_files(resolved))
 
 
 # =========================
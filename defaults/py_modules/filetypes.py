@@ -0,0 +1,172 @@
+from functools import lru_cache
+from types import MappingProxyType
+import mimetypes
+import os
+
+UNKNOWN_TYPE = "unknown"
+DEFAULT_MIME_TYPE = "application/octet-stream"
+
+# =========================
+# Extension table
+# =========================
+# Lowercase suffix -> MIME type. Checked before the mimetypes module, which is
+# slow per call and depends on the host's /etc/mime.types.
+
+_MIME_BY_EXTENSION = {
+    # Images
+    ".png": "image/png",
+    ".jpg": "image/jpeg",
+    ".jpeg": "image/jpeg",
+    ".gif": "image/gif",
+    ".webp": "image/webp",
+    ".avif": "image/avif",
+    ".heic": "image/heic",
+    ".bmp": "image/bmp",
+    ".tga": "image/x-tga",
+    ".ico": "image/vnd.microsoft.icon",
+    ".svg": "image/svg+xml",
+    ".dds": "image/vnd-ms.dds",
+
+    # Video, including Steam game recordings (DASH)
+    ".mp4": "video/mp4",
+    ".m4v": "video/mp4",
+    ".m4s": "video/iso.segment",
+    ".mkv": "video/x-matroska",
+    ".webm": "video/webm",
+    ".mov": "video/quicktime",
+    ".avi": "video/x-msvideo",
+    ".mpd": "application/dash+xml",
+    ".m3u8": "application/vnd.apple.mpegurl",
+
+    # Audio
+    ".mp3": "audio/mpeg",
+    ".flac": "audio/flac",
+    ".ogg": "audio/ogg",
+    ".opus": "audio/ogg",
+    ".wav": "audio/x-wav",
+    ".m4a": "audio/mp4",
+    ".aac": "audio/aac",
+
+    # Text and configuration (Steam KeyValues, Proton/Wine prefixes, emulators)
+    ".txt": "text/plain",
+    ".log": "text/plain",
+    ".md": "text/markdown",
+    ".ini": "text/plain",
+    ".cfg": "text/plain",
+    ".conf": "text/plain",
+    ".vdf": "text/plain",
+    ".acf": "text/plain",
+    ".reg": "text/plain",
+    ".csv": "text/csv",
+    ".xml": "text/xml",
+    ".html": "text/html",
+    ".css": "text/css",
+    ".js": "text/javascript",
+    ".py": "text/x-python",
+    ".sh": "text/x-sh",
+    ".json": "application/json",
+    ".yaml": "application/yaml",
+    ".yml": "application/yaml",
+    ".toml": "application/toml",
+
+    # Windows binaries found in Proton prefixes
+    ".exe": "application/vnd.microsoft.portable-executable",
+    ".dll": "application/vnd.microsoft.portable-executable",
+    ".msi": "application/x-msi",
+    ".lnk": "application/x-ms-shortcut",
+
+    # Archives
+    ".zip": "application/zip",
+    ".7z": "application/x-7z-compressed",
+    ".rar": "application/vnd.rar",
+    ".tar": "application/x-tar",
+    ".gz": "application/gzip",
+    ".tgz": "application/gzip",
+    ".xz": "application/x-xz",
+    ".bz2": "application/x-bzip2",
+    ".zst": "application/zstd",
+
+    # Disc and ROM images
+    ".iso": "application/x-iso9660-image",
+    ".chd": "application/x-mame-chd",
+    ".cue": "application/x-cue",
+    ".bin": "application/octet-stream",
+    ".img": "application/octet-stream",
+    ".cso": "application/x-compressed-iso",
+    ".pbp": "application/x-psp-eboot",
+    ".rvz": "application/x-dolphin-rvz",
+    ".wbfs": "application/x-wbfs",
+    ".wad": "application/x-wii-wad",
+    ".nsp": "application/x-nintendo-switch-package",
+    ".xci": "application/x-nintendo-switch-cartridge",
+    ".3ds": "application/x-nintendo-3ds-rom",
+    ".cia": "application/x-ctr-cia",
+    ".nds": "application/x-nintendo-ds-rom",
+    ".gba": "application/x-gba-rom",
+    ".gbc": "application/x-gameboy-color-rom",
+    ".gb": "application/x-gameboy-rom",
+    ".nes": "application/x-nes-rom",
+    ".sfc": "application/vnd.nintendo.snes.rom",
+    ".smc": "application/vnd.nintendo.snes.rom",
+    ".n64": "application/x-n64-rom",
+    ".z64": "application/x-n64-rom",
+    ".v64": "application/x-n64-rom",
+    ".gen": "application/x-genesis-rom",
+    ".sms": "application/x-sms-rom",
+    ".gg": "application/x-gamegear-rom",
+    ".pce": "application/x-pc-engine-rom",
+    ".a26": "application/x-atari-2600-rom",
+
+    # Emulator saves and states
+    ".sav": "application/octet-stream",
+    ".srm": "application/octet-stream",
+    ".state": "application/octet-stream",
+}
+
+MIME_BY_EXTENSION = MappingProxyType(_MIME_BY_EXTENSION)
+
+TYPE_BY_EXTENSION = MappingProxyType({
+    ext: mime.split("/")[0] for ext, mime in _MIME_BY_EXTENSION.items()
+})
+
+
+# =========================
+# Lookups
+# =========================
+
+@lru_cache(maxsize=1024)
+def _guess_mime_by_extension(ext: str) -> str | None:
+    mime, _ = mimetypes.guess_type("file" + ext)
+    return mime
+
+def get_extension(name: str) -> str:
+    # Same rules as Path.suffix: dotfiles have no extension, a trailing dot is not one
+    ext = os.path.splitext(name)[1]
+    return "" if ext == "." else ext.lower()
+
+def guess_mime_type(name: str | os.PathLike) -> str | None:
+    """
+    MIME type of a file name, from the table first and mimetypes on a miss.
+    """
+    ext = get_extension(os.fspath(name))
+    if not ext:
+        return None
+
+    mime = MIME_BY_EXTENSION.get(ext)
+    if mime is None:
+        mime = _guess_mime_by_extension(ext)
+    return mime
+
+def get_file_type(name: str | os.PathLike) -> str:
+    """
+    Top-level MIME type of a file name ("image", "video", "text"...) or "unknown".
+    """
+    ext = get_extension(os.fspath(name))
+    file_type = TYPE_BY_EXTENSION.get(ext)
+    if file_type is not None:
+        return file_type
+
+    mime = guess_mime_type(name)
+    if not mime:
+        return UNKNOWN_TYPE
+    return mime.split("/")[0]
@@ -0,0 +1,154 @@
+from collections import OrderedDict
+from pathlib import Path
+from typing import BinaryIO, Callable
+import os
+import threading
+import time
+
+OPEN_FILE_CACHE_SIZE = 16
+OPEN_FILE_TTL_SECONDS = 10.0
+READAHEAD_WINDOW = 8 * 1024 * 1024  # 8 MB
+
+# =========================
+# Open files
+# =========================
+
+class OpenFile:
+    """
+    A file opened for serving, with what each request for it needs: the
+    resolved path, its stat and its MIME type. Reads must be positional
+    (os.pread, sendfile with an offset): the file object is shared by
+    every request that hits the cache.
+    """
+    __slots__ = ("path", "file", "st", "mime", "opened", "users", "evicted", "_cache")
+
+    def __init__(self, path: Path, file: BinaryIO, st: os.stat_result, mime: str):
+        self.path = path
+        self.file = file
+        self.st = st
+        self.mime = mime
+        self.opened = time.monotonic()
+        self.users = 0
+        self.evicted = False
+        self._cache: "OpenFileCache | None" = None
+
+    def refresh(self):
+        """
+        Re-reads the stat from the open descriptor: sees in-place writes
+        without resolving the path again.
+        """
+        self.st = os.fstat(self.file.fileno())
+
+    def will_need(self, offset: int, length: int):
+        """
+        Asks the kernel to start reading [offset, offset + length) into the
+        page cache, so the next request for it does not wait on the disk.
+        """
+        if length <= 0 or offset >= self.st.st_size or not hasattr(os, "posix_fadvise"):
+            return
+        try:
+            os.posix_fadvise(self.file.fileno(), offset, length, os.POSIX_FADV_WILLNEED)
+        except OSError:
+            pass
+
+    def release(self):
+        """
+        Hands the file back. It is closed once it has left the cache and
+        no request uses it any more.
+        """
+        if self._cache is not None:
+            self._cache._release(self)
+        else:
+            self.file.close()
+
+
+class OpenFileCache:
+    """
+    LRU cache of open files keyed by the path the client asked for. Scrubbing
+    a video sends a Range request per seek; a hit skips path resolution,
+    stat, MIME lookup and open(). Entries expire after `ttl` seconds, so a
+    file replaced outside the server is picked up, and the server drops
+    them on its own writes, see invalidate().
+    """
+    def __init__(self, max_files: int = OPEN_FILE_CACHE_SIZE, ttl: float = OPEN_FILE_TTL_SECONDS):
+        self.max_files = max_files
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+
+        self._items: OrderedDict[str, OpenFile] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def acquire(self, key: str, open_file: Callable[[], OpenFile]) -> OpenFile:
+        """
+        The cached file for `key`, or a new one from open_file(), which may
+        raise. Call release() on it when done.
+        """
+        now = time.monotonic()
+        with self._lock:
+            item = self._items.get(key)
+            if item is not None and now - item.opened < self.ttl:
+                self._items.move_to_end(key)
+                item.users += 1
+                self.hits += 1
+            else:
+                if item is not None:
+                    self._drop(key)
+                item = None
+                self.misses += 1
+
+        if item is not None:
+            try:
+                item.refresh()
+            except OSError:
+                item.release()
+                raise
+            return item
+
+        item = open_file()
+        item._cache = self
+        item.users = 1
+
+        with self._lock:
+            if key in self._items:
+                self._drop(key)
+            self._items[key] = item
+            while len(self._items) > self.max_files:
+                self._drop(next(iter(self._items)))
+        return item
+
+    def _drop(self, key: str):
+        item = self._items.pop(key)
+        item.evicted = True
+        if item.users == 0:
+            item.file.close()
+
+    def _release(self, item: OpenFile):
+        with self._lock:
+            item.users -= 1
+            close = item.evicted and item.users == 0
+        if close:
+            item.file.close()
+
+    def invalidate(self, path: Path):
+        """
+        Drops the files at or below `path`: written, renamed or deleted.
+        """
+        with self._lock:
+            for key in [k for k, item in self._items.items() if item.path.is_relative_to(path)]:
+                self._drop(key)
+
+    def clear(self):
+        with self._lock:
+            for key in list(self._items):
+                self._drop(key)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "files": len(self._items),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hitRate": self.hits / lookups if lookups else 0.0,
+            }
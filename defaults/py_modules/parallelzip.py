@@ -0,0 +1,337 @@
+from collections import deque
+from functools import lru_cache
+from pathlib import Path
+from multiprocessing.pool import AsyncResult
+from typing import BinaryIO, Iterable, Iterator
+import os
+import zlib
+from compressionpolicy import CompressionPolicy, PROBE_SIZE
+from utils import process_pool_context, init_background_worker
+from zipstream import ZipStreamWriter, ZipMember, ZIP_READ_SIZE
+
+DEFAULT_ZIP_WORKERS = min(4, os.cpu_count() or 1)
+PARALLEL_CHUNK_SIZE = 1024 * 1024  # 1 MB
+DEFAULT_MAX_INFLIGHT_BYTES = 16 * 1024 * 1024  # 16 MB
+MAX_PENDING_MEMBERS = 256  # stored members keep their file open until written
+SMALL_FILE_BATCH = 64
+DEFLATE_WINDOW = 32 * 1024
+
+# =========================
+# CRC-32 combination
+# =========================
+# Each chunk's CRC is computed by the worker that compressed it. The member's
+# CRC is then built as in zlib's crc32_combine(): appending len(B) zero bytes
+# to crc(A) is a linear operator over GF(2), so crc(A + B) = op(crc(A)) ^ crc(B).
+
+def _gf2_times(matrix: tuple[int, ...] | list[int], vector: int) -> int:
+    result = 0
+    i = 0
+    while vector:
+        if vector & 1:
+            result ^= matrix[i]
+        vector >>= 1
+        i += 1
+    return result
+
+def _gf2_square(matrix: list[int]) -> list[int]:
+    return [_gf2_times(matrix, column) for column in matrix]
+
+@lru_cache(maxsize=32)
+def _zeros_operator(length: int) -> tuple[int, ...]:
+    # One zero bit, then squared to 2, 4 and 8 bits: one zero byte
+    power = [0xEDB88320] + [1 << n for n in range(31)]
+    for _ in range(3):
+        power = _gf2_square(power)
+
+    result = [1 << n for n in range(32)]
+    while length:
+        if length & 1:
+            result = [_gf2_times(power, column) for column in result]
+        length >>= 1
+        if length:
+            power = _gf2_square(power)
+    return tuple(result)
+
+def crc32_combine(crc1: int, crc2: int, length2: int) -> int:
+    """
+    CRC-32 of A + B from crc32(A), crc32(B) and len(B).
+    """
+    if length2 <= 0:
+        return crc1
+    return _gf2_times(_zeros_operator(length2), crc1) ^ crc2
+
+
+# =========================
+# Workers
+# =========================
+
+def deflate_chunk(task: tuple[str, int, int, int, bool]) -> tuple[bytes, int, int]:
+    """
+    Runs in a pool process. Compresses `length` bytes of the file at `offset`
+    into raw deflate data that can be concatenated with the previous chunk's:
+    the previous 32 KB are used as the dictionary and a non-final chunk ends
+    on a sync flush. Returns (data, crc32, bytes read).
+    """
+    path, offset, length, level, last = task
+
+    try:
+        with open(path, "rb") as f:
+            start = max(0, offset - DEFLATE_WINDOW)
+            f.seek(start)
+            dictionary = f.read(offset - start)
+            data = f.read(length)
+    except OSError:
+        # Removed since it was listed: the member ends early but stays valid
+        dictionary = data = b""
+
+    if dictionary:
+        compressor = zlib.compressobj(level, zlib.DEFLATED, -15, zdict=dictionary)
+    else:
+        compressor = zlib.compressobj(level, zlib.DEFLATED, -15)
+
+    out = compressor.compress(data) + compressor.flush(zlib.Z_FINISH if last else zlib.Z_SYNC_FLUSH)
+    return out, zlib.crc32(data), len(data)
+
+
+def compress_file(task: tuple[str, str, int, str]) -> tuple[int | None, bytes, int, int] | None:
+    """
+    Runs in a pool process. Reads a whole small file, applies the compression
+    policy and compresses it if the policy says so, keeping the probe off
+    the writer. Returns (level or None if stored, data, crc32, bytes read),
+    or None if the file can not be read.
+    """
+    path, arcname, size, mode = task
+
+    try:
+        with open(path, "rb") as f:
+            data = f.read(size)
+    except OSError:
+        return None
+
+    level = CompressionPolicy(mode).choose(arcname, data[:PROBE_SIZE])
+    if level is None:
+        return None, data, zlib.crc32(data), len(data)
+
+    compressor = zlib.compressobj(level, zlib.DEFLATED, -15)
+    out = compressor.compress(data) + compressor.flush()
+    return level, out, zlib.crc32(data), len(data)
+
+
+def compress_files(tasks: list[tuple[str, str, int, str]]) -> list[tuple[int | None, bytes, int, int] | None]:
+    """
+    compress_file over a batch of small files, to amortize the pool round-trip.
+    """
+    return [compress_file(task) for task in tasks]
+
+
+# =========================
+# Parallel writer
+# =========================
+
+class _PendingMember:
+    __slots__ = ("file_path", "arcname", "st", "level", "head", "file", "small", "batch", "results", "complete", "member", "crc", "read")
+
+    def __init__(self, file_path: str, arcname: str, st: os.stat_result):
+        self.file_path = file_path
+        self.arcname = arcname
+        self.st = st
+        self.level: int | None = None
+        self.head = b""
+        self.file: BinaryIO | None = None  # large stored members, read by the writer
+        self.small = False  # compressed whole by compress_file()
+        self.batch: tuple[AsyncResult, int] | None = None  # (compress_files() call, index in it)
+        self.results: deque[tuple[AsyncResult, int]] = deque()  # large deflated members
+        self.complete = False  # all chunks submitted
+        self.member: ZipMember | None = None
+        self.crc = 0
+        self.read = 0
+
+
+class ParallelZipWriter:
+    """
+    ZIP archive whose members are compressed by a process pool ahead of the
+    writer. Files up to `chunk_size` are probed and compressed whole by a
+    worker, in batches of up to SMALL_FILE_BATCH files; larger ones are split into `chunk_size` deflate chunks shared
+    between workers (like pigz). The output is written in order and is a
+    regular ZIP archive.
+
+    At most `max_inflight` bytes of input are queued or compressed ahead of
+    what has been written, so memory stays bounded however large the archive.
+    """
+    def __init__(
+        self,
+        policy: CompressionPolicy | None = None,
+        workers: int = DEFAULT_ZIP_WORKERS,
+        max_inflight: int = DEFAULT_MAX_INFLIGHT_BYTES,
+        chunk_size: int = PARALLEL_CHUNK_SIZE,
+    ):
+        self.writer = ZipStreamWriter(policy)
+        self.policy = self.writer.policy
+        self.workers = workers
+        self.chunk_size = chunk_size
+        self.max_inflight = max(chunk_size, max_inflight)
+        self._inflight = 0
+
+    def write(self, files: Iterable[tuple[str | Path, str]]) -> Iterator[bytes]:
+        """
+        Yields the chunks of an archive of (path, arcname) files, then the
+        central directory. Files that can not be read are skipped.
+        """
+        pool = process_pool_context().Pool(self.workers, initializer=init_background_worker)
+        pending: deque[_PendingMember] = deque()
+        batch: list[_PendingMember] = []
+        batch_size = 0
+        self._inflight = 0
+
+        def submit_batch():
+            nonlocal batch, batch_size
+            if batch:
+                tasks = [(m.file_path, m.arcname, m.st.st_size, self.policy.mode) for m in batch]
+                result = pool.apply_async(compress_files, (tasks,))
+                for i, m in enumerate(batch):
+                    m.batch = (result, i)
+                batch = []
+                batch_size = 0
+
+        try:
+            for path, arcname in files:
+                path = str(path)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+
+                current = _PendingMember(path, arcname, st)
+                size = st.st_size
+
+                if size <= self.chunk_size:
+                    current.small = True
+                    pending.append(current)
+                    batch.append(current)
+                    batch_size += size
+                    self._inflight += size
+                    if batch_size >= self.chunk_size or len(batch) >= SMALL_FILE_BATCH:
+                        submit_batch()
+                else:
+                    # Keep the output order: earlier small files go first
+                    submit_batch()
+                    if not self._open_large(current):
+                        continue
+                    pending.append(current)
+
+                    for offset in range(0, size, self.chunk_size):
+                        if current.level is None:
+                            break
+                        length = min(self.chunk_size, size - offset)
+                        task = (path, offset, length, current.level, offset + length >= size)
+                        current.results.append((pool.apply_async(deflate_chunk, (task,)), length))
+                        self._inflight += length
+
+                        while self._inflight > self.max_inflight:
+                            yield from self._advance(pending)
+                    current.complete = True
+
+                if self._inflight > self.max_inflight or len(pending) > MAX_PENDING_MEMBERS:
+                    submit_batch()
+                    while self._inflight > self.max_inflight or len(pending) > MAX_PENDING_MEMBERS:
+                        yield from self._advance(pending)
+
+            submit_batch()
+            while pending:
+                yield from self._advance(pending)
+            yield from self.writer.finish()
+        finally:
+            for current in pending:
+                if current.file is not None:
+                    current.file.close()
+            pool.terminate()
+            pool.join()
+
+    def _open_large(self, current: _PendingMember) -> bool:
+        """
+        Applies the policy to the first block of a large file. A stored one
+        keeps its file open for the writer, a deflated one is read by the
+        workers. Returns False if the file can not be read.
+        """
+        try:
+            f = open(current.file_path, "rb")
+        except OSError:
+            return False
+
+        try:
+            current.head = f.read(ZIP_READ_SIZE)
+        except OSError:
+            f.close()
+            return False
+
+        current.level = self.policy.choose(current.arcname, current.head)
+        if current.level is None:
+            current.file = f
+        else:
+            current.head = b""
+            f.close()
+        return True
+
+    def _advance(self, pending: deque[_PendingMember]) -> Iterator[bytes]:
+        """
+        Writes the next piece of the oldest member: all of it if it is small
+        or stored, else its header or one compressed chunk, waiting for the
+        workers if needed. Pops the member once it is written.
+        """
+        writer = self.writer
+        current = pending[0]
+
+        if current.small:
+            result, index = current.batch
+            result = result.get()[index]
+            self._inflight -= current.st.st_size
+            pending.popleft()
+            if result is None:
+                return
+
+            current.level, data, current.crc, current.read = result
+            current.member, chunk = writer.begin_member(current.arcname, current.st, current.level is not None)
+            if chunk:
+                yield chunk
+            if chunk := writer.member_data(current.member, data):
+                yield chunk
+            if chunk := writer.end_member(current.member, current.crc, current.read):
+                yield chunk
+            return
+
+        if current.member is None:
+            current.member, chunk = writer.begin_member(current.arcname, current.st, current.level is not None)
+            if chunk:
+                yield chunk
+
+        if current.level is None:
+            yield from self._write_stored(current)
+        elif current.results:
+            result, length = current.results.popleft()
+            data, crc, read = result.get()
+            self._inflight -= length
+            current.crc = crc32_combine(current.crc, crc, read)
+            current.read += read
+            if chunk := writer.member_data(current.member, data):
+                yield chunk
+            if current.results or not current.complete:
+                return
+        elif not current.complete:
+            return
+
+        if chunk := writer.end_member(current.member, current.crc, current.read):
+            yield chunk
+        pending.popleft()
+
+    def _write_stored(self, current: _PendingMember) -> Iterator[bytes]:
+        # Same snapshot rule as ZipStreamWriter.add_file: at most st_size bytes
+        size = current.st.st_size
+        data = current.head
+        with current.file:
+            while data:
+                current.read += len(data)
+                current.crc = zlib.crc32(data, current.crc)
+                if chunk := self.writer.member_data(current.member, data):
+                    yield chunk
+                data = current.file.read(min(ZIP_READ_SIZE, size - current.read)) if current.read < size else b""
+        current.file = None
@@ -0,0 +1,560 @@
+from pathlib import Path
+from typing import Callable, Iterable
+import ctypes
+import os
+import platform
+import select
+import sqlite3
+import threading
+import time
+import decky
+from filetypes import get_extension
+from watcher import (
+    Inotify, WatchUnavailableError,
+    IN_CREATE, IN_DELETE, IN_MOVED_FROM, IN_MOVED_TO, IN_DELETE_SELF, IN_MOVE_SELF,
+    IN_ONLYDIR, IN_Q_OVERFLOW, IN_IGNORED,
+)
+
+SEARCH_MODES = ("substring", "prefix", "extension")
+DEFAULT_SEARCH_LIMIT = 200
+MAX_SEARCH_LIMIT = 2000
+
+RESCAN_INTERVAL_SECONDS = 15 * 60
+MAX_INDEX_WATCHES = 8192
+INDEX_BATCH_DIRS = 200  # directories per write transaction
+
+# Only name changes matter to the index
+INDEX_WATCH_MASK = IN_CREATE | IN_DELETE | IN_MOVED_FROM | IN_MOVED_TO | IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR
+
+# Trigram queries need at least 3 characters, shorter substrings would be a
+# full scan and are matched as prefixes instead
+MIN_TRIGRAM_QUERY = 3
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    id INTEGER PRIMARY KEY,
+    parent TEXT NOT NULL,
+    name TEXT NOT NULL,
+    ext TEXT NOT NULL,
+    is_dir INTEGER NOT NULL
+);
+CREATE UNIQUE INDEX IF NOT EXISTS entries_path ON entries(parent, name);
+CREATE INDEX IF NOT EXISTS entries_name ON entries(name COLLATE NOCASE);
+CREATE INDEX IF NOT EXISTS entries_ext ON entries(ext);
+
+CREATE TABLE IF NOT EXISTS dirs (
+    path TEXT PRIMARY KEY,
+    ino INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS roots (
+    path TEXT PRIMARY KEY
+);
+
+CREATE VIRTUAL TABLE IF NOT EXISTS entries_fts USING fts5(
+    name, ext, content='entries', content_rowid='id', tokenize='trigram'
+);
+
+CREATE TRIGGER IF NOT EXISTS entries_ai AFTER INSERT ON entries BEGIN
+    INSERT INTO entries_fts(rowid, name, ext) VALUES (new.id, new.name, new.ext);
+END;
+
+CREATE TRIGGER IF NOT EXISTS entries_ad AFTER DELETE ON entries BEGIN
+    INSERT INTO entries_fts(entries_fts, rowid, name, ext) VALUES ('delete', old.id, old.name, old.ext);
+END;
+"""
+
+
+# =========================
+# Utils
+# =========================
+
+IOPRIO_WHO_PROCESS = 1
+IOPRIO_CLASS_IDLE = 3
+IOPRIO_CLASS_SHIFT = 13
+
+# ioprio_set has no libc wrapper
+_IOPRIO_SET_SYSCALL = {"x86_64": 251, "aarch64": 30}
+
+def lower_io_priority() -> bool:
+    """
+    Moves the calling thread to the lowest CPU priority and, where the
+    syscall number is known, to the idle I/O class.
+    Returns True if the I/O class was changed.
+    """
+    if os.name == "nt":
+        return False
+
+    tid = threading.get_native_id()
+    try:
+        # On Linux this only affects the calling thread
+        os.setpriority(os.PRIO_PROCESS, tid, 19)
+    except OSError:
+        pass
+
+    syscall = _IOPRIO_SET_SYSCALL.get(platform.machine())
+    if syscall is None:
+        return False
+
+    try:
+        libc = ctypes.CDLL(None, use_errno=True)
+        return libc.syscall(syscall, IOPRIO_WHO_PROCESS, tid, IOPRIO_CLASS_IDLE << IOPRIO_CLASS_SHIFT) == 0
+    except (OSError, AttributeError):
+        return False
+
+def _subtree_range(path: str) -> tuple[str, str]:
+    # Bounds of every path strictly below `path`, for range scans on TEXT keys
+    prefix = path.rstrip(os.sep) + os.sep
+    return prefix, prefix[:-1] + chr(ord(os.sep) + 1)
+
+def _fts_phrase(text: str) -> str:
+    return '"' + text.replace('"', '""') + '"'
+
+def normalize_roots(paths: Iterable[str | Path]) -> list[str]:
+    """
+    Resolved, existing roots with nested ones and filesystem roots removed.
+    """
+    resolved = []
+    for path in paths:
+        try:
+            p = Path(path).resolve()
+        except OSError:
+            continue
+        if p == Path(p.anchor) or not p.is_dir():
+            continue
+        resolved.append(p)
+
+    roots: list[Path] = []
+    for p in sorted(set(resolved), key=lambda p: len(p.parts)):
+        if not any(p.is_relative_to(r) for r in roots):
+            roots.append(p)
+
+    return [str(r) for r in roots]
+
+
+# =========================
+# Search Index
+# =========================
+
+class SearchIndex:
+    """
+    Persistent filename index (SQLite FTS5, trigram tokenizer) over a set of
+    roots, usually base_dir and the mounted drives.
+
+    A background thread builds it at idle I/O priority, skipping directories
+    whose (st_ino, st_mtime_ns) did not change since they were indexed, then
+    keeps it fresh with inotify (up to `max_watches` directories, shallowest
+    first) and a full mtime pass every `rescan_interval` seconds.
+    Only names are indexed; search results are stat'ed by the caller.
+    """
+    def __init__(
+        self,
+        db_path: str | Path,
+        roots_provider: Callable[[], Iterable[str | Path]],
+        rescan_interval: float = RESCAN_INTERVAL_SECONDS,
+        max_watches: int = MAX_INDEX_WATCHES,
+    ):
+        self.db_path = Path(db_path)
+        self.roots_provider = roots_provider
+        self.rescan_interval = rescan_interval
+        self.max_watches = max_watches
+
+        self.ready = False
+        self.indexing = False
+        self.last_scan_seconds: float | None = None
+
+        self._write_conn: sqlite3.Connection | None = None
+        self._read_conn: sqlite3.Connection | None = None
+        self._write_lock = threading.Lock()
+        self._read_lock = threading.Lock()
+
+        self._thread: threading.Thread | None = None
+        self._stop = threading.Event()
+        self._rescan = threading.Event()
+
+        self._inotify: Inotify | None = None
+        self._wd_by_dir: dict[str, int] = {}
+        self._dir_by_wd: dict[int, str] = {}
+
+        # Directories reported by notify_changed, for ones beyond max_watches
+        self._dirty: set[str] = set()
+        self._dirty_lock = threading.Lock()
+
+    # ---- Connections ----
+    def _connect(self) -> sqlite3.Connection:
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        # Readers never wait for the indexer
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.executescript(_SCHEMA)
+        return conn
+
+    def _writer(self) -> sqlite3.Connection:
+        if self._write_conn is None:
+            self._write_conn = self._connect()
+        return self._write_conn
+
+    def _reader(self) -> sqlite3.Connection:
+        if self._read_conn is None:
+            self._read_conn = self._connect()
+        return self._read_conn
+
+    # ---- Lifecycle ----
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="search-index", daemon=True)
+        self._thread.start()
+
+    def request_rescan(self):
+        self._rescan.set()
+
+    def notify_changed(self, path: str | Path):
+        """
+        Queues the directory containing `path` for the indexer thread.
+        """
+        with self._dirty_lock:
+            self._dirty.add(str(Path(path).parent))
+
+    def close(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+        with self._write_lock:
+            if self._write_conn is not None:
+                self._write_conn.close()
+                self._write_conn = None
+        with self._read_lock:
+            if self._read_conn is not None:
+                self._read_conn.close()
+                self._read_conn = None
+
+    def _run(self):
+        lower_io_priority()
+
+        try:
+            self._inotify = Inotify()
+        except WatchUnavailableError as e:
+            decky.logger.warning(f"SearchIndex - inotify unavailable, relying on rescans: {e}")
+
+        try:
+            next_scan = 0.0
+            while not self._stop.is_set():
+                if self._rescan.is_set() or time.monotonic() >= next_scan:
+                    self._rescan.clear()
+                    self.index_all()
+                    next_scan = time.monotonic() + self.rescan_interval
+
+                dirty = self._wait_for_changes(min(1.0, max(0.0, next_scan - time.monotonic())))
+                with self._dirty_lock:
+                    dirty |= self._dirty
+                    self._dirty.clear()
+
+                if dirty:
+                    self.update_dirs(dirty)
+        except Exception:
+            decky.logger.exception("SearchIndex - indexer stopped")
+        finally:
+            if self._inotify:
+                self._inotify.close()
+                self._inotify = None
+            self._wd_by_dir.clear()
+            self._dir_by_wd.clear()
+
+    # ---- inotify ----
+    def _watch(self, directory: str):
+        if self._inotify is None or directory in self._wd_by_dir or len(self._wd_by_dir) >= self.max_watches:
+            return
+        try:
+            wd = self._inotify.add_watch(directory, INDEX_WATCH_MASK)
+        except OSError:
+            return
+        self._wd_by_dir[directory] = wd
+        self._dir_by_wd[wd] = directory
+
+    def _unwatch(self, directory: str):
+        wd = self._wd_by_dir.pop(directory, None)
+        if wd is not None:
+            self._dir_by_wd.pop(wd, None)
+            if self._inotify:
+                self._inotify.rm_watch(wd)
+
+    def _wait_for_changes(self, timeout: float) -> set[str]:
+        if self._inotify is None:
+            self._stop.wait(timeout)
+            return set()
+
+        ready, _, _ = select.select([self._inotify.fd], [], [], timeout)
+        if not ready:
+            return set()
+
+        dirty = set()
+        for wd, mask, _name in self._inotify.read_events():
+            if mask & IN_Q_OVERFLOW:
+                self._rescan.set()
+                continue
+
+            directory = self._dir_by_wd.get(wd)
+            if directory is None:
+                continue
+
+            if mask & (IN_DELETE_SELF | IN_MOVE_SELF | IN_IGNORED):
+                # The parent's own event updates the index
+                self._wd_by_dir.pop(directory, None)
+                self._dir_by_wd.pop(wd, None)
+                continue
+
+            dirty.add(directory)
+
+        return dirty
+
+    # ---- Indexing ----
+    def index_all(self):
+        """
+        Full pass over the current roots; drops roots that are gone.
+        """
+        try:
+            roots = normalize_roots(self.roots_provider())
+        except Exception:
+            decky.logger.exception("SearchIndex - failed listing roots")
+            return
+
+        self.indexing = True
+        started = time.monotonic()
+
+        try:
+            with self._write_lock:
+                conn = self._writer()
+                known = [row[0] for row in conn.execute("SELECT path FROM roots")]
+                with conn:
+                    for root in known:
+                        if root not in roots:
+                            self._purge(conn, root)
+                            conn.execute("DELETE FROM roots WHERE path = ?", (root,))
+                    conn.executemany("INSERT OR IGNORE INTO roots VALUES (?)", ((r,) for r in roots))
+
+            for root in roots:
+                if self._stop.is_set():
+                    return
+                self._walk([root], full=True)
+
+            self.ready = True
+            self.last_scan_seconds = time.monotonic() - started
+        finally:
+            self.indexing = False
+
+    def update_dirs(self, directories: Iterable[str]):
+        """
+        Re-indexes changed directories, descending only into new subdirectories.
+        """
+        self._walk(list(directories), full=False)
+
+    def _walk(self, directories: list[str], full: bool):
+        """
+        With `full`, every directory is visited and unchanged ones only cost
+        a stat(); otherwise only the given directories and new subtrees are.
+        Subdirectories on another filesystem (mount points) are indexed by
+        name but not walked: they are their own root, if one at all.
+        """
+        # (directory, st_dev it must be on, None for the given ones)
+        stack: list[tuple[str, int | None]] = [(d, None) for d in directories]
+        pending = 0
+
+        with self._write_lock:
+            conn = self._writer()
+            try:
+                while stack:
+                    if self._stop.is_set():
+                        return
+
+                    directory, device = stack.pop()
+                    found = self._sync_dir(conn, directory, device)
+                    if found is None:
+                        continue
+
+                    subdirs, added, device = found
+                    stack.extend((d, device) for d in (subdirs if full else added))
+
+                    pending += 1
+                    if pending >= INDEX_BATCH_DIRS:
+                        conn.commit()
+                        pending = 0
+            finally:
+                conn.commit()
+
+    def _sync_dir(self, conn: sqlite3.Connection, directory: str, device: int | None = None) -> tuple[list[str], list[str], int] | None:
+        """
+        Brings the rows of one directory up to date.
+        Returns its subdirectories, the new ones among them and its st_dev,
+        or None if it is not on `device`: the same rule for a fresh scan and
+        for an unchanged directory whose subdirectories come from the index.
+        """
+        try:
+            st = os.stat(directory, follow_symlinks=False)
+        except OSError:
+            self._purge(conn, directory)
+            return [], [], 0
+
+        if device is not None and st.st_dev != device:
+            return None
+
+        self._watch(directory)
+
+        row = conn.execute("SELECT ino, mtime_ns FROM dirs WHERE path = ?", (directory,)).fetchone()
+        if row == (st.st_ino, st.st_mtime_ns):
+            subdirs = [
+                os.path.join(directory, name)
+                for (name,) in conn.execute("SELECT name FROM entries WHERE parent = ? AND is_dir = 1", (directory,))
+            ]
+            return subdirs, [], st.st_dev
+
+        current: dict[str, bool] = {}
+        subdirs = []
+        try:
+            with os.scandir(directory) as it:
+                for entry in it:
+                    try:
+                        is_dir = entry.is_dir(follow_symlinks=False)
+                    except OSError:
+                        is_dir = False
+                    if is_dir:
+                        subdirs.append(entry.path)
+                    current[entry.name] = is_dir
+        except OSError:
+            self._purge(conn, directory)
+            return [], [], st.st_dev
+
+        existing = {
+            name: bool(is_dir)
+            for name, is_dir in conn.execute("SELECT name, is_dir FROM entries WHERE parent = ?", (directory,))
+        }
+
+        for name, was_dir in existing.items():
+            if current.get(name) != was_dir:
+                conn.execute("DELETE FROM entries WHERE parent = ? AND name = ?", (directory, name))
+                if was_dir:
+                    self._purge(conn, os.path.join(directory, name))
+
+        conn.executemany(
+            "INSERT INTO entries (parent, name, ext, is_dir) VALUES (?, ?, ?, ?)",
+            (
+                (directory, name, "" if is_dir else get_extension(name), int(is_dir))
+                for name, is_dir in current.items()
+                if existing.get(name) != is_dir
+            ),
+        )
+
+        conn.execute(
+            "INSERT OR REPLACE INTO dirs VALUES (?, ?, ?)",
+            (directory, st.st_ino, st.st_mtime_ns),
+        )
+
+        added = [p for p in subdirs if os.path.basename(p) not in existing]
+        return subdirs, added, st.st_dev
+
+    def _purge(self, conn: sqlite3.Connection, directory: str):
+        """
+        Removes a directory and everything below it from the index.
+        """
+        low, high = _subtree_range(directory)
+        conn.execute("DELETE FROM entries WHERE parent = ? OR (parent >= ? AND parent < ?)", (directory, low, high))
+        conn.execute("DELETE FROM dirs WHERE path = ? OR (path >= ? AND path < ?)", (directory, low, high))
+
+        for watched in [d for d in self._wd_by_dir if d == directory or d.startswith(low)]:
+            self._unwatch(watched)
+
+    # ---- Queries ----
+    def search(
+        self,
+        query: str = "",
+        mode: str = "substring",
+        extension: str | None = None,
+        under: str | None = None,
+        limit: int = DEFAULT_SEARCH_LIMIT,
+    ) -> list[tuple[str, str, bool]]:
+        """
+        Returns up to `limit` (parent, name, is_dir) rows, case-insensitive:
+          substring - names containing `query` (prefix below 3 characters)
+          prefix    - names starting with `query`
+          extension - files with extension `query` (".iso" or "iso")
+        `extension` further restricts substring and prefix results, and
+        `under` restricts every mode to a directory subtree.
+        """
+        if mode not in SEARCH_MODES:
+            raise ValueError(f"Invalid search mode '{mode}'")
+
+        limit = max(1, min(int(limit), MAX_SEARCH_LIMIT))
+
+        if mode == "extension":
+            extension, query = query, ""
+
+        if mode == "substring" and len(query) < MIN_TRIGRAM_QUERY:
+            mode = "prefix"
+
+        ext = None
+        if extension:
+            ext = extension.lower()
+            ext = ext if ext.startswith(".") else "." + ext
+
+        where = []
+        params: list = []
+        source = "entries e"
+        fts = []
+
+        if query and mode == "substring":
+            fts.append("name : " + _fts_phrase(query))
+        elif query and mode == "prefix":
+            where.append("e.name >= ? COLLATE NOCASE AND e.name < ? COLLATE NOCASE")
+            params.extend([query, query + "\U0010ffff"])
+
+        if ext:
+            where.append("e.ext = ?")
+            params.append(ext)
+            # Intersecting both posting lists beats filtering every name match
+            if fts and len(ext) >= MIN_TRIGRAM_QUERY:
+                fts.append("ext : " + _fts_phrase(ext))
+
+        if fts:
+            # CROSS JOIN keeps the FTS lookup as the outer loop, otherwise the
+            # planner may walk entries_ext and run MATCH once per row
+            source = "entries_fts f CROSS JOIN entries e ON e.id = f.rowid"
+            where.insert(0, "entries_fts MATCH ?")
+            params.insert(0, " AND ".join(fts))
+
+        if under:
+            low, high = _subtree_range(under)
+            where.append("(e.parent = ? OR (e.parent >= ? AND e.parent < ?))")
+            params.extend([under, low, high])
+
+        if not where:
+            return []
+
+        sql = f"SELECT e.parent, e.name, e.is_dir FROM {source} WHERE {' AND '.join(where)} LIMIT ?"
+        params.append(limit)
+
+        with self._read_lock:
+            rows = self._reader().execute(sql, params).fetchall()
+
+        return [(parent, name, bool(is_dir)) for parent, name, is_dir in rows]
+
+    def stats(self) -> dict:
+        with self._read_lock:
+            conn = self._reader()
+            entries = conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+            dirs = conn.execute("SELECT COUNT(*) FROM dirs").fetchone()[0]
+            roots = [row[0] for row in conn.execute("SELECT path FROM roots")]
+
+        return {
+            "ready": self.ready,
+            "indexing": self.indexing,
+            "entries": entries,
+            "directories": dirs,
+            "roots": roots,
+            "watches": len(self._wd_by_dir),
+            "lastScanSeconds": self.last_scan_seconds,
+        }
@@ -3,16 +3,36 @@ from aiohttp import ClientConnectionResetError, web, BodyPartReader, MultipartRe
 from pathlib import Path
 from typing import Any, Union
 import asyncio
+import functools
 import secrets
-import mimetypes
 import os
 import socket
 import bcrypt
-from filesystem import FileSystemError, FileSystemService, FileAlreadyExistsError, get_all_drives, get_drive_root
+from filesystem import FileSystemError, NotAFileError, FileSystemService, shutdown_count_executor, FileSystemEntry, FileAlreadyExistsError, get_all_drives, get_drive_root, DEFAULT_PAGE_SIZE, LISTING_FORMATS, ARCHIVE_FORMATS, encode_columnar
 import decky
 import gamerecording
+from watcher import DirectoryWatcher, WatchUnavailableError
+from asyncfs import AsyncFileSystemService, DEFAULT_IO_WORKERS, DEFAULT_STREAM_WORKERS
+from dirsize import DirectorySizeService
+from searchindex import SearchIndex, DEFAULT_SEARCH_LIMIT
+from contentsearch import ContentSearch, DEFAULT_MAX_MATCHES
+from duplicates import DuplicateFinder, HashStore, DEFAULT_MIN_DUPLICATE_SIZE
+from compressionpolicy import COMPRESSION_MODES, DEFAULT_COMPRESSION_MODE, ZSTD_LEVELS
+from parallelzip import DEFAULT_ZIP_WORKERS
+from tarstream import zstd_available
+from openfiles import OpenFile, READAHEAD_WINDOW
+from filesend import (
+    send_open_file, send_file_ranges, file_etag, http_date, is_not_modified, if_range_matches,
+    parse_byte_range, parse_byte_ranges, MultipartRanges, RangeNotSatisfiableError,
+)
+from archivelayout import ArchiveLayout
+from transferqos import TransferScheduler, UNLIMITED
+from collections import OrderedDict
 import subprocess
 import ssl
+import json
+import re
+import threading
 
 # Load user's settings
 from shared_settings import get_server_settings_manager, get_credentials_manager, get_credentials_settings, get_server_settings
@@ -35,8 +55,13 @@ if not BACKEND_DIR.exists():
 WEBUI_DIR = BACKEND_DIR / "webui"
 SSL_CERT = PLUGIN_DIR / "bin/ssl/cert.pem"
 SSL_KEY = PLUGIN_DIR / "bin/ssl/key.pem"
+DIR_SIZE_CACHE_FILE = SETTINGS_DIR / "dir_sizes.sqlite3"
+SEARCH_INDEX_FILE = SETTINGS_DIR / "search_index.sqlite3"
+HASH_CACHE_FILE = SETTINGS_DIR / "file_hashes.sqlite3"
 
 AUTH_COOKIE = "auth_token"
+WATCH_PATH = "/api/dir/watch"
+DOWNLOAD_LINK_PATH = "/api/download/"
 AUTH_TOKEN_FIELD = "auth_tokens"
 
 DEFAULT_PORT = 8082
@@ -50,6 +75,24 @@ BASE_DIR_FIELD = "base_dir"
 PORT_FIELD = "port"
 HOST_FIELD = "host"
 SHUTDOWN_TIMEOUT_FIELD = "shutdown_timeout_seconds"
+LISTING_CACHE_FIELD = "listing_cache_mb"
+IO_WORKERS_FIELD = "io_workers"
+STREAM_WORKERS_FIELD = "stream_workers"
+ZIP_COMPRESSION_FIELD = "zip_compression"
+ZIP_WORKERS_FIELD = "zip_workers"
+PLAIN_HTTP_PORT_FIELD = "plain_http_port"
+TRANSFER_LIMIT_FIELD = "transfer_limit_kbs"
+CLIENT_TRANSFER_LIMIT_FIELD = "client_transfer_limit_kbs"
+GAMING_MODE_FIELD = "gaming_mode"
+
+# The plain HTTP listener (zero-copy file transfers) never leaves the device
+PLAIN_HTTP_HOST = "127.0.0.1"
+
+DEFAULT_LISTING_CACHE_MB = 32
+ARCHIVE_LAYOUT_CACHE_SIZE = 4  # recent archive layouts, kept for their file CRCs
+GAMING_MODE_LIMIT_KBS = 5 * 1024  # 5 MB/s for all transfers while a game runs
+DOWNLOAD_LINK_TTL_SECONDS = 3600  # after the last request, so a download can be resumed later
+MAX_DOWNLOAD_LINKS = 32
 
 
 
@@ -60,6 +103,20 @@ SHUTDOWN_TIMEOUT_FIELD = "shutdown_timeout_seconds"
 class PortAlreadyInUseError(Exception):
     pass
 
+# =========================
+# Download links
+# =========================
+
+class DownloadLink:
+    """
+    The body of a download request, served by GET until `expires` (loop time).
+    """
+    __slots__ = ("data", "expires")
+
+    def __init__(self, data: dict, expires: float):
+        self.data = data
+        self.expires = expires
+
 # =========================
 # Middleware
 # =========================
@@ -69,6 +126,10 @@ async def activity_middleware(request, handler):
     app = request.app
     server: "WebServer" = app["server"]
 
+    # An open watch socket alone must not keep the server from shutting down
+    if request.path == WATCH_PATH:
+        return await handler(request)
+
     server._active_requests += 1
     server._last_activity = asyncio.get_running_loop().time()
 
@@ -91,6 +152,10 @@ async def auth_middleware(request, handler):
     if path == "/api/login":
         return await handler(request)
 
+    # Download links carry their own token: download managers resume them without the cookie
+    if path.startswith(DOWNLOAD_LINK_PATH):
+        return await handler(request)
+
     token = request.cookies.get(AUTH_COOKIE)
 
     if not token or token not in request.app[AUTH_TOKEN_FIELD]:
@@ -192,12 +257,13 @@ def create_ssl_context() -> ssl.SSLContext:
 def get_file_system_service() -> FileSystemService:
     server_settings = get_server_settings()
     print(server_settings.get_base_dir())
+    listing_cache_bytes = int(settings_server.getSetting(LISTING_CACHE_FIELD) or DEFAULT_LISTING_CACHE_MB) * 1024 * 1024
     fs = None
     try:
-        fs = FileSystemService(server_settings.get_base_dir())
+        fs = FileSystemService(server_settings.get_base_dir(), listing_cache_bytes)
     except FileSystemError as e:
         decky.logger.exception(f"The directory {server_settings.get_base_dir()} doesn't exist, fallback to {os.path.expanduser('~')}")
-        fs = FileSystemService(os.path.expanduser("~"))
+        fs = FileSystemService(os.path.expanduser("~"), listing_cache_bytes)
     return fs
 
 def get_videos_dir() -> Path:
@@ -214,6 +280,27 @@ class WebServer:
     ):
         self.webui_dir = WEBUI_DIR
         self.fs = fs
+        # Blocking filesystem work runs here, never on the event loop
+        self.afs = AsyncFileSystemService(
+            fs,
+            int(settings_server.getSetting(IO_WORKERS_FIELD) or DEFAULT_IO_WORKERS),
+            int(settings_server.getSetting(STREAM_WORKERS_FIELD) or DEFAULT_STREAM_WORKERS),
+        )
+        # Recursive folder sizes, cached on disk and told about our own writes
+        self.dir_sizes = DirectorySizeService(DIR_SIZE_CACHE_FILE)
+        fs.add_invalidation_listener(self.dir_sizes.invalidate)
+        # Filename search, built in the background once the server starts
+        self.search_index = SearchIndex(SEARCH_INDEX_FILE, self._search_roots)
+        fs.add_invalidation_listener(self.search_index.notify_changed)
+        # Partial/full file hashes of the duplicate finder
+        self.hash_store = HashStore(HASH_CACHE_FILE)
+        # Layouts of stored archives by token, so a resumed download reuses the CRCs read so far
+        self._archive_layouts: OrderedDict[str, ArchiveLayout] = OrderedDict()
+        # GET URLs of downloads by token, see create_download_link
+        self._download_links: OrderedDict[str, DownloadLink] = OrderedDict()
+        # Bandwidth limits and fair sharing between concurrent transfers
+        self.qos = TransferScheduler()
+        self.apply_transfer_limits()
 
         self.host = host
         self.port = port
@@ -224,6 +311,12 @@ class WebServer:
 
         self.runner = None
         self.site = None
+        self.plain_site = None
+
+        # Live directory watch
+        self._watcher: DirectoryWatcher | None = None
+        self._watch_unavailable = False
+        self._watch_sockets: set[web.WebSocketResponse] = set()
 
         # Inactivity check
         self._last_activity = asyncio.get_running_loop().time()
@@ -236,6 +329,19 @@ class WebServer:
         self._setup_routes()
         self._setup_static()
 
+    def apply_transfer_limits(self):
+        """
+        Reads the transfer limits (KB/s, 0 is unlimited) from the settings.
+        Gaming mode caps the global limit to GAMING_MODE_LIMIT_KBS.
+        """
+        global_limit = int(settings_server.getSetting(TRANSFER_LIMIT_FIELD) or UNLIMITED)
+        client_limit = int(settings_server.getSetting(CLIENT_TRANSFER_LIMIT_FIELD) or UNLIMITED)
+        if settings_server.getSetting(GAMING_MODE_FIELD):
+            global_limit = min(global_limit, GAMING_MODE_LIMIT_KBS) if global_limit else GAMING_MODE_LIMIT_KBS
+
+        self.qos.set_limits(global_limit * 1024, client_limit * 1024)
+        decky.logger.info(f"Transfer limits - global {global_limit} KB/s, per client {client_limit} KB/s")
+
     def _setup_routes(self):
         self.app.router.add_get("/", self.index)
         
@@ -244,9 +350,18 @@ class WebServer:
         self.app.router.add_get("/api/login/is-logged", self.is_logged)
 
         self.app.router.add_get("/api/ping", self.ping)
+        self.app.router.add_get("/api/stats", self.stats)
         self.app.router.add_post("/api/dir/list", self.list_dir)
+        self.app.router.add_post("/api/dir/counts", self.count_items)
+        self.app.router.add_post("/api/dir/size", self.dir_size)
+        self.app.router.add_post("/api/search", self.search)
+        self.app.router.add_post("/api/dir/grep", self.grep)
+        self.app.router.add_post("/api/dir/duplicates", self.find_duplicates)
+        self.app.router.add_get(WATCH_PATH, self.watch_dir)
         self.app.router.add_post("/api/dir/upload", self.upload)
         self.app.router.add_post("/api/dir/download", self.download)
+        self.app.router.add_post("/api/dir/download/link", self.create_download_link)
+        self.app.router.add_get(DOWNLOAD_LINK_PATH + "{token}", self.download_link)
         self.app.router.add_post("/api/dir/delete", self.delete)
         self.app.router.add_post("/api/file/rename", self.rename)
         self.app.router.add_post("/api/dir/paste", self.paste_move)
@@ -337,15 +452,47 @@ class WebServer:
     async def ping(self, request):
         return web.json_response({"status": "ok"})
 
+    @log_exceptions
+    async def stats(self, request: web.Request):
+        """
+        Internal counters, used to tune cache sizes
+        """
+        return web.json_response({
+            "listingCache": self.fs.listing_cache.stats(),
+            "openFiles": self.fs.open_files.stats(),
+            "transferQos": self.qos.stats(),
+            "fsExecutor": self.afs.stats(),
+            "searchIndex": await self.afs.run("search_stats", self.search_index.stats),
+        })
+
     @log_exceptions
     async def list_dir(self, request: web.Request):
+        """
+        Optional JSON fields:
+        {
+            "lazyCounts": false,    # itemsCount is null, see /api/dir/counts
+            "format": "objects",    # objects | columnar, see encode_columnar
+            "stream": false,        # NDJSON response, see _stream_dir
+            "limit": 500,           # enables pagination, sorting and filtering
+            "cursor": "...",        # nextCursor of the previous page
+            "sort": "name",         # name | size | mtime | type
+            "descending": false,
+            "showHidden": true,
+            "prefix": ""
+        }
+        """
         server_settings = get_server_settings()
         try:
             data = await request.json()
             path = data.get("path")
         except Exception:
+            data = {}
             path = server_settings.get_base_dir()
 
+        lazy_counts = bool(data.get("lazyCounts", False))
+        listing_format = data.get("format") or "objects"
+        paginated = any(key in data for key in ("limit", "cursor", "sort", "showHidden", "prefix"))
+
         if not path:
             path = server_settings.get_base_dir()
 
@@ -353,29 +500,424 @@ class WebServer:
             path = server_settings.get_base_dir()
 
         try:
-            selected_dir = self.fs.get_object(path)
-            selected_drive = get_drive_root(path)
+            selected_dir = await self.afs.get_object(path)
+            selected_drive = await self.afs.get_drive_root(selected_dir.path)
+            # Paginated and streamed listings leave the count to /api/dir/counts, as for their entries
+            selected_entry = await self._selected_dir_dict(selected_dir, not (lazy_counts or paginated or data.get("stream")))
 
-            if not selected_dir.isDir():
+            if not selected_entry["isDir"]:
                 return web.json_response(
                     {"error": "Path is not a directory"},
                     status=400
                 )
 
-            items = self.fs.list_dir(path)
+            if listing_format not in LISTING_FORMATS:
+                return web.json_response(
+                    {"error": f"Invalid format '{listing_format}'"},
+                    status=400
+                )
+
+            if data.get("stream"):
+                return await self._stream_dir(request, selected_dir, selected_entry, selected_drive, bool(data.get("showHidden", True)))
+
+            if not paginated:
+                items = await self.afs.list_dir(path)
+
+                return web.json_response({
+                    "selectedDir": selected_entry,
+                    "selectedDrive":str(selected_drive),
+                    "format": listing_format,
+                    "dirContent": await self._encode_listing(selected_dir, items, listing_format, lazy_counts)
+                })
+
+            page = await self.afs.list_dir_page(
+                path,
+                sort=data.get("sort") or "name",
+                descending=bool(data.get("descending", False)),
+                show_hidden=bool(data.get("showHidden", True)),
+                prefix=data.get("prefix") or "",
+                cursor=data.get("cursor"),
+                limit=data.get("limit") or DEFAULT_PAGE_SIZE,
+            )
 
             return web.json_response({
-                "selectedDir": selected_dir.to_dict(),
+                "selectedDir": selected_entry,
                 "selectedDrive":str(selected_drive),
-                "dirContent": [obj.to_dict() for obj in items]
+                "format": listing_format,
+                "dirContent": await self._encode_listing(selected_dir, page.entries, listing_format, lazy_counts),
+                "total": page.total,
+                "nextCursor": page.next_cursor
             })
 
-        except (FileSystemError, FileNotFoundError) as e:
+        except (FileSystemError, FileNotFoundError, ValueError, TypeError) as e:
             return web.json_response(
                 {"error": str(e)},
                 status=400
             )
     
+    async def _selected_dir_dict(self, selected_dir, with_items_count: bool) -> dict:
+        # A stat, and with the count a scandir of the whole directory: off the event loop
+        path = selected_dir.path
+        return await self.afs.run(
+            "selected_dir",
+            lambda: FileSystemEntry.from_path(str(path.parent), path.name).to_dict(with_items_count)
+        )
+
+    async def _encode_listing(self, selected_dir, entries, listing_format: str, lazy_counts: bool):
+        # Counting directory items hits the disk, keep it off the event loop
+        if listing_format == "columnar":
+            return await self.afs.run(
+                "encode_listing", encode_columnar, str(selected_dir.path), entries, not lazy_counts
+            )
+
+        if lazy_counts:
+            return [obj.to_dict(with_items_count=False) for obj in entries]
+
+        return await self.afs.run(
+            "encode_listing", lambda: [obj.to_dict() for obj in entries]
+        )
+
+    async def _stream_dir(self, request: web.Request, selected_dir, selected_entry: dict, selected_drive, show_hidden: bool):
+        """
+        Streams a listing as newline-delimited JSON while scandir is still running:
+          {"event": "dir", "selectedDir": {...}, "selectedDrive": "..."}
+          {"event": "entries", "items": [{path, name, isDir, isFile, isHidden}, ...]}
+          {"event": "meta", "items": [{path, mtime, size, extension, type}, ...]}  (mtime in ms)
+          {"event": "end", "total": n}
+        """
+        batches = self.fs.stream_dir(str(selected_dir.path), show_hidden=show_hidden)
+
+        # Resolve and open the directory before committing to a 200
+        first = await self.afs.run("stream_dir", next, batches, None)
+
+        response = web.StreamResponse(headers={"Content-Type": "application/x-ndjson"})
+        total = 0
+
+        try:
+            await response.prepare(request)
+            await response.write(json.dumps({
+                "event": "dir",
+                "selectedDir": selected_entry,
+                "selectedDrive": str(selected_drive),
+            }).encode() + b"\n")
+
+            batch = first
+            while batch is not None:
+                event, items = batch
+                if event == "entries":
+                    total += len(items)
+
+                await response.write(json.dumps({"event": event, "items": items}).encode() + b"\n")
+                batch = await self.afs.run("stream_dir", next, batches, None)
+
+            await response.write(json.dumps({"event": "end", "total": total}).encode() + b"\n")
+            await response.write_eof()
+        except (ClientConnectionResetError, asyncio.CancelledError):
+            decky.logger.info("Client disconnected during directory streaming")
+        finally:
+            try:
+                batches.close()
+            except ValueError:
+                # Still running in the executor, it is dropped with the response
+                pass
+
+        return response
+
+    def _get_watcher(self) -> DirectoryWatcher | None:
+        if self._watcher is None and not self._watch_unavailable:
+            try:
+                self._watcher = DirectoryWatcher(
+                    on_change=self.fs.invalidate_listing,
+                    run=functools.partial(self.afs.run, "watch"),
+                )
+            except WatchUnavailableError as e:
+                decky.logger.warning(f"Directory watch disabled: {e}")
+                self._watch_unavailable = True
+        return self._watcher
+
+    @log_exceptions
+    async def watch_dir(self, request: web.Request):
+        """
+        WebSocket pushing changes of the directories a client has open.
+        Client messages: {"action": "watch" | "unwatch", "path": "/some/dir"}
+        Server messages: see DirectoryWatcher, plus
+            {"type": "watching", "path": ...}, {"type": "error", ...}, {"type": "unsupported"}
+        """
+        ws = web.WebSocketResponse(heartbeat=30)
+        await ws.prepare(request)
+
+        watcher = self._get_watcher()
+        if watcher is None:
+            await ws.send_json({"type": "unsupported"})
+            await ws.close()
+            return ws
+
+        # Everything is sent by a single task, in order
+        queue: asyncio.Queue[dict] = asyncio.Queue()
+        callback = queue.put_nowait
+        watched: set[str] = set()
+
+        async def sender():
+            try:
+                while True:
+                    message = await queue.get()
+                    await ws.send_json(message)
+            except (ClientConnectionResetError, ConnectionResetError):
+                pass
+
+        sender_task = asyncio.create_task(sender())
+        self._watch_sockets.add(ws)
+
+        try:
+            async for msg in ws:
+                if msg.type != aiohttp.WSMsgType.TEXT:
+                    continue
+
+                try:
+                    data = json.loads(msg.data)
+                    action = data.get("action")
+                    directory = str(await self.afs.resolve_path(data.get("path")))
+                except (ValueError, AttributeError, FileSystemError) as e:
+                    callback({"type": "error", "error": str(e)})
+                    continue
+
+                if action == "watch":
+                    try:
+                        await watcher.subscribe(directory, callback)
+                    except OSError as e:
+                        callback({"type": "error", "path": directory, "error": e.strerror})
+                        continue
+                    watched.add(directory)
+                    callback({"type": "watching", "path": directory})
+
+                elif action == "unwatch" and directory in watched:
+                    watcher.unsubscribe(directory, callback)
+                    watched.discard(directory)
+        finally:
+            for directory in watched:
+                watcher.unsubscribe(directory, callback)
+            sender_task.cancel()
+            self._watch_sockets.discard(ws)
+
+        return ws
+
+    @log_exceptions
+    async def count_items(self, request: web.Request):
+        """
+        Follow-up for listings requested with lazyCounts.
+        Expects JSON: { "paths": ["/dir/a", "/dir/b"] }
+        """
+        data = await request.json()
+        paths = data.get("paths")
+
+        if not paths or not isinstance(paths, list):
+            raise web.HTTPBadRequest(reason="Missing paths")
+
+        counts = await self.afs.count_items(paths)
+
+        return web.json_response({"counts": counts})
+
+    @log_exceptions
+    async def dir_size(self, request: web.Request):
+        """
+        Recursive size of a directory, streamed as newline-delimited JSON:
+          {"event": "progress", "size": n, "allocated": n, "files": n, "dirs": n, ...}
+          {"event": "end", ..., "children": {"subdir": size, ...}}
+        Expects JSON: { "path": "/dir", "refresh": false }
+        """
+        data = await request.json()
+        path = data.get("path")
+
+        if not path:
+            raise web.HTTPBadRequest(reason="Missing path")
+
+        try:
+            selected_dir = await self.afs.get_object(path)
+        except (FileSystemError, FileNotFoundError) as e:
+            return web.json_response({"error": str(e)}, status=400)
+
+        if not selected_dir.isDir():
+            return web.json_response({"error": "Path is not a directory"}, status=400)
+
+        cancel = threading.Event()
+        walk = self.dir_sizes.walk(selected_dir.path, refresh=bool(data.get("refresh", False)), cancel=cancel)
+        response = web.StreamResponse(headers={"Content-Type": "application/x-ndjson"})
+
+        try:
+            await response.prepare(request)
+
+            async for totals in self.afs.iterate("dir_size", walk):
+                event = "end" if totals.pop("done") else "progress"
+                await response.write(json.dumps({"event": event, **totals}).encode() + b"\n")
+
+            await response.write_eof()
+        except (ClientConnectionResetError, asyncio.CancelledError):
+            decky.logger.info("Client disconnected during folder size walk")
+        finally:
+            # Stops the walk at its next progress check
+            cancel.set()
+
+        return response
+
+    def _search_roots(self) -> list[Path]:
+        roots = [self.fs.base_dir]
+        try:
+            roots += [drive.path for drive in get_all_drives()]
+        except Exception:
+            decky.logger.exception("search - failed listing drives, indexing base_dir only")
+        return roots
+
+    @log_exceptions
+    async def search(self, request: web.Request):
+        """
+        Filename search over base_dir and the mounted drives.
+        Expects JSON:
+        {
+            "query": "zelda",
+            "mode": "substring",    # substring | prefix | extension
+            "extension": ".iso",    # optional filter
+            "path": "/dir",         # optional, search below this directory
+            "limit": 200
+        }
+        """
+        data = await request.json()
+        query = data.get("query") or ""
+        under = None
+
+        started = asyncio.get_running_loop().time()
+
+        try:
+            if data.get("path"):
+                under = str((await self.afs.get_object(data["path"])).path)
+
+            rows = await self.afs.run(
+                "search",
+                self.search_index.search,
+                query,
+                data.get("mode") or "substring",
+                data.get("extension"),
+                under,
+                data.get("limit") or DEFAULT_SEARCH_LIMIT,
+            )
+        except (FileSystemError, FileNotFoundError, ValueError, TypeError) as e:
+            return web.json_response({"error": str(e)}, status=400)
+
+        def stat_results():
+            # The index only has names: entries removed since are skipped
+            entries = []
+            for parent, name, _is_dir in rows:
+                try:
+                    entries.append(FileSystemEntry.from_path(parent, name))
+                except OSError:
+                    continue
+            entries.sort(key=lambda e: (not e.is_dir, e.name.casefold()))
+            return [e.to_dict(with_items_count=False) for e in entries]
+
+        results = await self.afs.run("search_stat", stat_results)
+
+        return web.json_response({
+            "results": results,
+            "ready": self.search_index.ready,
+            "indexing": self.search_index.indexing,
+            "tookMs": round((asyncio.get_running_loop().time() - started) * 1000, 3),
+        })
+
+    @log_exceptions
+    async def grep(self, request: web.Request):
+        """
+        Searches file contents below a directory, streamed as newline-delimited JSON
+        (see ContentSearch), with periodic progress events while workers are busy.
+        Closing the connection terminates the workers.
+        Expects JSON:
+        {
+            "path": "/dir",
+            "pattern": "Version",
+            "regex": false,
+            "ignoreCase": false,
+            "include": "*.reg",     # optional glob on file names
+            "maxMatches": 1000
+        }
+        """
+        data = await request.json()
+        path = data.get("path")
+
+        if not path:
+            raise web.HTTPBadRequest(reason="Missing path")
+
+        try:
+            selected_dir = await self.afs.get_object(path)
+            if not selected_dir.isDir():
+                raise FileSystemError("Path is not a directory")
+
+            search = ContentSearch(
+                selected_dir.path,
+                data.get("pattern") or "",
+                regex=bool(data.get("regex", False)),
+                ignore_case=bool(data.get("ignoreCase", False)),
+                include=data.get("include"),
+                max_matches=data.get("maxMatches") or DEFAULT_MAX_MATCHES,
+            )
+        except (FileSystemError, FileNotFoundError, ValueError, TypeError, re.error) as e:
+            return web.json_response({"error": str(e)}, status=400)
+
+        response = web.StreamResponse(headers={"Content-Type": "application/x-ndjson"})
+
+        try:
+            await response.prepare(request)
+
+            async for event in self.afs.iterate("grep", search.results()):
+                await response.write(json.dumps(event).encode() + b"\n")
+
+            await response.write_eof()
+        except (ClientConnectionResetError, asyncio.CancelledError):
+            decky.logger.info("Client disconnected during content search")
+        finally:
+            search.cancel()
+
+        return response
+
+    @log_exceptions
+    async def find_duplicates(self, request: web.Request):
+        """
+        Duplicate files below a directory, streamed as newline-delimited JSON
+        (see DuplicateFinder). Closing the connection stops the job.
+        Expects JSON: { "path": "/dir", "minSize": 1 }
+        """
+        data = await request.json()
+        path = data.get("path")
+
+        if not path:
+            raise web.HTTPBadRequest(reason="Missing path")
+
+        try:
+            selected_dir = await self.afs.get_object(path)
+            if not selected_dir.isDir():
+                raise FileSystemError("Path is not a directory")
+
+            finder = DuplicateFinder(
+                selected_dir.path,
+                self.hash_store,
+                min_size=data.get("minSize") or DEFAULT_MIN_DUPLICATE_SIZE,
+            )
+        except (FileSystemError, FileNotFoundError, ValueError, TypeError) as e:
+            return web.json_response({"error": str(e)}, status=400)
+
+        response = web.StreamResponse(headers={"Content-Type": "application/x-ndjson"})
+
+        try:
+            await response.prepare(request)
+
+            async for event in self.afs.iterate("duplicates", finder.results()):
+                await response.write(json.dumps(event).encode() + b"\n")
+
+            await response.write_eof()
+        except (ClientConnectionResetError, asyncio.CancelledError):
+            decky.logger.info("Client disconnected during duplicate search")
+        finally:
+            finder.cancel()
+
+        return response
+
     @log_exceptions
     async def delete(self, request: web.Request):
         decky.logger.info("delete - Initiated")
@@ -388,11 +930,11 @@ class WebServer:
 
         try:
             for path in paths:
-                obj = self.fs.get_object(path)
+                obj = await self.afs.get_object(path)
                 if obj.isDir():
-                    self.fs.delete_dir(path)
+                    await self.afs.delete_dir(path)
                 else:
-                    self.fs.delete_file(path)
+                    await self.afs.delete_file(path)
 
             return web.json_response({"status": "ok"})
 
@@ -411,7 +953,7 @@ class WebServer:
         decky.logger.warning(f"rename - renaming file '{path}' to '{new_name}'")
 
         try:
-            self.fs.rename(path, new_name)
+            await self.afs.rename(path, new_name)
             return web.json_response({"status": "ok"})
         except FileSystemError as e:
             return web.json_response({"error": str(e)}, status=400)
@@ -438,9 +980,9 @@ class WebServer:
 
             try:
                 if mode == "copy":
-                    self.fs.copy(src, dst, overwrite=overwrite)
+                    await self.afs.copy(src, dst, overwrite=overwrite)
                 else:
-                    self.fs.move(src, dst, overwrite=overwrite)
+                    await self.afs.move(src, dst, overwrite=overwrite)
 
             except FileAlreadyExistsError:
                 conflicts.append(name)
@@ -467,7 +1009,7 @@ class WebServer:
         decky.logger.info(f"create_dir - Creating folder {path}")
 
         try:
-            self.fs.create_dir(path)
+            await self.afs.create_dir(path)
             return web.json_response({"status": "ok"})
         except FileSystemError as e:
             return web.json_response({"error": str(e)}, status=400)
@@ -511,21 +1053,22 @@ class WebServer:
                 filename = os.path.basename(filename)
                 target_path = os.path.join(target_dir, filename)
                 decky.logger.info(f"File upload - Filename: {filename} | target_path: {target_path}")
-                loop = asyncio.get_running_loop()
-
                 try:
-                    stream = self.fs.open_write_stream(target_path)
+                    stream = await self.afs.open_write_stream(target_path)
                     try:
-                        while True:
-                            chunk = await part.read_chunk(64 * 1024)
-                            if not chunk:
-                                break
+                        with self.qos.transfer(request.remote, "upload") as transfer:
+                            while True:
+                                chunk = await part.read_chunk(64 * 1024)
+                                if not chunk:
+                                    break
 
-                            # Write in executor to avoid blocking event loop
-                            await loop.run_in_executor(None, stream.write, chunk)
+                                # Not reading the body slows the sender down through TCP flow control
+                                await transfer.throttle(len(chunk))
+                                # Write in executor to avoid blocking event loop
+                                await self.afs.run("write", stream.write, chunk)
 
                     finally:
-                        await loop.run_in_executor(None, stream.close)
+                        await self.afs.run("write", stream.close)
                     return web.json_response({
                         "status": "ok",
                         "filename": filename
@@ -544,41 +1087,199 @@ class WebServer:
     async def download(self, request: web.Request):
         decky.logger.info(f"File download - initiated")
         data = await request.json()
-        paths = data.get("paths")
 
+        error = self._download_error(data)
+        if error:
+            return web.json_response({"error": error}, status=400)
+
+        return await self._serve_download(request, data)
+
+    @log_exceptions
+    async def create_download_link(self, request: web.Request):
+        """
+        Takes the JSON of /api/dir/download and returns a GET URL serving the
+        same download: {"url": "/api/download/<token>", "expiresIn": seconds}.
+        The browser downloads it natively and resumes it with Range/If-Range
+        after a dropped connection, which it never does for a POST. The link
+        expires DOWNLOAD_LINK_TTL_SECONDS after its last use.
+        """
+        data = await request.json()
+
+        error = self._download_error(data)
+        if error:
+            return web.json_response({"error": error}, status=400)
+
+        # A resumed download must get the same archive: freeze the compression setting
+        data = {
+            "paths": data["paths"],
+            "format": data.get("format"),
+            "compression": data.get("compression") or settings_server.getSetting(ZIP_COMPRESSION_FIELD) or DEFAULT_COMPRESSION_MODE,
+        }
+
+        now = asyncio.get_running_loop().time()
+        for token in [t for t, link in self._download_links.items() if link.expires < now]:
+            del self._download_links[token]
+
+        token = secrets.token_urlsafe(32)
+        self._download_links[token] = DownloadLink(data, now + DOWNLOAD_LINK_TTL_SECONDS)
+        while len(self._download_links) > MAX_DOWNLOAD_LINKS:
+            self._download_links.popitem(last=False)
+
+        return web.json_response({
+            "url": DOWNLOAD_LINK_PATH + token,
+            "expiresIn": DOWNLOAD_LINK_TTL_SECONDS,
+        })
+
+    @log_exceptions
+    async def download_link(self, request: web.Request):
+        token = request.match_info["token"]
+        link = self._download_links.get(token)
+        now = asyncio.get_running_loop().time()
+
+        if link is None or link.expires < now:
+            self._download_links.pop(token, None)
+            return web.json_response({"error": "Download link expired"}, status=404)
+
+        link.expires = now + DOWNLOAD_LINK_TTL_SECONDS
+        self._download_links.move_to_end(token)
+
+        decky.logger.info(f"File download - link, range {request.headers.get('Range')}")
+        return await self._serve_download(request, link.data)
+
+    def _download_error(self, data: dict) -> str | None:
+        paths = data.get("paths")
         if not paths or not isinstance(paths, list):
-            raise web.HTTPBadRequest(reason="Missing paths")
+            return "Missing paths"
+
+        archive_format = data.get("format") or "zip"
+        if archive_format not in ARCHIVE_FORMATS:
+            return f"Invalid format '{archive_format}'"
+
+        compression = data.get("compression")
+        if compression and compression not in COMPRESSION_MODES:
+            return f"Invalid compression '{compression}'"
+
+        return None
+
+    async def _serve_download(self, request: web.Request, data: dict):
+        paths = data["paths"]
+        archive_format = data.get("format") or "zip"
 
-        # Single file - direct download
-        if len(paths) == 1:
+        # Single file - direct download, unless an archive format was asked for
+        if len(paths) == 1 and not data.get("format"):
             decky.logger.info(f"File download - only one file found")
-            obj = self.fs.get_object(paths[0])
+            obj = await self.afs.get_object(paths[0])
 
             if obj.isFile():
-                response = web.StreamResponse(
-                    headers={
-                        "Content-Disposition": f'attachment; filename="{obj.path.name}"'
-                    }
+                # Same validators and Range support as the preview, so it can be resumed
+                handle = await self.afs.open_file(paths[0])
+                try:
+                    return await self._send_view(
+                        request, handle, f'attachment; filename="{handle.path.name}"', "download"
+                    )
+                finally:
+                    handle.release()
+
+        decky.logger.info(f"File download - multiple files detected, creating {archive_format}")
+        compression = data.get("compression") or settings_server.getSetting(ZIP_COMPRESSION_FIELD) or DEFAULT_COMPRESSION_MODE
+        if compression not in COMPRESSION_MODES:
+            return web.json_response(
+                {"error": f"Invalid compression '{compression}'"},
+                status=400
+            )
+
+        headers = {"Content-Disposition": f'attachment; filename="download.{archive_format}"'}
+
+        # Stored zip and plain tar - exact size, resumable with Range
+        if archive_format == "tar" or (archive_format == "zip" and compression == "store"):
+            return await self._download_layout(request, data, archive_format, headers)
+
+        # Multiple or directory - archive written to the socket as it is built
+        if archive_format == "zip":
+            workers = int(settings_server.getSetting(ZIP_WORKERS_FIELD) or DEFAULT_ZIP_WORKERS)
+            chunks = await self.afs.stream_zip(paths, compression, workers)
+            headers["Content-Type"] = "application/zip"
+        else:
+            if not zstd_available():
+                return web.json_response(
+                    {"error": "zstd is not available on this device"},
+                    status=400
                 )
-                await response.prepare(request)
+            _size, chunks = await self.afs.stream_tar(paths, ZSTD_LEVELS[compression])
+            headers["Content-Type"] = "application/zstd"
 
-                for chunk in self.fs.stream_read(paths[0]):
-                    await response.write(chunk)
+        response = web.StreamResponse(headers=headers)
+        return await self._stream_archive(request, response, chunks, archive_format)
 
-                await response.write_eof()
-                return response
+    async def _download_layout(self, request: web.Request, data: dict, archive_format: str, headers: dict):
+        """
+        Serves an archive from its layout. The ETag is the snapshot token of
+        the listed files: a resumed download sends it back in If-Range (or
+        as "snapshot" in the body), and gets the requested range only if no
+        file changed in between.
+        """
+        layout = await self.afs.archive_layout(data["paths"], archive_format)
+
+        if layout.token in self._archive_layouts:
+            layout = self._archive_layouts[layout.token]
+            self._archive_layouts.move_to_end(layout.token)
+        else:
+            self._archive_layouts[layout.token] = layout
+            if len(self._archive_layouts) > ARCHIVE_LAYOUT_CACHE_SIZE:
+                self._archive_layouts.popitem(last=False)
+
+        etag = f'"{layout.token}"'
+        snapshot = data.get("snapshot")
+        if snapshot and snapshot != layout.token:
+            return web.json_response(
+                {"error": "Files changed since the download started", "snapshot": layout.token},
+                status=412,
+                headers={"ETag": etag}
+            )
 
-        decky.logger.info(f"File download - multiple files detected, creating zip")
-        # Multiple or directory - ZIP
-        zip_buffer = self.fs.stream_zip(paths)
+        headers["Content-Type"] = layout.content_type
+        headers["ETag"] = etag
+        headers["Accept-Ranges"] = "bytes"
 
-        response = web.Response(
-            body=zip_buffer.read(),
-            headers={
-                "Content-Type": "application/zip",
-                "Content-Disposition": 'attachment; filename="download.zip"'
-            }
-        )
+        byte_range = None
+        range_header = request.headers.get("Range")
+        if_range = request.headers.get("If-Range")
+        if range_header and (if_range is None or if_range == etag):
+            try:
+                byte_range = parse_byte_range(range_header, layout.size)
+            except RangeNotSatisfiableError:
+                return web.json_response(
+                    {"error": "Range not satisfiable"},
+                    status=416,
+                    headers={"Content-Range": f"bytes */{layout.size}"}
+                )
+
+        if byte_range is None:
+            headers["Content-Length"] = str(layout.size)
+            response = web.StreamResponse(headers=headers)
+            chunks = layout.read()
+        else:
+            start, end = byte_range
+            headers["Content-Range"] = f"bytes {start}-{end}/{layout.size}"
+            headers["Content-Length"] = str(end - start + 1)
+            response = web.StreamResponse(status=206, headers=headers)
+            chunks = layout.read(start, end + 1)
+
+        decky.logger.info(f"File download - {archive_format} of {layout.size} bytes, range {byte_range}")
+        return await self._stream_archive(request, response, chunks, archive_format)
+
+    async def _stream_archive(self, request: web.Request, response: web.StreamResponse, chunks, archive_format: str):
+        try:
+            await response.prepare(request)
+
+            with self.qos.transfer(request.remote, "archive") as transfer:
+                async for chunk in self.afs.iterate("archive", chunks):
+                    await transfer.throttle(len(chunk))
+                    await response.write(chunk)
+
+            await response.write_eof()
+        except (ClientConnectionResetError, asyncio.CancelledError):
+            decky.logger.info(f"Client disconnected during {archive_format} streaming")
 
         return response
 
@@ -589,77 +1290,85 @@ class WebServer:
         if not path:
             raise web.HTTPBadRequest(reason="Missing path")
 
-        obj = self.fs.get_object(path)
-        if not obj.isFile():
+        # Kept open between requests: scrubbing a video sends one Range request per seek
+        try:
+            handle = await self.afs.open_file(path)
+        except NotAFileError:
             raise web.HTTPBadRequest(reason="Not a file")
 
-        file_path = obj.path
-        file_size = file_path.stat().st_size
-
-        mime, _ = mimetypes.guess_type(path)
-        mime = mime or "application/octet-stream"
+        try:
+            return await self._send_view(request, handle)
+        finally:
+            handle.release()
 
-        range_header = request.headers.get("Range")
+    async def _send_view(self, request: web.Request, handle: OpenFile, disposition: str = "inline", kind: str = "view"):
+        st = handle.st
+        file_path = handle.path
+        file_size = st.st_size
+        mime = handle.mime
 
-        decky.logger.info(f"view_file - Showing file {file_path}")
-        if range_header:
-            start, end = range_header.replace("bytes=", "").split("-")
-            start = int(start)
-            end = int(end) if end else file_size - 1
+        # Validators: the preview revalidates every time and gets a 304 while the file is unchanged
+        etag = file_etag(st)
+        headers = {
+            "ETag": etag,
+            "Last-Modified": http_date(st.st_mtime),
+            "Cache-Control": "no-cache",
+            "Accept-Ranges": "bytes",
+        }
 
-            if start >= file_size:
-                raise web.HTTPRequestRangeNotSatisfiable()
+        if is_not_modified(request, etag, st.st_mtime):
+            return web.Response(status=304, headers=headers)
 
-            chunk_size = end - start + 1
+        ranges = None
+        range_header = request.headers.get("Range")
+        if range_header and if_range_matches(request, etag, st.st_mtime):
+            try:
+                ranges = parse_byte_ranges(range_header, file_size)
+            except RangeNotSatisfiableError:
+                return web.json_response(
+                    {"error": "Range not satisfiable"},
+                    status=416,
+                    headers={**headers, "Content-Range": f"bytes */{file_size}"}
+                )
 
-            headers = {
-                "Content-Type": mime,
-                "Content-Range": f"bytes {start}-{end}/{file_size}",
-                "Accept-Ranges": "bytes",
-                "Content-Length": str(chunk_size),
-            }
+        decky.logger.info(f"view_file - Showing file {file_path}")
 
+        # Start reading the requested bytes and the window after them, for the next seek
+        for start, end in ranges or ():
+            await self.afs.run("fadvise", handle.will_need, start, min(end - start + 1, READAHEAD_WINDOW) + READAHEAD_WINDOW)
+
+        if ranges is None:
+            headers["Content-Type"] = mime
+            headers["Content-Length"] = str(file_size)
+            headers["Content-Disposition"] = disposition
+            response = web.StreamResponse(headers=headers)
+        elif len(ranges) == 1:
+            start, end = ranges[0]
+            headers["Content-Type"] = mime
+            headers["Content-Range"] = f"bytes {start}-{end}/{file_size}"
+            headers["Content-Length"] = str(end - start + 1)
+            response = web.StreamResponse(status=206, headers=headers)
+        else:
+            parts = MultipartRanges(ranges, mime, file_size)
+            headers["Content-Type"] = parts.content_type
+            headers["Content-Length"] = str(parts.length)
             response = web.StreamResponse(status=206, headers=headers)
-            try:
-                await response.prepare(request)
-
-                with open(file_path, "rb") as f:
-                    f.seek(start)
-                    remaining = chunk_size
-
-                    while remaining > 0:
-                        data = f.read(min(64 * 1024, remaining))
-                        if not data:
-                            break
-                        await response.write(data)
-                        remaining -= len(data)
-
-                await response.write_eof()
-            except (ClientConnectionResetError, asyncio.CancelledError):
-                decky.logger.info("Client disconnected during file streaming")
-            
-            return response
-
-        # ---- Fallback: no Range header ----
-        headers = {
-            "Content-Type": mime,
-            "Content-Length": str(file_size),
-            "Accept-Ranges": "bytes",
-            "Content-Disposition": "inline",
-        }
 
-        response = web.StreamResponse(headers=headers)
-        
         try:
             await response.prepare(request)
 
-            with open(file_path, "rb") as f:
-                while chunk := f.read(64 * 1024):
-                    await response.write(chunk)
+            with self.qos.transfer(request.remote, kind) as transfer:
+                if ranges is None:
+                    await send_open_file(request, response, self.afs, handle.file, 0, file_size, transfer)
+                elif len(ranges) == 1:
+                    await send_open_file(request, response, self.afs, handle.file, ranges[0][0], ranges[0][1] - ranges[0][0] + 1, transfer)
+                else:
+                    await send_file_ranges(request, response, self.afs, handle.file, parts, transfer)
 
             await response.write_eof()
-        except (ClientConnectionResetError, asyncio.CancelledError):
-            decky.logger.info("Client disconnected during fallback streaming")
+        except (ConnectionError, asyncio.CancelledError):
+            # Also the builtin BrokenPipeError/ConnectionResetError of sendfile(2)
+            decky.logger.info("Client disconnected during file streaming")
 
         return response
     
@@ -774,14 +1483,14 @@ class WebServer:
 
     @log_exceptions
     async def list_all_drives(self, request: web.Request):
-        external_mounts = get_all_drives()
+        external_mounts = await self.afs.run("get_all_drives", get_all_drives)
 
         data = await request.json()
         path = data.get("path")
         currentDrive = os.path.expanduser("~")
 
         if path:
-            currentDrive = get_drive_root(path)
+            currentDrive = await self.afs.get_drive_root(path)
 
         return web.json_response({
             "currentDrive": str(currentDrive),
@@ -812,6 +1521,14 @@ class WebServer:
 
             await self.site.start()
 
+            # Optional plain HTTP on localhost: without TLS, files are sent with sendfile(2)
+            plain_port = settings_server.getSetting(PLAIN_HTTP_PORT_FIELD)
+            if plain_port:
+                self.plain_site = web.TCPSite(self.runner, host=PLAIN_HTTP_HOST, port=int(plain_port))
+                await self.plain_site.start()
+
+            self.search_index.start()
+
             # RESET inactivity timer ON START
             self._last_activity = asyncio.get_running_loop().time()
 
@@ -829,6 +1546,17 @@ class WebServer:
 
     async def stop(self):
         decky.logger.info("Stopping webUI server.")
+        for ws in list(self._watch_sockets):
+            await ws.close()
+        if self._watcher:
+            self._watcher.close()
+            self._watcher = None
+        self.dir_sizes.shutdown()
+        self.hash_store.close()
+        await asyncio.to_thread(self.search_index.close)
+        if self.plain_site:
+            await self.plain_site.stop()
+            self.plain_site = None
         if self.site:
             await self.site.stop()
             self.site = None
@@ -838,6 +1566,9 @@ class WebServer:
         if self._shutdown_task:
             self._shutdown_task.cancel()
             self._shutdown_task = None
+        # After the runner: no handler uses them any more. They are created again on the next start
+        self.afs.shutdown()
+        shutdown_count_executor()
 
 
     async def is_running(self) -> bool:
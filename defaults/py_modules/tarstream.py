@@ -0,0 +1,294 @@
+from functools import lru_cache
+from pathlib import Path
+from typing import Iterable, Iterator
+import os
+import shutil
+import stat
+import subprocess
+import tarfile
+import threading
+from archivelayout import ArchiveLayout
+
+try:
+    import grp
+    import pwd
+except ImportError:  # Windows
+    grp = pwd = None
+
+TAR_WRITE_SIZE = 64 * 1024  # zstd output is read in chunks of up to this size
+ZSTD_NICE = 10
+
+# =========================
+# Members
+# =========================
+
+class TarMember:
+    """
+    A file, directory or symlink to archive, as it was when listed. Its
+    header and size are fixed from `st`, so the archive length is known
+    before anything is read.
+    """
+    __slots__ = ("path", "arcname", "st", "linkname")
+
+    def __init__(self, path: str, arcname: str, st: os.stat_result, linkname: str = ""):
+        self.path = path
+        self.arcname = arcname
+        self.st = st
+        self.linkname = linkname
+
+    @property
+    def is_file(self) -> bool:
+        return stat.S_ISREG(self.st.st_mode)
+
+
+def _member(path: str, arcname: str, st: os.stat_result) -> TarMember | None:
+    if stat.S_ISLNK(st.st_mode):
+        try:
+            return TarMember(path, arcname, st, os.readlink(path))
+        except OSError:
+            return None
+    if stat.S_ISDIR(st.st_mode) or stat.S_ISREG(st.st_mode):
+        return TarMember(path, arcname, st)
+    # Sockets, FIFOs and devices are left out
+    return None
+
+
+def tar_members(roots: Iterable[Path]) -> list[TarMember]:
+    """
+    Members for the given files/directories, directories relative to their
+    parent and walked in name order. Symlinks are archived as links, never
+    followed.
+    """
+    members = []
+
+    for root in roots:
+        try:
+            st = os.lstat(root)
+        except OSError:
+            continue
+
+        member = _member(str(root), root.name, st)
+        if member is None:
+            continue
+        members.append(member)
+
+        if not stat.S_ISDIR(st.st_mode):
+            continue
+
+        stack = [(str(root), root.name)]
+        while stack:
+            directory, prefix = stack.pop()
+            try:
+                with os.scandir(directory) as it:
+                    entries = sorted(it, key=lambda e: e.name)
+            except OSError:
+                continue
+
+            subdirs = []
+            for entry in entries:
+                try:
+                    entry_st = entry.stat(follow_symlinks=False)
+                except OSError:
+                    continue
+
+                member = _member(entry.path, f"{prefix}/{entry.name}", entry_st)
+                if member is None:
+                    continue
+                members.append(member)
+                if stat.S_ISDIR(entry_st.st_mode):
+                    subdirs.append((entry.path, member.arcname))
+
+            # Reversed, so the stack pops them in name order
+            stack.extend(reversed(subdirs))
+
+    return members
+
+
+# =========================
+# Tar stream
+# =========================
+
+@lru_cache(maxsize=64)
+def _user_name(uid: int) -> str:
+    try:
+        return pwd.getpwuid(uid).pw_name if pwd else ""
+    except KeyError:
+        return ""
+
+@lru_cache(maxsize=64)
+def _group_name(gid: int) -> str:
+    try:
+        return grp.getgrgid(gid).gr_name if grp else ""
+    except KeyError:
+        return ""
+
+
+def tar_header(member: TarMember) -> bytes:
+    """
+    POSIX (pax) header of a member: long names, large sizes and non-ASCII
+    names are kept exactly.
+    """
+    st = member.st
+    info = tarfile.TarInfo(member.arcname)
+    info.mode = stat.S_IMODE(st.st_mode)
+    info.uid = st.st_uid
+    info.gid = st.st_gid
+    info.uname = _user_name(st.st_uid)
+    info.gname = _group_name(st.st_gid)
+    info.mtime = int(st.st_mtime)
+
+    if member.linkname:
+        info.type = tarfile.SYMTYPE
+        info.linkname = member.linkname
+    elif stat.S_ISDIR(st.st_mode):
+        info.type = tarfile.DIRTYPE
+    else:
+        info.type = tarfile.REGTYPE
+        info.size = st.st_size
+
+    return info.tobuf(tarfile.PAX_FORMAT, "utf-8", "surrogateescape")
+
+
+def _padding(size: int, block: int) -> int:
+    return -size % block
+
+
+def tar_layout(members: list[TarMember]) -> ArchiveLayout:
+    """
+    Layout of a tar archive of `members`. Each file contributes exactly the
+    size it was listed with: a file that grew is cut, one that shrank or
+    became unreadable is padded with zeros (like GNU tar), so the archive
+    always has the layout's size and any range of it can be read again.
+    """
+    layout = ArchiveLayout("application/x-tar")
+
+    for member in members:
+        st = member.st
+        layout.add_to_token(member.arcname, member.linkname, st.st_mode, st.st_uid, st.st_gid, st.st_size, st.st_mtime_ns, st.st_ino)
+        layout.add_bytes(tar_header(member))
+        if member.is_file:
+            layout.add_file(member.path, st.st_size)
+            layout.add_bytes(bytes(_padding(st.st_size, tarfile.BLOCKSIZE)))
+
+    end = 2 * tarfile.BLOCKSIZE
+    layout.add_bytes(bytes(end + _padding(layout.size + end, tarfile.RECORDSIZE)))
+    return layout
+
+
+def tar_size(members: list[TarMember]) -> int:
+    """
+    Exact length of stream_tar(members).
+    """
+    return tar_layout(members).size
+
+
+def stream_tar(members: list[TarMember]) -> Iterator[bytes]:
+    """
+    Yields a tar archive of `members`, see tar_layout().
+    """
+    return tar_layout(members).read()
+
+
+# =========================
+# zstd
+# =========================
+
+class ZstdUnavailableError(Exception):
+    pass
+
+
+@lru_cache(maxsize=1)
+def _zstd_backend() -> str | None:
+    """
+    "stdlib" (Python 3.14+), "zstandard" (the zstandard package) or "binary"
+    (the zstd command, shipped with SteamOS), in that order.
+    """
+    try:
+        from compression import zstd  # noqa: F401
+        return "stdlib"
+    except ImportError:
+        pass
+
+    try:
+        import zstandard  # noqa: F401
+        return "zstandard"
+    except ImportError:
+        pass
+
+    if shutil.which("zstd"):
+        return "binary"
+    return None
+
+
+def zstd_available() -> bool:
+    return _zstd_backend() is not None
+
+
+def zstd_compress(chunks: Iterator[bytes], level: int) -> Iterator[bytes]:
+    """
+    Compresses a stream of chunks into a single zstd frame.
+    Raises ZstdUnavailableError if there is no zstd module or binary.
+    """
+    backend = _zstd_backend()
+    if backend is None:
+        raise ZstdUnavailableError("zstd is not available")
+    if backend == "binary":
+        return _zstd_process(chunks, level)
+    return _zstd_module(chunks, level, backend)
+
+
+def _zstd_module(chunks: Iterator[bytes], level: int, backend: str) -> Iterator[bytes]:
+    if backend == "stdlib":
+        from compression.zstd import ZstdCompressor
+        compressor = ZstdCompressor(level=level)
+    else:
+        import zstandard
+        compressor = zstandard.ZstdCompressor(level=level).compressobj()
+
+    for chunk in chunks:
+        if data := compressor.compress(chunk):
+            yield data
+    yield compressor.flush()
+
+
+def _zstd_process(chunks: Iterator[bytes], level: int) -> Iterator[bytes]:
+    proc = subprocess.Popen(
+        [shutil.which("zstd") or "zstd", f"-{level}", "-q", "-c"],
+        stdin=subprocess.PIPE,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        # Same priority as the other background workers
+        os.setpriority(os.PRIO_PROCESS, proc.pid, ZSTD_NICE)
+    except (AttributeError, OSError):
+        pass
+
+    def feed():
+        try:
+            for chunk in chunks:
+                proc.stdin.write(chunk)
+        except (OSError, ValueError):
+            # zstd was killed: the download was cancelled
+            pass
+        finally:
+            try:
+                proc.stdin.close()
+            except OSError:
+                pass
+
+    feeder = threading.Thread(target=feed, name="zstd-feed", daemon=True)
+    feeder.start()
+
+    try:
+        while data := proc.stdout.read1(TAR_WRITE_SIZE):
+            yield data
+
+        if proc.wait() != 0:
+            raise OSError(f"zstd exited with status {proc.returncode}")
+    finally:
+        if proc.poll() is None:
+            proc.kill()
+            proc.wait()
+        proc.stdout.close()
+        feeder.join()
@@ -0,0 +1,219 @@
+from types import MappingProxyType
+import asyncio
+import heapq
+import itertools
+import time
+
+UNLIMITED = 0
+THROTTLE_SLICE = 256 * 1024  # 256 KB, largest piece sent per grant when a limit is set
+BURST_SECONDS = 0.25  # a bucket holds this many seconds of its rate
+
+# Share of the bandwidth of each kind of transfer, relative to the others
+TRANSFER_WEIGHTS = MappingProxyType({
+    "view": 4,  # previews and video scrubbing: someone is watching
+    "download": 1,
+    "archive": 1,
+    "upload": 1,
+})
+
+# =========================
+# Token bucket
+# =========================
+
+class TokenBucket:
+    """
+    `rate` bytes/s with bursts of up to `burst` bytes; UNLIMITED (0) never
+    waits. A grant may take the bucket below zero, so a chunk larger than
+    the burst still goes through: the debt delays the next one.
+    """
+    __slots__ = ("rate", "burst", "tokens", "updated")
+
+    def __init__(self, rate: int = UNLIMITED):
+        self.rate = UNLIMITED
+        self.burst = THROTTLE_SLICE
+        self.tokens = 0.0
+        self.updated = time.monotonic()
+        self.set_rate(rate)
+
+    def set_rate(self, rate: int):
+        self._refill()
+        self.rate = max(0, int(rate))
+        self.burst = max(THROTTLE_SLICE, self.rate * BURST_SECONDS)
+        self.tokens = min(self.tokens, self.burst) if self.rate else 0.0
+
+    def _refill(self):
+        now = time.monotonic()
+        if self.rate:
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self) -> float:
+        """
+        Seconds until the bucket is out of debt, 0 if a grant can go now.
+        """
+        if not self.rate:
+            return 0.0
+        self._refill()
+        return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+    def take(self, size: int):
+        if self.rate:
+            self._refill()
+            self.tokens -= size
+
+
+# =========================
+# Scheduler
+# =========================
+
+class Transfer:
+    """
+    One download, preview or upload, registered with the scheduler while it
+    runs. Call throttle(size) before moving each chunk of `size` bytes.
+    """
+    __slots__ = ("scheduler", "client", "kind", "weight", "finish", "sent")
+
+    def __init__(self, scheduler: "TransferScheduler", client: str, kind: str):
+        self.scheduler = scheduler
+        self.client = client
+        self.kind = kind
+        self.weight = TRANSFER_WEIGHTS.get(kind, 1)
+        self.finish = 0.0  # virtual finish time of its last grant
+        self.sent = 0
+
+    @property
+    def limited(self) -> bool:
+        return self.scheduler.limited
+
+    async def throttle(self, size: int):
+        await self.scheduler.acquire(self, size)
+        self.sent += size
+
+    def __enter__(self) -> "Transfer":
+        self.scheduler._register(self)
+        return self
+
+    def __exit__(self, *exc):
+        self.scheduler._unregister(self)
+
+
+class TransferScheduler:
+    """
+    Caps the bytes/s of all transfers together (`global_rate`) and of each
+    client (`client_rate`), both token buckets; 0 is unlimited. When the
+    global bucket is the bottleneck, waiting transfers are served by
+    weighted fair queuing: each grant gets a virtual finish time of
+    size / weight after the transfer's previous one, and the smallest goes
+    first, so concurrent transfers share the bandwidth by TRANSFER_WEIGHTS
+    whatever their chunk sizes.
+
+    Limits can be changed at any time with set_limits(); waiting transfers
+    pick them up on their next grant.
+
+        with scheduler.transfer(request.remote, "download") as transfer:
+            for chunk in chunks:
+                await transfer.throttle(len(chunk))
+                await response.write(chunk)
+    """
+    def __init__(self, global_rate: int = UNLIMITED, client_rate: int = UNLIMITED):
+        self.global_bucket = TokenBucket(global_rate)
+        self.client_rate = max(0, int(client_rate))
+        self._client_buckets: dict[str, TokenBucket] = {}
+        self._active: dict[str, int] = {}  # client -> transfers running
+        self._transfers = 0
+
+        self._virtual_time = 0.0
+        self._waiting: list[tuple[float, int, asyncio.Future, Transfer, int]] = []
+        self._sequence = itertools.count()
+        self._wakeup: asyncio.TimerHandle | None = None
+
+    # ---- Limits ----
+    @property
+    def global_rate(self) -> int:
+        return self.global_bucket.rate
+
+    def set_limits(self, global_rate: int, client_rate: int):
+        self.global_bucket.set_rate(global_rate)
+        self.client_rate = max(0, int(client_rate))
+        for bucket in self._client_buckets.values():
+            bucket.set_rate(self.client_rate)
+        self._dispatch()
+
+    @property
+    def limited(self) -> bool:
+        return bool(self.global_bucket.rate or self.client_rate)
+
+    # ---- Transfers ----
+    def transfer(self, client: str | None, kind: str) -> Transfer:
+        return Transfer(self, client or "", kind)
+
+    def _register(self, transfer: Transfer):
+        self._transfers += 1
+        self._active[transfer.client] = self._active.get(transfer.client, 0) + 1
+        if transfer.client not in self._client_buckets:
+            self._client_buckets[transfer.client] = TokenBucket(self.client_rate)
+        # A new transfer starts at the current virtual time, not with credit from idling
+        transfer.finish = self._virtual_time
+
+    def _unregister(self, transfer: Transfer):
+        self._transfers -= 1
+        remaining = self._active.get(transfer.client, 1) - 1
+        if remaining:
+            self._active[transfer.client] = remaining
+        else:
+            self._active.pop(transfer.client, None)
+            self._client_buckets.pop(transfer.client, None)
+
+    async def acquire(self, transfer: Transfer, size: int):
+        """
+        Waits until `transfer` may move `size` more bytes.
+        """
+        client_bucket = self._client_buckets.get(transfer.client)
+        if client_bucket is not None and client_bucket.rate:
+            while (delay := client_bucket.delay()) > 0:
+                await asyncio.sleep(delay)
+            client_bucket.take(size)
+
+        if not self.global_bucket.rate:
+            return
+
+        transfer.finish = max(transfer.finish, self._virtual_time) + size / transfer.weight
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiting, (transfer.finish, next(self._sequence), future, transfer, size))
+        self._dispatch()
+        await future
+
+    def _dispatch(self):
+        """
+        Grants waiting transfers in virtual finish time order while the
+        global bucket allows, then sleeps until it refills.
+        """
+        if self._wakeup is not None:
+            self._wakeup.cancel()
+            self._wakeup = None
+
+        while self._waiting:
+            finish, _, future, transfer, size = self._waiting[0]
+            if future.done():
+                # Cancelled: the client went away
+                heapq.heappop(self._waiting)
+                continue
+
+            delay = self.global_bucket.delay()
+            if delay > 0:
+                self._wakeup = asyncio.get_running_loop().call_later(delay, self._dispatch)
+                return
+
+            heapq.heappop(self._waiting)
+            self.global_bucket.take(size)
+            self._virtual_time = max(self._virtual_time, finish - size / transfer.weight)
+            future.set_result(None)
+
+    def stats(self) -> dict:
+        return {
+            "globalRate": self.global_bucket.rate,
+            "clientRate": self.client_rate,
+            "transfers": self._transfers,
+            "clients": len(self._active),
+            "waiting": sum(1 for entry in self._waiting if not entry[2].done()),
+        }
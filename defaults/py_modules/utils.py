@@ -1,6 +1,8 @@
 import decky
 import traceback
 import inspect
+import multiprocessing
+import os
 
 def log_exceptions(func):
     """Decorator to log all exceptions from plugin methods"""
@@ -23,3 +25,27 @@ def log_exceptions(func):
     if inspect.iscoroutinefunction(func):
         return async_wrapper
     return sync_wrapper
+
+
+# =========================
+# Process pools
+# =========================
+
+BACKGROUND_WORKER_NICE = 10
+
+def process_pool_context():
+    """
+    multiprocessing context for worker pools.
+    The plugin runs inside a frozen (PyInstaller) loader: spawn/forkserver
+    would re-execute it, so workers are forked.
+    """
+    if os.name == "nt":
+        return multiprocessing.get_context()
+    return multiprocessing.get_context("fork")
+
+def init_background_worker():
+    """
+    Pool initializer: background work must not compete with a running game.
+    """
+    if os.name != "nt":
+        os.nice(BACKGROUND_WORKER_NICE)
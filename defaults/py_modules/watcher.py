@@ -0,0 +1,334 @@
+from pathlib import Path
+from typing import Any, Awaitable, Callable
+import asyncio
+import ctypes
+import ctypes.util
+import os
+import struct
+import decky
+from filesystem import FileSystemEntry
+
+COALESCE_DELAY_SECONDS = 0.25
+READ_BUFFER_SIZE = 64 * 1024
+
+# =========================
+# inotify constants (linux/inotify.h)
+# =========================
+
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+WATCH_MASK = (
+    IN_CREATE | IN_DELETE | IN_MOVED_FROM | IN_MOVED_TO
+    | IN_CLOSE_WRITE | IN_ATTRIB | IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR
+)
+
+_EVENT_HEADER = struct.Struct("iIII")
+
+# Coalesced change kinds
+ADDED = "added"
+REMOVED = "removed"
+CHANGED = "changed"
+
+
+# =========================
+# Exceptions
+# =========================
+
+class WatchUnavailableError(Exception):
+    pass
+
+
+# =========================
+# inotify binding
+# =========================
+
+class Inotify:
+    """
+    Minimal ctypes binding over the inotify syscalls, non-blocking.
+    """
+    def __init__(self):
+        if os.name == "nt":
+            raise WatchUnavailableError("inotify is only available on Linux")
+
+        try:
+            self._libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+            init = self._libc.inotify_init1
+        except (OSError, AttributeError):
+            raise WatchUnavailableError("inotify is not available")
+
+        self.fd = init(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            errno = ctypes.get_errno()
+            raise WatchUnavailableError(f"inotify_init1 failed: {os.strerror(errno)}")
+
+    def add_watch(self, path: str, mask: int = WATCH_MASK) -> int:
+        wd = self._libc.inotify_add_watch(self.fd, os.fsencode(path), ctypes.c_uint32(mask))
+        if wd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, os.strerror(errno), path)
+        return wd
+
+    def rm_watch(self, wd: int):
+        self._libc.inotify_rm_watch(self.fd, wd)
+
+    def read_events(self) -> list[tuple[int, int, str]]:
+        """
+        Returns the pending (wd, mask, name) events, or [] if there are none.
+        """
+        try:
+            data = os.read(self.fd, READ_BUFFER_SIZE)
+        except BlockingIOError:
+            return []
+
+        events = []
+        offset = 0
+
+        while offset + _EVENT_HEADER.size <= len(data):
+            wd, mask, _cookie, length = _EVENT_HEADER.unpack_from(data, offset)
+            offset += _EVENT_HEADER.size
+            name = os.fsdecode(data[offset:offset + length].rstrip(b"\0"))
+            offset += length
+            events.append((wd, mask, name))
+
+        return events
+
+    def close(self):
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+
+
+# =========================
+# Directory Watcher
+# =========================
+
+def coalesce(first: str, event: str) -> str:
+    """
+    Folds a new event into the kind already pending for an entry.
+    """
+    if first == ADDED:
+        # Anything after a creation is still a creation until the flush
+        return ADDED
+    if first == REMOVED and event == ADDED:
+        return CHANGED
+    return event
+
+def event_kind(mask: int) -> str:
+    if mask & (IN_CREATE | IN_MOVED_TO):
+        return ADDED
+    if mask & (IN_DELETE | IN_MOVED_FROM):
+        return REMOVED
+    return CHANGED
+
+def build_delta(directory: str, pending: dict[str, str]) -> dict:
+    """
+    Stats the entries of a coalesced window (one stat() per name) and
+    builds the delta message. Blocking, runs off the event loop.
+    """
+    delta = {"type": "delta", "path": directory, "added": [], "removed": [], "changed": []}
+
+    for name, kind in pending.items():
+        try:
+            entry = FileSystemEntry.from_path(directory, name)
+        except OSError:
+            entry = None
+
+        if entry is None:
+            # Created and deleted inside the same window: nothing to report
+            if kind != ADDED:
+                delta["removed"].append(os.path.join(directory, name))
+        elif kind == ADDED:
+            delta["added"].append(entry.to_dict(with_items_count=False))
+        else:
+            delta["changed"].append(entry.to_dict(with_items_count=False))
+
+    return delta
+
+
+class DirectoryWatcher:
+    """
+    Watches the directories clients have open with a single inotify descriptor
+    on the event loop. Bursts of events are coalesced per directory for
+    `coalesce_delay` seconds, then subscribers receive one message:
+
+        {"type": "delta", "path": dir, "added": [...], "removed": [...], "changed": [...]}
+        {"type": "reset", "path": dir}   - events were lost, re-list the directory
+        {"type": "gone", "path": dir}    - the directory was deleted or moved
+
+    `on_change(dir)` is called before every message, so caches can be dropped.
+    The stats of a delta run through `run(func, *args)`, asyncio.to_thread by
+    default: a burst of thousands of events never blocks the loop.
+    """
+    def __init__(
+        self,
+        on_change: Callable[[str], None] | None = None,
+        coalesce_delay: float = COALESCE_DELAY_SECONDS,
+        run: Callable[..., Awaitable[Any]] | None = None,
+    ):
+        self.on_change = on_change
+        self.coalesce_delay = coalesce_delay
+        self._run = run or asyncio.to_thread
+
+        self._inotify = Inotify()
+        self._loop = asyncio.get_running_loop()
+        self._loop.add_reader(self._inotify.fd, self._on_readable)
+
+        self._wd_by_dir: dict[str, int] = {}
+        self._dir_by_wd: dict[int, str] = {}
+        self._subscribers: dict[str, set[Callable[[dict], None]]] = {}
+        self._pending: dict[str, dict[str, str]] = {}
+        self._flush_handles: dict[str, asyncio.TimerHandle] = {}
+        self._flush_tasks: dict[str, asyncio.Task] = {}
+
+    def watched_dirs(self) -> list[str]:
+        return list(self._wd_by_dir)
+
+    async def subscribe(self, directory: str | Path, callback: Callable[[dict], None]):
+        """
+        Starts pushing the changes of `directory` to `callback`. Adding the
+        watch looks the path up, so it runs through `run` as well.
+        """
+        directory = str(directory)
+
+        if directory not in self._wd_by_dir:
+            wd = await self._run(self._inotify.add_watch, directory)
+            # Watching the same inode again returns the same descriptor
+            self._wd_by_dir[directory] = wd
+            self._dir_by_wd[wd] = directory
+
+        self._subscribers.setdefault(directory, set()).add(callback)
+
+    def unsubscribe(self, directory: str | Path, callback: Callable[[dict], None]):
+        directory = str(directory)
+        subscribers = self._subscribers.get(directory)
+
+        if subscribers is None:
+            return
+
+        subscribers.discard(callback)
+        if not subscribers:
+            self._drop(directory, remove_watch=True)
+
+    def _drop(self, directory: str, remove_watch: bool):
+        self._subscribers.pop(directory, None)
+        self._pending.pop(directory, None)
+
+        handle = self._flush_handles.pop(directory, None)
+        if handle:
+            handle.cancel()
+
+        wd = self._wd_by_dir.pop(directory, None)
+        if wd is not None:
+            self._dir_by_wd.pop(wd, None)
+            if remove_watch:
+                self._inotify.rm_watch(wd)
+
+    def _on_readable(self):
+        try:
+            events = self._inotify.read_events()
+        except OSError:
+            decky.logger.exception("DirectoryWatcher - failed reading inotify events")
+            return
+
+        for wd, mask, name in events:
+            if mask & IN_Q_OVERFLOW:
+                for directory in list(self._subscribers):
+                    self._notify(directory, {"type": "reset", "path": directory})
+                continue
+
+            directory = self._dir_by_wd.get(wd)
+            if directory is None:
+                continue
+
+            if mask & (IN_DELETE_SELF | IN_MOVE_SELF | IN_IGNORED):
+                self._notify(directory, {"type": "gone", "path": directory})
+                self._drop(directory, remove_watch=not (mask & IN_IGNORED))
+                continue
+
+            if not name:
+                continue
+
+            pending = self._pending.setdefault(directory, {})
+            kind = event_kind(mask)
+            pending[name] = coalesce(pending[name], kind) if name in pending else kind
+
+            if directory not in self._flush_handles:
+                self._flush_handles[directory] = self._loop.call_later(
+                    self.coalesce_delay, self._flush, directory
+                )
+
+    def _flush(self, directory: str):
+        self._flush_handles.pop(directory, None)
+        pending = self._pending.pop(directory, None)
+
+        if not pending:
+            return
+
+        previous = self._flush_tasks.get(directory)
+        task = self._loop.create_task(self._send_delta(directory, pending, previous))
+        self._flush_tasks[directory] = task
+        task.add_done_callback(lambda t: self._flush_done(directory, t))
+
+    def _flush_done(self, directory: str, task: asyncio.Task):
+        if self._flush_tasks.get(directory) is task:
+            del self._flush_tasks[directory]
+
+    async def _send_delta(self, directory: str, pending: dict[str, str], previous: asyncio.Task | None):
+        # Deltas of a directory are sent in order, even if a later window stats faster
+        if previous is not None:
+            await asyncio.wait([previous])
+
+        try:
+            delta = await self._run(build_delta, directory, pending)
+        except Exception:
+            decky.logger.exception(f"DirectoryWatcher - failed reading changes of {directory}")
+            return
+
+        if directory not in self._subscribers:
+            # Unwatched or gone while the entries were read
+            return
+
+        if delta["added"] or delta["removed"] or delta["changed"]:
+            self._notify(directory, delta)
+
+    def _notify(self, directory: str, message: dict):
+        if self.on_change:
+            self.on_change(directory)
+
+        for callback in list(self._subscribers.get(directory, ())):
+            try:
+                callback(message)
+            except Exception:
+                decky.logger.exception("DirectoryWatcher - subscriber failed")
+
+    def close(self):
+        for handle in self._flush_handles.values():
+            handle.cancel()
+
+        self._flush_handles.clear()
+
+        for task in self._flush_tasks.values():
+            task.cancel()
+        self._flush_tasks.clear()
+        self._pending.clear()
+        self._subscribers.clear()
+        self._wd_by_dir.clear()
+        self._dir_by_wd.clear()
+
+        if self._inotify.fd >= 0:
+            self._loop.remove_reader(self._inotify.fd)
+            self._inotify.close()
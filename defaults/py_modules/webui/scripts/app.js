@@ -1,10 +1,11 @@
 import { scanRecordings } from "./gamerecording.js";
-import { downloadSelected, uploadFiles } from './upload.js';
+import { downloadSelected, uploadFiles, confirmDownload, closeDownloadModal } from './upload.js';
 import { addMobileRenderInteractions, addMobileToolbarButtons } from "./mobile.js";
 import { checkLogin, doLogin, doLogoff, passwordEnterEvent } from "./login.js";
 import { showDrivePicker, updateDriveIndicator } from "./drives.js";
-import { truncateString } from "./util.js";
+import { truncateString, expandListing } from "./util.js";
 import { openPreview } from "./preview.js";
+import { watchDir, stopWatching } from "./watch.js";
 
 
 document.addEventListener("DOMContentLoaded", () => {
@@ -49,6 +50,8 @@ window['doLogin'] = doLogin;
 window['doLogoff'] = doLogoff;
 window['loadDir'] = loadDir;
 window['closePropertiesModal'] = closePropertiesModal;
+window['confirmDownload'] = confirmDownload;
+window['closeDownloadModal'] = closeDownloadModal;
 window['scanRecordings'] = scanRecordings;
 
 export let currentPath = null;
@@ -60,6 +63,10 @@ export let clipboardItems = [];
 export let clipboardMode = null; // "copy" | "move"
 export let showHidden = false;
 
+const PAGE_SIZE = 500;
+let nextCursor = null;
+let pageObserver = null;
+
 export const HIGHLIGHT_FOLDERS = [
   "Downloads",
   "Pictures",
@@ -201,22 +208,22 @@ export async function loadDir(path = null) {
     hideSidePanel();
     selectedItems = [];
 
-    const res = await fetch("/api/dir/list", {
-      method: "POST",
-      headers: { "Content-Type": "application/json" },
-      body: JSON.stringify({ path }),
-    });
+    const res = await fetchDirPage(path, null);
 
     const data = await res.json();
 
     if(res.ok) {
       selectedDir = data.selectedDir;
       currentPath = data.selectedDir.path;
+      nextCursor = data.nextCursor;
 
       document.getElementById("breadcrumb").innerText = currentPath;
 
       updateToolbar();
-      renderFiles(data.dirContent);
+      document.getElementById("fileList").innerHTML = "";
+      renderFiles(expandListing(data));
+      observeNextPage();
+      watchDir(currentPath, applyWatchMessage);
       updateDriveIndicator(currentPath);
     } else {
       showError(data.error);
@@ -227,63 +234,254 @@ export async function loadDir(path = null) {
   });
 }
 
-function renderFiles(files) {
-  const list = document.getElementById("fileList");
-  list.innerHTML = "";
+function fetchDirPage(path, cursor) {
+  return fetch("/api/dir/list", {
+    method: "POST",
+    headers: { "Content-Type": "application/json" },
+    body: JSON.stringify({
+      path,
+      cursor,
+      lazyCounts: true,
+      format: "columnar",
+      showHidden,
+      sort: "name",
+      limit: PAGE_SIZE,
+    }),
+  });
+}
 
-  files.filter(f => showHidden || !f.isHidden).forEach((f) => {
-    const div = document.createElement("div");
-    
-    div.className = "file-item";
+async function loadNextPage() {
+  if (!nextCursor) return;
 
-    if (shouldHighlightFolder(f)) {
-      div.classList.add("highlight-folder");
-      div.title = "Important folder";
-    }
+  const cursor = nextCursor;
+  nextCursor = null;
 
-    if (f.isHidden) {
-      div.classList.add("hidden-file");
-    }
+  const res = await fetchDirPage(currentPath, cursor);
+  const data = await res.json();
 
-    if (f.isProtected) {
-      div.classList.add("protected-file");
+  if (!res.ok) {
+    showError(data.error);
+    return;
+  }
+
+  nextCursor = data.nextCursor;
+  renderFiles(expandListing(data));
+  observeNextPage();
+}
+
+// Loads the next page once the last rendered item scrolls into view
+function observeNextPage() {
+  if (pageObserver) {
+    pageObserver.disconnect();
+  }
+
+  const last = document.getElementById("fileList").lastElementChild;
+  if (!nextCursor || !last) return;
+
+  pageObserver = new IntersectionObserver((entries) => {
+    if (entries.some(e => e.isIntersecting)) {
+      pageObserver.disconnect();
+      loadNextPage();
     }
+  });
+  pageObserver.observe(last);
+}
 
-    const icon = document.createElement("i");
+// Applies a change pushed by the server to the rendered listing
+function applyWatchMessage(message) {
+  if (message.type === "reset") {
+    loadDir(currentPath);
+    return;
+  }
 
-    if (f.isDir) icon.className = "fas fa-folder";
-    else if (f.type === "audio") icon.className = "fas fa-compact-disc";
-    else if (f.type === "image") icon.className = "fas fa-image";
-    else icon.className = "fas fa-file";
+  if (message.type === "gone") {
+    loadDir(getParentPath(currentPath));
+    return;
+  }
 
-    const name = document.createElement("div");
+  if (message.type !== "delta") return;
 
-    let fileName = ""
+  const list = document.getElementById("fileList");
+  const findItem = (path) =>
+    Array.from(list.children).find(el => el.dataset.path === path);
 
-    // For non linux path
-    if(f.path?.includes("\\")) {
-      name.className = "file-name";
-      fileName = f.isDir ? f.path.split("\\").pop() : f.name;
-    } else {
-      name.className = "file-name";
-      fileName = f.isDir ? f.path.split("/").pop() : f.name;
+  message.removed.forEach((path) => {
+    findItem(path)?.remove();
+  });
+
+  message.changed.forEach((f) => {
+    const old = findItem(f.path);
+    if (old) old.replaceWith(createFileItem(f));
+  });
+
+  message.added
+    .filter(f => showHidden || !f.isHidden)
+    .filter(f => !findItem(f.path))
+    .forEach(f => list.appendChild(createFileItem(f)));
+}
+
+// Searches file names below the current directory, results replace the listing
+async function searchFiles() {
+  const query = prompt("Search file names:");
+  if (!query) return;
+
+  return withLoading(async () => {
+    const res = await fetch("/api/search", {
+      method: "POST",
+      headers: { "Content-Type": "application/json" },
+      body: JSON.stringify({ query, path: currentPath }),
+    });
+    const data = await res.json();
+
+    if (!res.ok) {
+      showError(data.error);
+      return;
     }
 
-    name.innerText = truncateString(fileName, 50);
+    // Results come from many directories: no paging or live updates
+    nextCursor = null;
+    if (pageObserver) pageObserver.disconnect();
+    stopWatching();
 
-    div.appendChild(icon);
-    div.appendChild(name);
+    selectedItems = [];
+    document.getElementById("breadcrumb").innerText =
+      `Search "${query}" in ${currentPath}` + (data.ready ? "" : " (indexing...)");
+    document.getElementById("fileList").innerHTML = "";
+    updateToolbar();
+    renderFiles(data.results);
+  });
+}
 
-    if (isMobile()) {
-      addMobileRenderInteractions(div, f);
-    } else {
-      addDesktopRenderInteractions(div, f);
+// Streams the duplicate files below the current directory, one group at a time
+async function findDuplicates() {
+  const path = currentPath;
+
+  nextCursor = null;
+  if (pageObserver) pageObserver.disconnect();
+  stopWatching();
+
+  selectedItems = [];
+  updateToolbar();
+
+  const breadcrumb = document.getElementById("breadcrumb");
+  const list = document.getElementById("fileList");
+  list.innerHTML = "";
+  breadcrumb.innerText = `Duplicates in ${path}: scanning...`;
+
+  try {
+    const res = await fetch("/api/dir/duplicates", {
+      method: "POST",
+      headers: { "Content-Type": "application/json" },
+      body: JSON.stringify({ path }),
+    });
+
+    if (!res.ok) {
+      showError((await res.json()).error);
+      return;
     }
 
-    list.appendChild(div);
+    const reader = res.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = "";
+    let reclaimable = 0;
+
+    while (true) {
+      const { done, value } = await reader.read();
+      if (done) break;
+
+      buffer += decoder.decode(value, { stream: true });
+      const lines = buffer.split("\n");
+      buffer = lines.pop();
+
+      for (const line of lines) {
+        if (!line) continue;
+        const event = JSON.parse(line);
+
+        if (event.event === "progress") {
+          const total = event.total ? `/${event.total}` : "";
+          breadcrumb.innerText = `Duplicates in ${path}: ${event.stage} ${event.done}${total}`;
+        } else if (event.event === "group") {
+          reclaimable += event.reclaimable;
+
+          const header = document.createElement("div");
+          header.className = "file-item";
+          header.innerText = `${event.items.length} copies of ${formatSize(event.size)}, ${formatSize(event.reclaimable)} reclaimable`;
+          list.appendChild(header);
+          renderFiles(event.items);
+
+          breadcrumb.innerText = `Duplicates in ${path}: ${formatSize(reclaimable)} reclaimable so far`;
+        } else if (event.event === "end") {
+          breadcrumb.innerText = `Duplicates in ${path}: ${event.groups} groups, ${formatSize(event.reclaimable)} reclaimable`;
+        }
+      }
+    }
+  } catch (err) {
+    console.error("Failed to find duplicates", err);
+    showError("Failed to find duplicates");
+  }
+}
+
+function renderFiles(files) {
+  const list = document.getElementById("fileList");
+
+  files.filter(f => showHidden || !f.isHidden).forEach((f) => {
+    list.appendChild(createFileItem(f));
   });
 }
 
+function createFileItem(f) {
+  const div = document.createElement("div");
+  
+  div.className = "file-item";
+  div.dataset.path = f.path;
+
+  if (shouldHighlightFolder(f)) {
+    div.classList.add("highlight-folder");
+    div.title = "Important folder";
+  }
+
+  if (f.isHidden) {
+    div.classList.add("hidden-file");
+  }
+
+  if (f.isProtected) {
+    div.classList.add("protected-file");
+  }
+
+  const icon = document.createElement("i");
+
+  if (f.isDir) icon.className = "fas fa-folder";
+  else if (f.type === "audio") icon.className = "fas fa-compact-disc";
+  else if (f.type === "image") icon.className = "fas fa-image";
+  else icon.className = "fas fa-file";
+
+  const name = document.createElement("div");
+
+  let fileName = ""
+
+  // For non linux path
+  if(f.path?.includes("\\")) {
+    name.className = "file-name";
+    fileName = f.isDir ? f.path.split("\\").pop() : f.name;
+  } else {
+    name.className = "file-name";
+    fileName = f.isDir ? f.path.split("/").pop() : f.name;
+  }
+
+  name.innerText = truncateString(fileName, 50);
+
+  div.appendChild(icon);
+  div.appendChild(name);
+
+  if (isMobile()) {
+    addMobileRenderInteractions(div, f);
+  } else {
+    addDesktopRenderInteractions(div, f);
+  }
+
+  return div;
+}
+
 function shouldHighlightFolder(file) {
   if (!file.isDir) return false;
 
@@ -363,6 +561,8 @@ function addDesktopToolbarButtons(bar, selectionCount) {
     // ---- Primary actions ----
   if (selectionCount === 0) {
     bar.appendChild(toolbarButton("Upload", "fas fa-upload", uploadFiles));
+    bar.appendChild(toolbarButton("Search", "fas fa-magnifying-glass", searchFiles));
+    bar.appendChild(toolbarButton("Duplicates", "fas fa-clone", findDuplicates));
   } else {
     bar.appendChild(toolbarButton("Move", "fas fa-arrows-alt", startMove));
     bar.appendChild(toolbarButton("Copy", "fas fa-copy", startCopy));
@@ -482,7 +682,28 @@ export async function renameSelected() {
 }
 
 /* ---------- PROPERTIES ---------- */
-export function showPropertiesModal() {
+async function loadItemsCount(target) {
+  try {
+    const res = await fetch("/api/dir/counts", {
+      method: "POST",
+      headers: { "Content-Type": "application/json" },
+      body: JSON.stringify({ paths: [target.path] }),
+    });
+
+    if (!res.ok) return;
+
+    const data = await res.json();
+    const [count] = data.counts;
+
+    if (count && count.itemsCount !== null) {
+      target.itemsCount = count.complete ? count.itemsCount : `${count.itemsCount}+`;
+    }
+  } catch (err) {
+    console.error("Failed to load items count", err);
+  }
+}
+
+export async function showPropertiesModal() {
   let target = null;
 
   if (selectedItems.length === 1) {
@@ -493,6 +714,10 @@ export function showPropertiesModal() {
 
   if (!target) return;
 
+  if (target.isDir && target.itemsCount == null) {
+    await loadItemsCount(target);
+  }
+
   const body = document.getElementById("propertiesBody");
 
   let html = `
@@ -504,6 +729,7 @@ export function showPropertiesModal() {
   if (target.isDir) {
     html += `
       <div><strong>Items:</strong> ${target.itemsCount}</div>
+      <div><strong>Size:</strong> <span id="propertiesDirSize">Calculating...</span></div>
     `;
   }
 
@@ -519,6 +745,49 @@ export function showPropertiesModal() {
   body.innerHTML = html;
 
   document.getElementById("propertiesModal").classList.remove("hidden");
+
+  if (target.isDir) {
+    loadDirSize(target, document.getElementById("propertiesDirSize"));
+  }
+}
+
+// Streams the recursive size of a directory, showing partial totals while the walk runs
+async function loadDirSize(target, element) {
+  try {
+    const res = await fetch("/api/dir/size", {
+      method: "POST",
+      headers: { "Content-Type": "application/json" },
+      body: JSON.stringify({ path: target.path }),
+    });
+
+    if (!res.ok) {
+      element.innerText = "Unavailable";
+      return;
+    }
+
+    const reader = res.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = "";
+
+    while (true) {
+      const { done, value } = await reader.read();
+      if (done) break;
+
+      buffer += decoder.decode(value, { stream: true });
+      const lines = buffer.split("\n");
+      buffer = lines.pop();
+
+      for (const line of lines) {
+        if (!line) continue;
+        const totals = JSON.parse(line);
+        const suffix = totals.event === "end" ? "" : "...";
+        element.innerText = `${formatSize(totals.size)} (${totals.files} files)${suffix}`;
+      }
+    }
+  } catch (err) {
+    console.error("Failed to load directory size", err);
+    element.innerText = "Unavailable";
+  }
 }
 
 function formatSize(bytes) {
@@ -1,5 +1,6 @@
 import { withLoading, showFileView, showError, 
          setSelectedItems, setClipboardItems, setClipboardMode, setCurrentPath } from './app.js';
+import { stopWatching } from './watch.js';
 
 /* ---------- AUTH ---------- */
 export async function checkLogin() {
@@ -51,6 +52,7 @@ export async function doLogoff() {
   }
 
   // Clear UI state
+  stopWatching();
   setSelectedItems([]);
   setClipboardItems([]);
   setClipboardMode(null);
@@ -86,39 +86,58 @@ function updateUploadProgress(percent) {
 
 /* ---------- DOWNLOAD ---------- */
 
+let pendingDownload = null;
+
 export async function downloadSelected() {
   if (!selectedItems.length) return;
 
   const paths = selectedItems.map(i => i.path);
 
-  const res = await fetch("/api/dir/download", {
+  // A single file is sent as it is; anything else asks for an archive format
+  if (paths.length === 1 && selectedItems[0].isFile) {
+    await startDownload({ paths });
+    return;
+  }
+
+  pendingDownload = paths;
+  document.getElementById("downloadModal").classList.remove("hidden");
+}
+
+export async function confirmDownload() {
+  const paths = pendingDownload;
+  closeDownloadModal();
+  if (!paths) return;
+
+  const [format, compression] = document.getElementById("downloadFormat").value.split(":");
+  await startDownload({ paths, format, compression });
+}
+
+export function closeDownloadModal() {
+  pendingDownload = null;
+  document.getElementById("downloadModal").classList.add("hidden");
+}
+
+// The browser downloads a GET link itself: it shows progress and, for files,
+// stored zip and tar, resumes with Range after a dropped connection
+async function startDownload(body) {
+  const res = await fetch("/api/dir/download/link", {
     method: "POST",
     headers: { "Content-Type": "application/json" },
-    body: JSON.stringify({ paths })
+    body: JSON.stringify(body)
   });
 
+  const data = await res.json();
   if (!res.ok) {
-    const err = await res.json();
-    showError(err.error || "Download failed");
+    showError(data.error || "Download failed");
     return;
   }
 
-  const blob = await res.blob();
-  const url = window.URL.createObjectURL(blob);
-
   const a = document.createElement("a");
-  a.href = url;
-
-  // Name handling
-  if (paths.length === 1) {
-    a.download = paths[0].split("/").pop();
-  } else {
-    a.download = "download.zip";
-  }
+  a.href = data.url;
+  // Empty: the name comes from Content-Disposition
+  a.download = "";
 
   document.body.appendChild(a);
   a.click();
   a.remove();
-
-  window.URL.revokeObjectURL(url);
 }
@@ -4,4 +4,53 @@ export function truncateString(str, maxLength) {
   } else {
     return str;
   }
-}
\ No newline at end of file
+}
+
+// Flag bits of a columnar listing, see encode_columnar in filesystem.py
+const FLAG_DIR = 1;
+const FLAG_FILE = 2;
+const FLAG_HIDDEN = 4;
+
+// Rebuilds the per-entry objects of a /api/dir/list response.
+// Responses without "format": "columnar" are returned as they are.
+export function expandListing(data) {
+  if (data.format !== "columnar") {
+    return data.dirContent;
+  }
+
+  const c = data.dirContent;
+  const parent = c.directory.endsWith(c.separator) ? c.directory : c.directory + c.separator;
+  const items = new Array(c.names.length);
+
+  for (let i = 0; i < c.names.length; i++) {
+    const name = c.names[i];
+    const flags = c.flags[i];
+    const path = parent + name;
+    const item = {
+      path,
+      isDir: (flags & FLAG_DIR) !== 0,
+      isFile: (flags & FLAG_FILE) !== 0,
+      isHidden: (flags & FLAG_HIDDEN) !== 0,
+    };
+
+    item.directory = item.isDir ? path : c.directory;
+
+    if (item.isDir) {
+      item.itemsCount = c.itemsCounts[i];
+    }
+
+    if (item.isFile) {
+      // Same rules as get_extension: leading dots and a trailing dot don't count
+      const dot = name.lastIndexOf(".");
+      const leadingDots = name.length - name.replace(/^\.+/, "").length;
+      item.name = name;
+      item.extension = dot >= leadingDots && dot < name.length - 1 ? name.slice(dot).toLowerCase() : "";
+      item.size = c.sizes[i];
+      item.type = c.typeNames[c.types[i]];
+    }
+
+    items[i] = item;
+  }
+
+  return items;
+}
@@ -0,0 +1,66 @@
+// Live directory updates pushed by the server over /api/dir/watch
+
+let socket = null;
+let watchedPath = null;
+let messageHandler = null;
+let unsupported = false;
+
+function connect() {
+  const protocol = location.protocol === "https:" ? "wss:" : "ws:";
+  socket = new WebSocket(`${protocol}//${location.host}/api/dir/watch`);
+
+  socket.onopen = () => {
+    if (watchedPath) {
+      socket.send(JSON.stringify({ action: "watch", path: watchedPath }));
+    }
+  };
+
+  socket.onmessage = (event) => {
+    const message = JSON.parse(event.data);
+
+    if (message.type === "unsupported") {
+      unsupported = true;
+      return;
+    }
+
+    if (messageHandler && message.path === watchedPath) {
+      messageHandler(message);
+    }
+  };
+
+  socket.onclose = () => {
+    socket = null;
+    if (!unsupported && watchedPath) {
+      setTimeout(() => { if (!socket && watchedPath) connect(); }, 3000);
+    }
+  };
+}
+
+export function watchDir(path, onMessage) {
+  if (unsupported) return;
+
+  const previous = watchedPath;
+  watchedPath = path;
+  messageHandler = onMessage;
+
+  if (!socket) {
+    connect();
+    return;
+  }
+
+  if (socket.readyState !== WebSocket.OPEN) return;
+
+  if (previous && previous !== path) {
+    socket.send(JSON.stringify({ action: "unwatch", path: previous }));
+  }
+  socket.send(JSON.stringify({ action: "watch", path }));
+}
+
+export function stopWatching() {
+  watchedPath = null;
+  messageHandler = null;
+
+  if (socket) {
+    socket.close();
+  }
+}
@@ -0,0 +1,343 @@
+from pathlib import Path
+from typing import BinaryIO, Iterable, Iterator
+import os
+import stat
+import struct
+import time
+import zlib
+from archivelayout import ArchiveLayout
+from compressionpolicy import CompressionPolicy
+
+ZIP_READ_SIZE = 64 * 1024  # 64 KB
+ZIP_WRITE_SIZE = 64 * 1024  # output is coalesced into chunks of about this size
+ZIP64_LIMIT = 0xFFFFFFFF
+ZIP_FILECOUNT_LIMIT = 0xFFFF
+
+ZIP_STORED = 0
+ZIP_DEFLATED = 8
+
+# General purpose flags: sizes in a trailing data descriptor, UTF-8 names
+FLAG_DATA_DESCRIPTOR = 0x08
+FLAG_UTF8 = 0x800
+MEMBER_FLAGS = FLAG_DATA_DESCRIPTOR | FLAG_UTF8
+
+VERSION_DEFAULT = 20
+VERSION_ZIP64 = 45
+MADE_BY_UNIX = 3 << 8
+
+# =========================
+# Records
+# =========================
+
+_LOCAL_HEADER = struct.Struct("<IHHHHHIIIHH")
+_CENTRAL_HEADER = struct.Struct("<IHHHHHHIIIHHHHHII")
+_DATA_DESCRIPTOR = struct.Struct("<IIII")
+_DATA_DESCRIPTOR64 = struct.Struct("<IIQQ")
+_ZIP64_LOCAL_EXTRA = struct.Struct("<HHQQ")
+_END64_RECORD = struct.Struct("<IQHHIIQQQQ")
+_END64_LOCATOR = struct.Struct("<IIQI")
+_END_RECORD = struct.Struct("<IHHHHIIH")
+
+_SIG_LOCAL = 0x04034B50
+_SIG_CENTRAL = 0x02014B50
+_SIG_DESCRIPTOR = 0x08074B50
+_SIG_END64 = 0x06064B50
+_SIG_END64_LOCATOR = 0x07064B50
+_SIG_END = 0x06054B50
+_ZIP64_EXTRA_ID = 0x0001
+
+
+def dos_datetime(mtime: float) -> tuple[int, int]:
+    """
+    (time, date) in MS-DOS format, clamped to the 1980-2107 range it can hold.
+    """
+    t = time.localtime(mtime)
+    if t.tm_year < 1980:
+        return 0, (1 << 5) | 1
+    if t.tm_year > 2107:
+        return (23 << 11) | (59 << 5) | 29, (127 << 9) | (12 << 5) | 31
+    return (
+        (t.tm_hour << 11) | (t.tm_min << 5) | (t.tm_sec // 2),
+        ((t.tm_year - 1980) << 9) | (t.tm_mon << 5) | t.tm_mday,
+    )
+
+
+# =========================
+# Streaming writer
+# =========================
+
+class ZipMember:
+    """
+    A member being written: its local header fields and what its central
+    directory record needs.
+    """
+    __slots__ = ("name", "method", "dos_datetime", "zip64", "offset", "mode", "compressed")
+
+    def __init__(self, name: bytes, method: int, dos_datetime: tuple[int, int], zip64: bool, offset: int, mode: int):
+        self.name = name
+        self.method = method
+        self.dos_datetime = dos_datetime
+        self.zip64 = zip64
+        self.offset = offset
+        self.mode = mode
+        self.compressed = 0
+
+    @classmethod
+    def for_file(cls, arcname: str, st: os.stat_result, deflated: bool, offset: int, force_zip64: bool = False) -> "ZipMember":
+        # Same margin as zipfile: deflate can make incompressible data larger
+        zip64 = force_zip64 or st.st_size * 1.05 > ZIP64_LIMIT
+        return cls(
+            arcname.replace(os.sep, "/").encode("utf-8"),
+            ZIP_DEFLATED if deflated else ZIP_STORED,
+            dos_datetime(st.st_mtime),
+            zip64,
+            offset,
+            st.st_mode,
+        )
+
+    def local_header(self) -> bytes:
+        if self.zip64:
+            extra = _ZIP64_LOCAL_EXTRA.pack(_ZIP64_EXTRA_ID, 16, 0, 0)
+            placeholder = ZIP64_LIMIT
+        else:
+            extra = b""
+            placeholder = 0
+
+        dos_time, dos_date = self.dos_datetime
+        return _LOCAL_HEADER.pack(
+            _SIG_LOCAL, VERSION_ZIP64 if self.zip64 else VERSION_DEFAULT, MEMBER_FLAGS, self.method,
+            dos_time, dos_date, 0, placeholder, placeholder, len(self.name), len(extra),
+        ) + self.name + extra
+
+    def data_descriptor(self, crc: int, size: int) -> bytes:
+        if self.zip64:
+            return _DATA_DESCRIPTOR64.pack(_SIG_DESCRIPTOR, crc, self.compressed, size)
+        return _DATA_DESCRIPTOR.pack(_SIG_DESCRIPTOR, crc, self.compressed, size)
+
+    def central_header(self, crc: int, size: int) -> bytes:
+        compressed = self.compressed
+        header_offset = self.offset
+
+        # The ZIP64 extra holds, in this order, only the fields that overflow
+        fields = []
+        if size >= ZIP64_LIMIT:
+            fields.append(size)
+            size = ZIP64_LIMIT
+        if compressed >= ZIP64_LIMIT:
+            fields.append(compressed)
+            compressed = ZIP64_LIMIT
+        if header_offset >= ZIP64_LIMIT:
+            fields.append(header_offset)
+            header_offset = ZIP64_LIMIT
+
+        extra = b""
+        version = VERSION_DEFAULT
+        if fields:
+            extra = struct.pack(f"<HH{len(fields)}Q", _ZIP64_EXTRA_ID, 8 * len(fields), *fields)
+            version = VERSION_ZIP64
+
+        dos_time, dos_date = self.dos_datetime
+        external_attr = (stat.S_IFREG | stat.S_IMODE(self.mode)) << 16
+        return _CENTRAL_HEADER.pack(
+            _SIG_CENTRAL, MADE_BY_UNIX | version, version, MEMBER_FLAGS, self.method, dos_time, dos_date,
+            crc, compressed, size, len(self.name), len(extra), 0, 0, 0, external_attr, header_offset,
+        ) + self.name + extra
+
+
+def end_records(count: int, directory_offset: int, directory_size: int) -> bytes:
+    """
+    End of central directory record, preceded by the ZIP64 ones when the
+    archive needs them.
+    """
+    end = b""
+    if (
+        count >= ZIP_FILECOUNT_LIMIT
+        or directory_offset >= ZIP64_LIMIT
+        or directory_size >= ZIP64_LIMIT
+    ):
+        end += _END64_RECORD.pack(
+            _SIG_END64, _END64_RECORD.size - 12, VERSION_ZIP64, VERSION_ZIP64,
+            0, 0, count, count, directory_size, directory_offset,
+        )
+        end += _END64_LOCATOR.pack(_SIG_END64_LOCATOR, 0, directory_offset + directory_size, 1)
+
+    entries = min(count, ZIP_FILECOUNT_LIMIT)
+    return end + _END_RECORD.pack(
+        _SIG_END, 0, 0, entries, entries,
+        min(directory_size, ZIP64_LIMIT), min(directory_offset, ZIP64_LIMIT), 0,
+    )
+
+
+class ZipStreamWriter:
+    """
+    Writes a ZIP archive front to back without seeking, so it can go straight
+    to a socket. Each member is a local header, the data and a data descriptor
+    with its CRC and sizes; the central directory follows the last member.
+
+    Only the current read chunk and up to ZIP_WRITE_SIZE of output are held in
+    memory, plus the central directory record of each member written so far.
+    Members that may not fit 32-bit sizes get ZIP64 local headers, and the
+    ZIP64 end records are added when the archive needs them. `policy` decides
+    which members are deflated and at which level.
+
+        writer = ZipStreamWriter()
+        for path, arcname in files:
+            with open(path, "rb") as f:
+                yield from writer.add_file(f, arcname, os.fstat(f.fileno()))
+        yield from writer.finish()
+    """
+    def __init__(self, policy: CompressionPolicy | None = None):
+        self.policy = policy or CompressionPolicy()
+        self.offset = 0
+        self.count = 0
+        self._central: list[bytes] = []
+        self._buffer = bytearray()
+
+    def _write(self, data: bytes) -> bytes | None:
+        """
+        Buffers `data` and returns a chunk once ZIP_WRITE_SIZE is reached.
+        """
+        self._buffer += data
+        self.offset += len(data)
+        if len(self._buffer) < ZIP_WRITE_SIZE:
+            return None
+        return self._flush()
+
+    def _flush(self) -> bytes:
+        chunk = bytes(self._buffer)
+        self._buffer.clear()
+        return chunk
+
+    def add_file(
+        self,
+        f: BinaryIO,
+        arcname: str,
+        st: os.stat_result,
+        compress: bool | None = None,
+        force_zip64: bool = False,
+    ) -> Iterator[bytes]:
+        """
+        Yields the member for the open file `f`. Only the `st.st_size` bytes
+        that existed when the file was stat'ed are archived, so a file that
+        grows while it is read can not outgrow its header.
+        `compress` overrides the policy when not None.
+        """
+        size = st.st_size
+
+        # The method goes in the local header, so the first block is read first
+        head = f.read(min(ZIP_READ_SIZE, size))
+        if compress is None:
+            level = self.policy.choose(arcname, head)
+        else:
+            level = self.policy.level if compress else None
+
+        member, chunk = self.begin_member(arcname, st, level is not None, force_zip64)
+        if chunk:
+            yield chunk
+
+        compressor = None if level is None else zlib.compressobj(level, zlib.DEFLATED, -15)
+        crc = 0
+        read = 0
+        data = head
+
+        while data:
+            read += len(data)
+            crc = zlib.crc32(data, crc)
+
+            out = data if compressor is None else compressor.compress(data)
+            if chunk := self.member_data(member, out):
+                yield chunk
+
+            data = f.read(min(ZIP_READ_SIZE, size - read)) if read < size else b""
+
+        if compressor is not None:
+            if chunk := self.member_data(member, compressor.flush()):
+                yield chunk
+
+        if chunk := self.end_member(member, crc, read):
+            yield chunk
+
+    # ---- Members written piece by piece ----
+    def begin_member(
+        self, arcname: str, st: os.stat_result, deflated: bool, force_zip64: bool = False,
+    ) -> tuple["ZipMember", bytes | None]:
+        """
+        Writes the local header. The (already compressed) data follows with
+        member_data() and the member is closed with end_member().
+        Returns the member and an output chunk, if one is ready.
+        """
+        member = ZipMember.for_file(arcname, st, deflated, self.offset, force_zip64)
+        return member, self._write(member.local_header())
+
+    def member_data(self, member: "ZipMember", data: bytes) -> bytes | None:
+        member.compressed += len(data)
+        return self._write(data)
+
+    def end_member(self, member: "ZipMember", crc: int, size: int) -> bytes | None:
+        """
+        Writes the data descriptor of a member whose data had `size` bytes
+        before compression.
+        """
+        self._central.append(member.central_header(crc, size))
+        self.count += 1
+        return self._write(member.data_descriptor(crc, size))
+
+    def finish(self) -> Iterator[bytes]:
+        """
+        Yields the central directory and end records.
+        """
+        directory_offset = self.offset
+        for record in self._central:
+            if chunk := self._write(record):
+                yield chunk
+        self._central.clear()
+        directory_size = self.offset - directory_offset
+
+        if chunk := self._write(end_records(self.count, directory_offset, directory_size)):
+            yield chunk
+        if self._buffer:
+            yield self._flush()
+
+
+# =========================
+# Stored archive layout
+# =========================
+
+def zip_store_layout(files: Iterable[tuple[str | Path, str]]) -> ArchiveLayout:
+    """
+    Layout of a ZIP archive of (path, arcname) files, all stored, so its
+    size is known from the file sizes alone. The data descriptors and the
+    central directory need the CRC of each file; they are generated when
+    read, from the CRCs the layout remembers while serving the files.
+    Files that can not be stat'ed are skipped.
+    """
+    layout = ArchiveLayout("application/zip")
+    entries: list[tuple[ZipMember, int, int]] = []
+
+    for path, arcname in files:
+        try:
+            st = os.stat(path)
+        except OSError:
+            continue
+
+        size = st.st_size
+        member = ZipMember.for_file(arcname, st, False, layout.size)
+        member.compressed = size
+        layout.add_to_token(arcname, size, st.st_mtime_ns, st.st_ino, st.st_mode)
+
+        layout.add_bytes(member.local_header())
+        segment = layout.add_file(str(path), size)
+        layout.add_generated(
+            len(member.data_descriptor(0, size)),
+            lambda member=member, segment=segment, size=size: member.data_descriptor(layout.file_crc(segment), size),
+        )
+        entries.append((member, segment, size))
+
+    directory_offset = layout.size
+    directory_size = sum(len(member.central_header(0, size)) for member, _segment, size in entries)
+    layout.add_generated(
+        directory_size,
+        lambda: b"".join(member.central_header(layout.file_crc(segment), size) for member, segment, size in entries),
+    )
+    layout.add_bytes(end_records(len(entries), directory_offset, directory_size))
+    return layout
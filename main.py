@@ -208,7 +208,38 @@ class Plugin:
     @log_exceptions
     async def get_timeout_settings( self: 'Plugin' ) -> dict[str, Any]:
         return ApiResponse(settings_server.getSetting(server.SHUTDOWN_TIMEOUT_FIELD) or server.DEFAULT_TIMEOUT_IN_SECONDS).to_dict()
-    
+
+    @log_exceptions
+    async def get_transfer_limits( self: 'Plugin' ) -> dict[str, Any]:
+        return ApiResponse({
+            "globalLimit": int(settings_server.getSetting(server.TRANSFER_LIMIT_FIELD) or 0),
+            "clientLimit": int(settings_server.getSetting(server.CLIENT_TRANSFER_LIMIT_FIELD) or 0),
+            "gamingMode": bool(settings_server.getSetting(server.GAMING_MODE_FIELD)),
+            "gamingModeLimit": server.GAMING_MODE_LIMIT_KBS,
+        }).to_dict()
+
+    @log_exceptions
+    async def save_transfer_limits( self: 'Plugin', global_limit: int, client_limit: int ) -> dict[str, Any]:
+        decky.logger.info(f"Changing transfer limits to {global_limit} KB/s, {client_limit} KB/s per client")
+        for limit in (global_limit, client_limit):
+            # Whole KB/s only: int() would turn 0.5 into 0, i.e. unlimited
+            if isinstance(limit, bool) or not isinstance(limit, (int, float)) or limit < 0 or not float(limit).is_integer():
+                raise InvalidArgumentException("Transfer limits must be whole positive numbers, or 0 for unlimited")
+        settings_server.setSetting(server.TRANSFER_LIMIT_FIELD, int(global_limit))
+        settings_server.setSetting(server.CLIENT_TRANSFER_LIMIT_FIELD, int(client_limit))
+        # Running transfers pick the new limits up on their next chunk
+        if self.web_server:
+            self.web_server.apply_transfer_limits()
+        return ApiResponse().to_dict()
+
+    @log_exceptions
+    async def set_gaming_mode( self: 'Plugin', enabled: bool ) -> dict[str, Any]:
+        decky.logger.info(f"Changing gaming mode to {enabled}")
+        settings_server.setSetting(server.GAMING_MODE_FIELD, bool(enabled))
+        if self.web_server:
+            self.web_server.apply_transfer_limits()
+        return ApiResponse().to_dict()
+
     @log_exceptions
     async def save_server_settings( self: 'Plugin', key: str, value: Any ) -> dict[str, Any]:
         decky.logger.info("Changing settings - {}: {}".format( key, value ))
@@ -0,0 +1,111 @@
+import io
+import os
+import tarfile
+import zipfile
+import pytest
+
+from archivelayout import ArchiveLayout, LAYOUT_WRITE_SIZE
+from zipstream import zip_store_layout
+from tarstream import tar_layout, tar_members
+
+
+@pytest.fixture
+def saves(fs, tmp_path):
+    fs.create_file("saves/slot1.sav", os.urandom(200_000))
+    fs.create_file("saves/slot2.sav", b"slot2" * 1000)
+    fs.create_file("saves/empty.sav", b"")
+    return tmp_path / "saves"
+
+
+def zip_layout(fs, paths: list[str]) -> ArchiveLayout:
+    return fs.archive_layout(paths, "zip")
+
+
+def test_layout_reads_bytes_files_and_generated():
+    layout = ArchiveLayout("application/octet-stream")
+    layout.add_bytes(b"head")
+    layout.add_generated(3, lambda: b"gen")
+    layout.add_bytes(b"tail")
+
+    assert layout.size == 11
+    assert b"".join(layout.read()) == b"headgentail"
+    assert b"".join(layout.read(3, 8)) == b"dgent"
+    assert b"".join(layout.read(11)) == b""
+
+
+def test_layout_pads_shrunk_and_cuts_grown_files(tmp_path):
+    shrunk = tmp_path / "shrunk"
+    grown = tmp_path / "grown"
+    shrunk.write_bytes(b"ab")
+    grown.write_bytes(b"abcdef")
+
+    layout = ArchiveLayout("application/octet-stream")
+    layout.add_file(str(shrunk), 4)
+    layout.add_file(str(grown), 3)
+    layout.add_file(str(tmp_path / "missing"), 2)
+
+    assert b"".join(layout.read()) == b"ab\0\0abc\0\0"
+
+
+def test_zip_store_layout_is_valid_zip(fs, saves):
+    layout = zip_layout(fs, ["saves"])
+    data = b"".join(layout.read())
+
+    assert len(data) == layout.size
+    with zipfile.ZipFile(io.BytesIO(data)) as z:
+        assert z.testzip() is None
+        assert z.getinfo("saves/slot2.sav").compress_type == zipfile.ZIP_STORED
+        assert z.read("saves/slot1.sav") == (saves / "slot1.sav").read_bytes()
+        assert z.read("saves/empty.sav") == b""
+
+
+@pytest.mark.parametrize("archive_format", ["zip", "tar"])
+def test_any_range_matches_full_archive(fs, saves, archive_format):
+    full = b"".join(fs.archive_layout(["saves"], archive_format).read())
+
+    for start, end in [(0, 1), (10, 5000), (30_000, 150_000), (len(full) - 100, len(full)), (0, len(full))]:
+        # A fresh layout, as for a resumed download: CRCs are computed on demand
+        layout = fs.archive_layout(["saves"], archive_format)
+        assert b"".join(layout.read(start, end)) == full[start:end]
+
+
+def test_resumed_zip_is_valid(fs, saves):
+    full = b"".join(zip_layout(fs, ["saves"]).read())
+
+    # Interrupted in the middle of the first file's data
+    cut = 100_000
+    resumed = b"".join(zip_layout(fs, ["saves"]).read(cut))
+    with zipfile.ZipFile(io.BytesIO(full[:cut] + resumed)) as z:
+        assert z.testzip() is None
+
+
+def test_layout_chunks_are_bounded(fs, saves):
+    layout = zip_layout(fs, ["saves"])
+    assert max(len(chunk) for chunk in layout.read()) < 2 * LAYOUT_WRITE_SIZE
+
+
+def test_token_changes_with_files(fs, saves):
+    token = zip_layout(fs, ["saves"]).token
+    assert zip_layout(fs, ["saves"]).token == token
+    assert fs.archive_layout(["saves"], "tar").token != token
+
+    (saves / "slot2.sav").write_bytes(b"changed")
+    assert zip_layout(fs, ["saves"]).token != token
+
+
+def test_tar_layout_matches_tarfile(fs, saves):
+    layout = tar_layout(tar_members([saves]))
+    data = b"".join(layout.read())
+
+    assert len(data) == layout.size
+    assert len(data) % tarfile.RECORDSIZE == 0
+    with tarfile.open(fileobj=io.BytesIO(data)) as tar:
+        assert tar.extractfile("saves/slot2.sav").read() == b"slot2" * 1000
+
+
+def test_zip_store_layout_skips_missing_files(tmp_path):
+    (tmp_path / "a.txt").write_bytes(b"a")
+    layout = zip_store_layout([(tmp_path / "a.txt", "a.txt"), (tmp_path / "gone.txt", "gone.txt")])
+
+    with zipfile.ZipFile(io.BytesIO(b"".join(layout.read()))) as z:
+        assert z.namelist() == ["a.txt"]
@@ -0,0 +1,188 @@
+import asyncio
+import os
+import threading
+import pytest
+from contextlib import aclosing
+
+from asyncfs import AsyncFileSystemService, read_size_for, MIN_READ_SIZE, MAX_READ_SIZE
+
+
+@pytest.fixture
+def afs(fs):
+    service = AsyncFileSystemService(fs, max_workers=2)
+    yield service
+    service.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_operations_run_off_the_event_loop(afs):
+    loop_thread = threading.get_ident()
+
+    thread = await afs.run("probe", threading.get_ident)
+
+    assert thread != loop_thread
+
+
+@pytest.mark.asyncio
+async def test_shutdown_stops_workers_and_restarts_on_use(afs):
+    thread = await afs.run("probe", threading.current_thread)
+    afs.shutdown()
+
+    thread.join(timeout=5)
+    assert not thread.is_alive()
+
+    # A server started again gets a new pool
+    assert await afs.run("probe", lambda: 42) == 42
+
+
+@pytest.mark.asyncio
+async def test_facade_delegates_to_service(afs, fs):
+    await afs.create_dir("docs")
+    fs.create_file("docs/a.txt", b"a")
+
+    items = await afs.list_dir("docs")
+    assert [i.name for i in items] == ["a.txt"]
+
+    await afs.rename("docs/a.txt", "b.txt")
+    assert (fs.base_dir / "docs" / "b.txt").exists()
+
+    await afs.delete_dir("docs")
+    assert not (fs.base_dir / "docs").exists()
+
+
+@pytest.mark.asyncio
+async def test_stats_track_latency_and_errors(afs):
+    await afs.list_dir(".")
+
+    with pytest.raises(FileNotFoundError):
+        await afs.list_dir("missing")
+
+    stats = afs.stats()
+    assert stats["workers"] == 2
+    assert stats["queued"] == 0
+    assert stats["running"] == 0
+    assert stats["operations"]["list_dir"]["count"] == 2
+    assert stats["operations"]["list_dir"]["errors"] == 1
+
+
+@pytest.mark.asyncio
+async def test_queue_depth_when_pool_is_saturated(afs):
+    release = threading.Event()
+
+    blocked = [asyncio.ensure_future(afs.run("block", release.wait)) for _ in range(3)]
+    await asyncio.sleep(0.1)
+
+    stats = afs.stats()
+    assert stats["running"] == 2
+    assert stats["queued"] == 1
+
+    release.set()
+    await asyncio.gather(*blocked)
+    assert afs.stats()["operations"]["block"]["count"] == 3
+
+
+@pytest.mark.asyncio
+async def test_iterate(afs, fs):
+    fs.create_file("file.bin", b"A" * 100)
+
+    chunks = [c async for c in afs.iterate("read", fs.stream_read("file.bin", chunk_size=30))]
+
+    assert b"".join(chunks) == b"A" * 100
+    assert afs.stats()["operations"]["read"]["count"] == 5
+
+
+@pytest.mark.asyncio
+async def test_iterate_runs_on_the_stream_pool(afs):
+    def names():
+        while True:
+            yield threading.current_thread().name
+
+    async for name in afs.iterate("probe", names()):
+        break
+
+    # Long streams never take the workers of run()
+    assert name.startswith("fs-stream")
+    assert (await afs.run("probe", lambda: threading.current_thread().name)).startswith("fs-io")
+    assert afs.stats()["streamWorkers"] == afs.stream_workers
+
+
+@pytest.mark.asyncio
+async def test_iterate_reads_ahead(afs):
+    produced = []
+
+    def numbers():
+        for i in range(4):
+            produced.append(i)
+            yield i
+
+    seen = []
+    async for item in afs.iterate("numbers", numbers()):
+        await asyncio.sleep(0.05)
+        # The next item was produced while this one was being handled
+        seen.append((item, len(produced)))
+
+    assert seen == [(0, 2), (1, 3), (2, 4), (3, 4)]
+
+
+@pytest.mark.asyncio
+async def test_iterate_closes_generator_after_running_next(afs):
+    release = threading.Event()
+    closed = threading.Event()
+
+    def slow():
+        try:
+            yield 1
+            release.wait()
+            yield 2
+        finally:
+            closed.set()
+
+    chunks = afs.iterate("slow", slow())
+    assert await chunks.__anext__() == 1
+    await chunks.aclose()
+
+    # next() is still blocked on the pool: the generator closes once it returns
+    assert not closed.is_set()
+    release.set()
+    await asyncio.sleep(0.1)
+    assert closed.is_set()
+
+
+def test_read_size_for():
+    assert read_size_for(0) == MIN_READ_SIZE
+    assert read_size_for(10 * 1024 * 1024) == 128 * 1024
+    assert read_size_for(10 * 1024 ** 3) == MAX_READ_SIZE
+
+
+@pytest.mark.asyncio
+async def test_read_file(afs, fs, tmp_path):
+    content = os.urandom(3 * 1024 * 1024 + 17)
+    fs.create_file("game.iso", content)
+
+    with open(tmp_path / "game.iso", "rb") as f:
+        async with aclosing(afs.read_file(f, 1000, 2 * 1024 * 1024)) as chunks:
+            data = b"".join([c async for c in chunks])
+        assert data == content[1000:1000 + 2 * 1024 * 1024]
+
+        # Past the end: stops at the end of the file
+        async with aclosing(afs.read_file(f, len(content) - 10, 100)) as chunks:
+            assert b"".join([c async for c in chunks]) == content[-10:]
+
+        # Positional: the file position is not used
+        assert f.tell() == 0
+
+
+@pytest.mark.asyncio
+async def test_read_file_adapts_read_size(afs, fs, tmp_path):
+    fs.create_file("game.iso", bytes(4 * 1024 * 1024))
+
+    with open(tmp_path / "game.iso", "rb") as f:
+        device = os.fstat(f.fileno()).st_dev
+
+        async with aclosing(afs.read_file(f, 0, 4 * 1024 * 1024)) as chunks:
+            sizes = [len(c) async for c in chunks]
+
+    # Starts small, then grows with the measured (page cache) throughput
+    assert sizes[0] == MIN_READ_SIZE
+    assert max(sizes) > MIN_READ_SIZE
+    assert afs._throughput[device] > 0
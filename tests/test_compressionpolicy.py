@@ -0,0 +1,45 @@
+import io
+import os
+import zipfile
+import pytest
+
+from compressionpolicy import CompressionPolicy, is_compressed_format, PROBE_SIZE
+
+TEXT = b"[Settings]\nResolution=1280x800\nVSync=true\n" * 2000
+NOISE = os.urandom(PROBE_SIZE)
+
+
+def test_known_formats_by_extension_and_magic():
+    assert is_compressed_format("clip.MP4", b"")
+    assert is_compressed_format("rom.chd", b"")
+    assert is_compressed_format("no_extension", b"\x89PNG\r\n\x1a\n....")
+    assert is_compressed_format("video.bin", b"\x00\x00\x00\x18ftypmp42")
+    assert not is_compressed_format("game.ini", TEXT[:100])
+
+
+@pytest.mark.parametrize("mode, level", [("fastest", 1), ("balanced", 6), ("smallest", 9)])
+def test_policy_levels(mode, level):
+    policy = CompressionPolicy(mode)
+
+    assert policy.choose("settings.ini", TEXT) == level
+    assert policy.choose("settings.ini", NOISE) is None  # probe does not shrink it
+    assert policy.choose("shot.png", TEXT) is None
+    assert policy.choose("tiny.txt", b"x" * 10) is None
+
+
+def test_invalid_mode():
+    with pytest.raises(ValueError):
+        CompressionPolicy("ultra")
+
+
+def test_zip_members_follow_policy(fs):
+    fs.create_file("pack/settings.ini", TEXT)
+    fs.create_file("pack/clip.mp4", TEXT)
+    fs.create_file("pack/save.dat", NOISE)
+
+    with zipfile.ZipFile(io.BytesIO(b"".join(fs.stream_zip(["pack"], "fastest")))) as z:
+        assert z.testzip() is None
+        assert z.getinfo("pack/settings.ini").compress_type == zipfile.ZIP_DEFLATED
+        assert z.getinfo("pack/clip.mp4").compress_type == zipfile.ZIP_STORED
+        assert z.getinfo("pack/save.dat").compress_type == zipfile.ZIP_STORED
+        assert z.read("pack/save.dat") == NOISE
@@ -0,0 +1,121 @@
+import multiprocessing
+import re
+import contentsearch
+import pytest
+from pathlib import Path
+from types import SimpleNamespace
+
+from contentsearch import ContentSearch, grep_file, compile_pattern
+
+
+@pytest.fixture
+def prefix(tmp_path: Path) -> Path:
+    root = tmp_path / "pfx"
+    (root / "drive_c/windows").mkdir(parents=True)
+    (root / "user.reg").write_text('[Software\\\\Wine]\n"Version"="win10"\n\n"version"="win7"\n')
+    (root / "drive_c/game.ini").write_bytes(b"[Video]\r\nVersion=2\r\n")
+    (root / "drive_c/windows/kernel32.dll").write_bytes(b"MZ\0\0Version")
+    (root / "empty.txt").write_bytes(b"")
+    return root
+
+
+def matches_by_file(events) -> dict:
+    return {Path(e["path"]).name: [(m["line"], m["text"]) for m in e["matches"]] for e in events if e["event"] == "matches"}
+
+
+def test_literal_search(prefix):
+    *events, end = ContentSearch(prefix, "Version").results()
+
+    assert matches_by_file(events) == {
+        "user.reg": [(2, '"Version"="win10"')],
+        "game.ini": [(2, "Version=2")],
+    }
+    assert end == {"event": "end", "files": 4, "matches": 2, "errors": 0, "truncated": False}
+
+
+def test_ignore_case_and_include(prefix):
+    *events, _end = ContentSearch(prefix, "VERSION", ignore_case=True, include="*.REG").results()
+
+    assert matches_by_file(events) == {"user.reg": [(2, '"Version"="win10"'), (4, '"version"="win7"')]}
+
+
+def test_regex_is_multiline(prefix):
+    *events, _end = ContentSearch(prefix, r'^"version"="(\w+)"$', regex=True).results()
+
+    assert matches_by_file(events) == {"user.reg": [(4, '"version"="win7"')]}
+
+
+def test_literal_pattern_is_escaped(prefix):
+    *events, _end = ContentSearch(prefix, "[Video]").results()
+
+    assert matches_by_file(events) == {"game.ini": [(1, "[Video]")]}
+
+
+def test_invalid_pattern():
+    with pytest.raises(re.error):
+        compile_pattern("(", regex=True)
+    with pytest.raises(ValueError):
+        compile_pattern("")
+
+
+def test_one_result_per_line(tmp_path):
+    (tmp_path / "a.txt").write_text("aaa\nb\naa")
+    pattern, flags = compile_pattern("a")
+
+    _path, matches, error = grep_file((str(tmp_path / "a.txt"), pattern, flags))
+
+    assert matches == [(1, "aaa"), (3, "aa")]
+    assert error is None
+
+
+def test_max_matches_truncates(tmp_path):
+    for i in range(20):
+        (tmp_path / f"{i}.cfg").write_text("key=1\nkey=2\n")
+
+    *events, end = ContentSearch(tmp_path, "key", max_matches=5).results()
+
+    assert sum(len(e["matches"]) for e in events if e["event"] == "matches") == 5
+    assert end["truncated"] is True
+
+
+def test_cancel_terminates_workers(tmp_path):
+    for i in range(200):
+        (tmp_path / f"{i}.cfg").write_text("key=1\n")
+
+    search = ContentSearch(tmp_path, "key")
+    results = search.results()
+    assert next(e for e in results if e["event"] == "matches")
+
+    search.cancel()
+    assert list(results) == []
+    assert multiprocessing.active_children() == []
+
+
+class StalledPool:
+    """Accepts work but never finishes it, like workers stuck on huge files."""
+    def __init__(self, *args, **kwargs):
+        self.submitted = []
+
+    def apply_async(self, func, args, callback=None, error_callback=None):
+        self.submitted.append(args)
+
+    def terminate(self):
+        pass
+
+    def join(self):
+        pass
+
+
+def test_stalled_workers_yield_progress_and_bound_the_walk(tmp_path, monkeypatch):
+    for i in range(200):
+        (tmp_path / f"{i}.cfg").write_text("key=1\n")
+
+    pool = StalledPool()
+    monkeypatch.setattr(contentsearch, "process_pool_context", lambda: SimpleNamespace(Pool=lambda *a, **kw: pool))
+    monkeypatch.setattr(contentsearch, "GREP_POLL_SECONDS", 0.01)
+
+    results = ContentSearch(tmp_path, "key", workers=2).results()
+
+    assert next(results) == {"event": "progress", "files": 0, "matches": 0}
+    assert len(pool.submitted) == 2 * contentsearch.GREP_BATCHES_PER_WORKER
+    results.close()
@@ -1,3 +1,8 @@
+import pytest
+import os
+from filesystem import FileSystemError, FLAG_DIR, FLAG_FILE, FLAG_HIDDEN, encode_columnar, get_extension
+
+
 def test_list_empty_directory(fs):
     assert fs.list_dir(".") == []
 
@@ -19,3 +24,197 @@ def test_create_and_delete_directory(fs):
 
     fs.delete_dir("docs")
     assert not (fs.base_dir / "docs").exists()
+
+
+def test_list_directory_entries_match_object_dict(fs):
+    fs.create_file("docs/readme.MD", b"hello")
+    fs.create_file("docs/sub/a.txt", b"x")
+    fs.create_file("docs/.hidden", b"")
+
+    entries = {item.name: item.to_dict() for item in fs.list_dir("docs")}
+
+    for name, data in entries.items():
+        assert data == fs.get_object(f"docs/{name}").to_dict()
+
+    assert entries["readme.MD"]["extension"] == ".md"
+    assert entries["readme.MD"]["size"] == 5
+    assert entries["sub"]["itemsCount"] == 1
+    assert entries[".hidden"]["isHidden"] is True
+
+
+def test_list_directory_with_broken_symlink(fs):
+    (fs.base_dir / "dangling").symlink_to(fs.base_dir / "missing")
+
+    (item,) = fs.list_dir(".")
+
+    assert item.isDir() is False
+    assert item.isFile() is False
+
+
+def test_list_directory_lazy_counts(fs):
+    fs.create_file("games/a/save.dat", b"x")
+
+    (item,) = fs.list_dir("games")
+
+    assert item.to_dict(with_items_count=False)["itemsCount"] is None
+
+
+def test_count_items(fs):
+    fs.create_file("dir/a.txt", b"a")
+    fs.create_file("dir/b.txt", b"b")
+    fs.create_dir("empty")
+
+    counts = {c["path"]: c for c in fs.count_items(["dir", "empty", "missing"])}
+
+    assert counts["dir"]["itemsCount"] == 2
+    assert counts["dir"]["complete"] is True
+    assert counts["empty"]["itemsCount"] == 0
+    assert counts["missing"]["itemsCount"] is None
+
+
+def test_count_items_is_capped(fs):
+    for i in range(5):
+        fs.create_file(f"big/{i}.bin", b"")
+
+    (count,) = fs.count_items(["big"], cap=3)
+
+    assert count["itemsCount"] == 3
+    assert count["complete"] is False
+
+
+def test_list_dir_page_sorted_with_dirs_first(fs):
+    fs.create_file("b.txt", b"22")
+    fs.create_file("A.txt", b"1")
+    fs.create_file("c.bin", b"333")
+    fs.create_dir("zdir")
+
+    names = [e.name for e in fs.list_dir_page(".", sort="name").entries]
+    assert names == ["zdir", "A.txt", "b.txt", "c.bin"]
+
+    names = [e.name for e in fs.list_dir_page(".", sort="size", descending=True).entries]
+    assert names == ["zdir", "c.bin", "b.txt", "A.txt"]
+
+    names = [e.name for e in fs.list_dir_page(".", sort="type").entries]
+    assert names == ["zdir", "c.bin", "A.txt", "b.txt"]
+
+
+def test_list_dir_page_filters(fs):
+    fs.create_file(".hidden", b"")
+    fs.create_file("shader_1.bin", b"")
+    fs.create_file("Shader_2.bin", b"")
+    fs.create_file("save.dat", b"")
+
+    page = fs.list_dir_page(".", show_hidden=False)
+    assert ".hidden" not in [e.name for e in page.entries]
+    assert page.total == 3
+
+    page = fs.list_dir_page(".", prefix="shader")
+    assert [e.name for e in page.entries] == ["shader_1.bin", "Shader_2.bin"]
+
+
+def test_list_dir_page_cursor(fs):
+    for i in range(10):
+        fs.create_file(f"file{i}.txt", b"")
+
+    seen = []
+    cursor = None
+    while True:
+        page = fs.list_dir_page(".", limit=3, cursor=cursor)
+        assert page.total == 10
+        seen += [e.name for e in page.entries]
+        cursor = page.next_cursor
+        if cursor is None:
+            break
+
+    assert seen == [f"file{i}.txt" for i in range(10)]
+
+
+def test_list_dir_page_cursor_survives_directory_changes(fs):
+    for i in range(6):
+        fs.create_file(f"file{i}.txt", b"")
+
+    page = fs.list_dir_page(".", limit=3)
+    fs.create_file("file0a.txt", b"")
+
+    page = fs.list_dir_page(".", limit=3, cursor=page.next_cursor)
+    assert [e.name for e in page.entries] == ["file3.txt", "file4.txt", "file5.txt"]
+
+
+def test_list_dir_page_invalid_arguments(fs):
+    with pytest.raises(FileSystemError):
+        fs.list_dir_page(".", sort="color")
+
+    with pytest.raises(FileSystemError):
+        fs.list_dir_page(".", cursor="not-a-cursor")
+
+
+def test_stream_dir_phases(fs):
+    fs.create_file("a.txt", b"abc")
+    fs.create_file(".hidden", b"")
+    fs.create_dir("sub")
+
+    batches = list(fs.stream_dir(".", show_hidden=False, batch_size=1))
+    events = [event for event, _ in batches]
+
+    # Every name is sent before any metadata
+    assert events == ["entries", "entries", "meta", "meta"]
+
+    entries = {i["name"]: i for event, items in batches if event == "entries" for i in items}
+    assert set(entries) == {"a.txt", "sub"}
+    assert entries["sub"]["isDir"] is True
+
+    meta = {i["path"]: i for event, items in batches if event == "meta" for i in items}
+    assert meta[entries["a.txt"]["path"]]["size"] == 3
+    assert meta[entries["a.txt"]["path"]]["type"] == "text"
+
+    # Milliseconds, like the mtimes of the columnar format
+    mtime_ns = os.stat(entries["a.txt"]["path"]).st_mtime_ns
+    assert meta[entries["a.txt"]["path"]]["mtime"] == mtime_ns // 1_000_000
+
+
+def test_encode_columnar_matches_object_dicts(fs):
+    fs.create_file("docs/clip.mp4", b"video")
+    fs.create_file("docs/notes.TXT", b"hi")
+    fs.create_file("docs/.hidden", b"")
+    fs.create_file("docs/sub/a.txt", b"x")
+
+    directory = str(fs.get_object("docs").path)
+    entries = fs.list_dir("docs")
+    columns = encode_columnar(directory, entries)
+
+    assert columns["directory"] == directory
+    assert len(columns["names"]) == len(entries)
+    assert all(len(columns[key]) == len(entries) for key in ("flags", "sizes", "mtimes", "types", "itemsCounts"))
+
+    # Rebuild the object form the way the web UI does
+    for i, name in enumerate(columns["names"]):
+        flags = columns["flags"][i]
+        path = os.path.join(directory, name)
+        item = {
+            "path": path,
+            "isDir": bool(flags & FLAG_DIR),
+            "isFile": bool(flags & FLAG_FILE),
+            "isHidden": bool(flags & FLAG_HIDDEN),
+            "directory": path if flags & FLAG_DIR else directory,
+        }
+        if item["isDir"]:
+            item["itemsCount"] = columns["itemsCounts"][i]
+        if item["isFile"]:
+            item.update({
+                "name": name,
+                "extension": get_extension(name),
+                "size": columns["sizes"][i],
+                "type": columns["typeNames"][columns["types"][i]],
+            })
+
+        assert item == fs.get_object(f"docs/{name}").to_dict()
+
+
+def test_encode_columnar_lazy_counts(fs):
+    fs.create_file("docs/sub/a.txt", b"x")
+
+    columns = encode_columnar(str(fs.base_dir / "docs"), fs.list_dir("docs"), with_items_count=False)
+
+    assert columns["itemsCounts"] == [None]
+    assert columns["types"] == [-1]
+    assert columns["typeNames"] == []
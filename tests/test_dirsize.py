@@ -0,0 +1,121 @@
+import threading
+import pytest
+from pathlib import Path
+
+from dirsize import DirectorySizeService
+
+
+@pytest.fixture
+def tree(tmp_path: Path) -> Path:
+    root = tmp_path / "tree"
+    (root / "shadercache/a").mkdir(parents=True)
+    (root / "compatdata/pfx").mkdir(parents=True)
+    (root / "top.txt").write_bytes(b"x" * 10)
+    (root / "shadercache/a/cache.foz").write_bytes(b"x" * 100)
+    (root / "shadercache/b.bin").write_bytes(b"x" * 5)
+    (root / "compatdata/pfx/system.reg").write_bytes(b"x" * 1000)
+    return root
+
+
+@pytest.fixture
+def sizes(tmp_path: Path):
+    service = DirectorySizeService(tmp_path / "cache/dir_sizes.sqlite3")
+    yield service
+    service.shutdown()
+
+
+def final(walk) -> dict:
+    *progress, result = list(walk)
+    assert all(not p["done"] for p in progress)
+    assert result["done"] is True
+    return result
+
+
+def test_walk_totals_and_children(sizes, tree):
+    result = final(sizes.walk(tree))
+
+    assert result["size"] == 1115
+    assert result["files"] == 4
+    assert result["dirs"] == 5
+    assert result["reused"] == 0
+    assert result["children"] == {"shadercache": 105, "compatdata": 1000}
+
+
+def test_walk_does_not_follow_symlinks(sizes, tree):
+    (tree / "link").symlink_to(tree / "compatdata")
+
+    result = final(sizes.walk(tree))
+
+    assert "link" not in result["children"]
+    assert result["dirs"] == 5
+
+
+def test_second_walk_reuses_unchanged_directories(sizes, tree):
+    final(sizes.walk(tree))
+
+    (tree / "compatdata/pfx/user.reg").write_bytes(b"x" * 24)
+    result = final(sizes.walk(tree))
+
+    # Only compatdata/pfx changed
+    assert result["reused"] == 4
+    assert result["children"]["compatdata"] == 1024
+
+
+def test_cache_is_persistent(tmp_path, tree):
+    db = tmp_path / "dir_sizes.sqlite3"
+
+    first = DirectorySizeService(db)
+    final(first.walk(tree))
+    first.shutdown()
+
+    second = DirectorySizeService(db)
+    try:
+        result = final(second.walk(tree))
+    finally:
+        second.shutdown()
+
+    assert result["reused"] == 5
+    assert result["size"] == 1115
+
+
+def test_invalidate_and_refresh(sizes, tree):
+    final(sizes.walk(tree))
+
+    # Rewritten in place: the directory mtime does not change
+    (tree / "top.txt").write_bytes(b"x" * 20)
+    sizes.invalidate(tree / "top.txt")
+    result = final(sizes.walk(tree))
+    assert result["size"] == 1125
+    assert result["reused"] == 4
+
+    assert final(sizes.walk(tree, refresh=True))["reused"] == 0
+
+
+def test_deleted_directories_are_dropped_from_cache(sizes, tree):
+    final(sizes.walk(tree))
+    assert sizes.store.count() == 5
+
+    (tree / "shadercache/a/cache.foz").unlink()
+    (tree / "shadercache/a").rmdir()
+    final(sizes.walk(tree))
+
+    assert sizes.store.count() == 4
+
+
+def test_cancelled_walk_stops(sizes, tree):
+    cancel = threading.Event()
+    cancel.set()
+
+    assert list(sizes.walk(tree, cancel=cancel)) == []
+
+
+def test_filesystem_writes_invalidate(fs, sizes):
+    fs.add_invalidation_listener(sizes.invalidate)
+    fs.create_file("docs/a.txt", b"abc")
+    fs.create_file("b.txt", b"abcdef")
+    final(sizes.walk(fs.base_dir / "docs"))
+
+    # Overwriting a file keeps the directory mtime
+    fs.copy("b.txt", "docs/a.txt", overwrite=True)
+
+    assert final(sizes.walk(fs.base_dir / "docs"))["size"] == 6
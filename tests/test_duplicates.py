@@ -0,0 +1,135 @@
+import multiprocessing
+import os
+import pytest
+from pathlib import Path
+from types import SimpleNamespace
+
+import duplicates
+from duplicates import DuplicateFinder, HashStore, PARTIAL_HASH_BYTES
+
+
+@pytest.fixture
+def store(tmp_path: Path):
+    store = HashStore(tmp_path / "cache/file_hashes.sqlite3")
+    yield store
+    store.close()
+
+
+@pytest.fixture
+def library(tmp_path: Path) -> Path:
+    root = tmp_path / "library"
+    (root / "roms").mkdir(parents=True)
+    (root / "backup").mkdir()
+
+    rom = os.urandom(3 * PARTIAL_HASH_BYTES)
+    (root / "roms/game.gba").write_bytes(rom)
+    (root / "backup/game (copy).gba").write_bytes(rom)
+    # Same size, head and tail: only the full hash tells it apart
+    middle = len(rom) // 2
+    (root / "backup/patched.gba").write_bytes(rom[:middle] + bytes([rom[middle] ^ 1]) + rom[middle + 1:])
+
+    (root / "roms/shot1.png").write_bytes(b"png" * 100)
+    (root / "backup/shot1.png").write_bytes(b"png" * 100)
+    (root / "roms/unique.txt").write_bytes(b"png" * 101)
+    (root / "roms/empty").write_bytes(b"")
+    (root / "backup/empty").write_bytes(b"")
+    return root
+
+
+def run(finder: DuplicateFinder) -> tuple[list[dict], dict]:
+    events = list(finder.results())
+    groups = [e for e in events if e["event"] == "group"]
+    assert events[-1]["event"] == "end"
+    return groups, events[-1]
+
+
+def names(group: dict) -> list[str]:
+    return sorted(Path(p).name for p in group["paths"])
+
+
+def test_finds_duplicate_groups(library, store):
+    groups, end = run(DuplicateFinder(library, store))
+
+    assert sorted(map(names, groups)) == [["game (copy).gba", "game.gba"], ["shot1.png", "shot1.png"]]
+    assert end["groups"] == 2
+    assert end["reclaimable"] == 3 * PARTIAL_HASH_BYTES + 300
+    assert [item["size"] for item in groups[0]["items"]] == [groups[0]["size"]] * 2
+
+
+def test_hard_links_are_not_duplicates(library, store):
+    os.link(library / "roms/unique.txt", library / "backup/unique-link.txt")
+
+    groups, _end = run(DuplicateFinder(library, store))
+
+    assert all("unique.txt" not in names(g) and "unique-link.txt" not in names(g) for g in groups)
+
+
+def test_repeat_scan_uses_cache(library, store):
+    _groups, first = run(DuplicateFinder(library, store))
+    assert first["hashed"] > 0
+
+    groups, second = run(DuplicateFinder(library, store))
+    assert second["hashed"] == 0
+    assert second["groups"] == 2
+    assert len(groups) == 2
+
+
+def test_counters_reset_between_runs(library, store):
+    finder = DuplicateFinder(library, store)
+    run(finder)
+
+    _groups, second = run(finder)
+    _groups, fresh = run(DuplicateFinder(library, store))
+
+    assert second == fresh
+    assert second["hashed"] == 0
+
+
+class SlowPool:
+    """Times out once before each result, like a worker on a multi-GB file."""
+    def imap_unordered(self, func, paths):
+        pending = [func(p) for p in paths]
+        stalled = [False]
+
+        def next(timeout=None):
+            if not stalled[0]:
+                stalled[0] = True
+                raise multiprocessing.TimeoutError
+            stalled[0] = False
+            return pending.pop(0)
+
+        return SimpleNamespace(next=next)
+
+    def terminate(self):
+        pass
+
+    def join(self):
+        pass
+
+
+def test_slow_full_hash_yields_progress(library, store, monkeypatch):
+    monkeypatch.setattr(duplicates, "process_pool_context", lambda: SimpleNamespace(Pool=lambda *a, **kw: SlowPool()))
+
+    events = list(DuplicateFinder(library, store).results())
+    full = [(e["done"], e["total"]) for e in events if e["event"] == "progress" and e["stage"] == "full"]
+
+    # One heartbeat while each of the three .gba files hashes, then its result
+    assert full == [(0, 3), (1, 3), (1, 3), (2, 3), (2, 3), (3, 3)]
+    assert events[-1]["groups"] == 2
+
+
+def test_changed_file_is_rehashed(library, store):
+    run(DuplicateFinder(library, store))
+
+    (library / "backup/shot1.png").write_bytes(b"gif" * 100)
+    groups, end = run(DuplicateFinder(library, store))
+
+    assert [names(g) for g in groups] == [["game (copy).gba", "game.gba"]]
+    assert end["hashed"] == 1
+
+
+def test_cancel_stops_the_job(library, store):
+    finder = DuplicateFinder(library, store)
+    finder.cancel()
+
+    assert list(finder.results()) == []
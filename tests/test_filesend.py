@@ -0,0 +1,80 @@
+import os
+import pytest
+from unittest.mock import MagicMock
+from aiohttp import ClientConnectionResetError
+
+from filesend import (
+    MultipartRanges, RangeNotSatisfiableError, file_etag, parse_byte_range, parse_byte_ranges, send_open_file,
+)
+
+
+@pytest.mark.parametrize("header, expected", [
+    ("bytes=0-4", [(0, 4)]),
+    ("bytes=5-", [(5, 9)]),
+    ("bytes=-3", [(7, 9)]),
+    ("bytes=-50", [(0, 9)]),
+    ("bytes=8-100", [(8, 9)]),
+    ("bytes=0-1, 4-5", [(0, 1), (4, 5)]),
+    ("bytes=4-5,0-1", [(0, 1), (4, 5)]),
+    ("bytes=0-3,2-5,6-6", [(0, 6)]),
+    ("bytes=0-1,20-30", [(0, 1)]),
+])
+def test_parse_byte_ranges(header, expected):
+    assert parse_byte_ranges(header, 10) == expected
+
+
+@pytest.mark.parametrize("header", ["items=0-1", "bytes=a-b", "bytes=5-2", "bytes=", "bytes=1", "bytes=" + ",".join(["0-0"] * 17)])
+def test_parse_byte_ranges_ignores_invalid(header):
+    assert parse_byte_ranges(header, 10) is None
+
+
+@pytest.mark.parametrize("header", ["bytes=10-", "bytes=10-20,30-", "bytes=-0"])
+def test_parse_byte_ranges_unsatisfiable(header):
+    with pytest.raises(RangeNotSatisfiableError):
+        parse_byte_ranges(header, 10)
+
+
+def test_parse_byte_ranges_empty_file():
+    with pytest.raises(RangeNotSatisfiableError):
+        parse_byte_ranges("bytes=-5", 0)
+
+
+def test_parse_byte_range_single_only():
+    assert parse_byte_range("bytes=2-3", 10) == (2, 3)
+    assert parse_byte_range("bytes=0-1,4-5", 10) is None
+
+
+def test_multipart_ranges_length():
+    parts = MultipartRanges([(0, 1), (4, 5)], "video/mp4", 10)
+    body = b"".join(header + b"xx" for header in parts.part_headers) + parts.closing
+
+    assert parts.length == len(body)
+    assert parts.content_type == f"multipart/byteranges; boundary={parts.boundary}"
+    assert b"Content-Range: bytes 4-5/10" in parts.part_headers[1]
+
+
+def test_file_etag_changes_with_file(tmp_path):
+    path = tmp_path / "clip.mp4"
+    path.write_bytes(b"a")
+    etag = file_etag(os.stat(path))
+
+    assert etag.startswith('"') and etag.endswith('"')
+    assert file_etag(os.stat(path)) == etag
+
+    os.utime(path, ns=(0, 1_000_000_000))
+    assert file_etag(os.stat(path)) != etag
+
+
+@pytest.mark.asyncio
+async def test_send_open_file_to_closed_connection(tmp_path, monkeypatch):
+    monkeypatch.setattr("filesend.NOSENDFILE", False)
+    path = tmp_path / "rom.bin"
+    path.write_bytes(b"x" * 1024)
+
+    request = MagicMock()
+    request.transport.get_extra_info.return_value = None
+    request.transport.is_closing.return_value = True
+
+    # A disconnect is reported as such, not as loop.sendfile's RuntimeError
+    with open(path, "rb") as f, pytest.raises(ClientConnectionResetError):
+        await send_open_file(request, MagicMock(), MagicMock(), f, 0, 1024)
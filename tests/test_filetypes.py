@@ -0,0 +1,41 @@
+import pytest
+from pathlib import Path
+
+from filetypes import MIME_BY_EXTENSION, get_extension, get_file_type, guess_mime_type
+
+
+@pytest.mark.parametrize("name, expected", [
+    ("clip.MP4", "video"),
+    ("chunk-stream0-00001.m4s", "video"),
+    ("session.mpd", "application"),
+    ("screenshot.png", "image"),
+    ("appmanifest_570.acf", "text"),
+    ("libraryfolders.vdf", "text"),
+    ("system.reg", "text"),
+    ("game.chd", "application"),
+    ("README", "unknown"),
+    (".bashrc", "unknown"),
+])
+def test_get_file_type(name, expected):
+    assert get_file_type(name) == expected
+
+
+def test_get_file_type_falls_back_to_mimetypes():
+    assert ".pdf" not in MIME_BY_EXTENSION
+    assert get_file_type("manual.pdf") == "application"
+
+
+def test_guess_mime_type():
+    assert guess_mime_type(Path("/videos/clip.mp4")) == "video/mp4"
+    assert guess_mime_type("noextension") is None
+
+
+def test_table_is_frozen():
+    with pytest.raises(TypeError):
+        MIME_BY_EXTENSION[".new"] = "application/x-new" # type: ignore
+
+
+def test_get_extension():
+    assert get_extension("Archive.TAR.GZ") == ".gz"
+    assert get_extension(".hidden") == ""
+    assert get_extension("trailing.") == ""
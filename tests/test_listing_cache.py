@@ -0,0 +1,82 @@
+from filesystem import FileSystemEntry, FileSystemService, ListingCache
+
+
+def make_entries(count: int, prefix: str = "file") -> list[FileSystemEntry]:
+    return [FileSystemEntry(f"{prefix}{i}", "/dir", False, True) for i in range(count)]
+
+
+def test_cache_hit_and_version_miss():
+    cache = ListingCache()
+    entries = make_entries(3)
+
+    cache.put("/dir", (1, 10), entries)
+
+    assert cache.get("/dir", (1, 10)) is entries
+    assert cache.get("/dir", (2, 10)) is None
+
+    stats = cache.stats()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 1
+    assert stats["hitRate"] == 0.5
+    assert stats["bytes"] == ListingCache.estimate_size(entries)
+
+
+def test_cache_lru_eviction_within_budget():
+    size = ListingCache.estimate_size(make_entries(10))
+    cache = ListingCache(budget_bytes=size * 2)
+
+    cache.put("/a", (1, 1), make_entries(10))
+    cache.put("/b", (1, 2), make_entries(10))
+    cache.get("/a", (1, 1))
+    cache.put("/c", (1, 3), make_entries(10))
+
+    assert cache.get("/a", (1, 1)) is not None
+    assert cache.get("/b", (1, 2)) is None
+    assert cache.stats()["evictions"] == 1
+    assert cache.stats()["bytes"] <= size * 2
+
+
+def test_cache_skips_listings_over_budget():
+    cache = ListingCache(budget_bytes=100)
+    cache.put("/big", (1, 1), make_entries(10))
+
+    assert cache.stats()["directories"] == 0
+
+
+def test_cache_recursive_invalidation():
+    cache = ListingCache()
+    for path in ["/a", "/a/b", "/a/b/c", "/ab"]:
+        cache.put(path, (1, 1), make_entries(1))
+
+    cache.invalidate("/a", recursive=True)
+
+    assert cache.get("/ab", (1, 1)) is not None
+    assert cache.get("/a/b/c", (1, 1)) is None
+
+
+def test_service_reuses_cached_listing(fs: FileSystemService):
+    fs.create_file("docs/a.txt", b"a")
+
+    fs.list_dir("docs")
+    fs.list_dir("docs")
+
+    assert fs.listing_cache.stats()["hits"] == 1
+
+
+def test_service_mutations_invalidate_listing(fs: FileSystemService):
+    fs.create_file("docs/a.txt", b"a")
+    fs.list_dir("docs")
+
+    # Rewriting a file does not touch the directory mtime
+    fs.create_file("docs/a.txt", b"longer")
+    (entry,) = fs.list_dir("docs")
+    assert entry.size == 6
+
+    fs.rename("docs/a.txt", "b.txt")
+    assert [e.name for e in fs.list_dir("docs")] == ["b.txt"]
+
+    stream = fs.open_write_stream("docs/upload.bin")
+    stream.write(b"12345")
+    stream.close()
+    sizes = {e.name: e.size for e in fs.list_dir("docs")}
+    assert sizes["upload.bin"] == 5
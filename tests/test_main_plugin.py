@@ -190,3 +190,59 @@ async def test_uninstall_stops_running_server(plugin, mock_webserver):
     await plugin._uninstall()
 
     mock_webserver.stop.assert_awaited()
+
+
+# ------------------------
+# TRANSFER LIMITS
+# ------------------------
+
+@pytest.fixture
+def memory_settings(monkeypatch):
+    """
+    Server settings kept in memory, so the tests never touch server_settings.json
+    """
+    settings = {}
+    monkeypatch.setattr(main.settings_server, "getSetting", lambda key: settings.get(key))
+    monkeypatch.setattr(main.settings_server, "setSetting", settings.__setitem__)
+    return settings
+
+
+@pytest.mark.asyncio
+async def test_save_transfer_limits_applies_to_server(plugin, mock_webserver, memory_settings):
+    plugin.web_server = mock_webserver
+
+    await plugin.save_transfer_limits(2048, 512)
+    res = await plugin.get_transfer_limits()
+
+    assert res["data"]["globalLimit"] == 2048
+    assert res["data"]["clientLimit"] == 512
+    mock_webserver.apply_transfer_limits.assert_called_once()
+
+
+@pytest.mark.asyncio
+async def test_save_transfer_limits_accepts_whole_floats(plugin, memory_settings):
+    await plugin.save_transfer_limits(1024.0, 0)
+
+    assert memory_settings[main.server.TRANSFER_LIMIT_FIELD] == 1024
+    assert type(memory_settings[main.server.TRANSFER_LIMIT_FIELD]) is int
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("limit", ["fast", None, -1, True, 0.5, float("inf")])
+async def test_save_transfer_limits_rejects_invalid(plugin, memory_settings, limit):
+    with pytest.raises(main.InvalidArgumentException):
+        await plugin.save_transfer_limits(limit, 0)
+
+    assert memory_settings == {}
+
+
+@pytest.mark.asyncio
+async def test_set_gaming_mode(plugin, mock_webserver, memory_settings):
+    plugin.web_server = mock_webserver
+
+    await plugin.set_gaming_mode(True)
+    assert (await plugin.get_transfer_limits())["data"]["gamingMode"] is True
+
+    await plugin.set_gaming_mode(False)
+    assert (await plugin.get_transfer_limits())["data"]["gamingMode"] is False
+    assert mock_webserver.apply_transfer_limits.call_count == 2
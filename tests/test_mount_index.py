@@ -0,0 +1,120 @@
+import os
+from pathlib import Path
+
+from filesystem import MountIndex, get_drive_root, parse_mountinfo
+
+MOUNTINFO = "\n".join([
+    "23 28 0:22 / /proc rw,relatime - proc proc rw",
+    "28 1 259:2 / / rw,relatime - ext4 /dev/nvme0n1p2 rw",
+    "40 28 259:8 / /home rw,relatime - ext4 /dev/nvme0n1p8 rw",
+    "41 28 0:30 / /tmp rw,relatime - tmpfs tmpfs rw",
+    "42 28 179:1 / /run/media/deck/SD\\040Card rw,relatime shared:1 - ext4 /dev/mmcblk0p1 rw",
+    "43 28 0:40 / /run/media/deck/SD\\040Card/cache rw - tmpfs tmpfs rw",
+])
+
+
+def write_mountinfo(tmp_path: Path, content: str) -> Path:
+    mountinfo = tmp_path / "mountinfo"
+    mountinfo.write_text(content)
+    return mountinfo
+
+
+def test_parse_mountinfo():
+    entries = {e.mount_point: e for e in parse_mountinfo(MOUNTINFO, _show_only_accessible=False)}
+
+    assert entries["/"].is_external is False
+    assert entries["/tmp"].is_external is False
+    assert entries["/home"].is_external is True
+    assert entries["/home"].device == os.makedev(259, 8)
+
+    # Octal escapes are decoded
+    sd = entries["/run/media/deck/SD Card"]
+    assert sd.is_external is True
+    assert sd.fstype == "ext4"
+    assert sd.source == "/dev/mmcblk0p1"
+
+
+def test_parse_mountinfo_skips_bind_and_loop_mounts():
+    entries = {e.mount_point: e for e in parse_mountinfo("\n".join([
+        "28 1 259:2 / / rw,relatime - ext4 /dev/nvme0n1p2 rw",
+        "40 28 259:8 / /home rw,relatime - ext4 /dev/nvme0n1p8 rw",
+        # SteamOS binds parts of /home onto the root filesystem
+        "44 28 259:8 /.steamos/offload/opt /opt rw,relatime - ext4 /dev/nvme0n1p8 rw",
+        "45 28 259:8 /.steamos/offload/var/log /var/log rw,relatime - ext4 /dev/nvme0n1p8 rw",
+        "46 28 7:0 / /snap/core/1 ro,relatime - squashfs /dev/loop0 ro",
+    ]), _show_only_accessible=False)}
+
+    assert entries["/home"].is_external is True
+    assert entries["/opt"].is_external is False
+    assert entries["/var/log"].is_external is False
+    assert entries["/snap/core/1"].is_external is False
+
+
+def test_find_mount_longest_prefix(tmp_path, monkeypatch):
+    monkeypatch.setattr("filesystem.os.access", lambda *_: True)
+    index = MountIndex(str(write_mountinfo(tmp_path, MOUNTINFO)), str(tmp_path / "missing"))
+
+    assert index.find_mount("/etc/passwd").mount_point == "/"
+    assert index.find_mount("/home/deck/Videos").mount_point == "/home"
+    assert index.find_mount("/run/media/deck/SD Card/roms").mount_point == "/run/media/deck/SD Card"
+
+
+def test_is_external(tmp_path, monkeypatch):
+    monkeypatch.setattr("filesystem.os.access", lambda *_: True)
+    index = MountIndex(str(write_mountinfo(tmp_path, MOUNTINFO)), str(tmp_path / "missing"))
+
+    assert index.is_external("/etc/passwd") is False
+    assert index.is_external("/tmp/file") is False
+    assert index.is_external("/home/deck") is True
+    # Non-block mounts nested in an external drive are still external
+    assert index.is_external("/run/media/deck/SD Card/cache/x") is True
+
+
+def test_index_without_change_notification_rereads_table(tmp_path, monkeypatch):
+    monkeypatch.setattr("filesystem.os.access", lambda *_: True)
+    mountinfo = write_mountinfo(tmp_path, MOUNTINFO)
+    index = MountIndex(str(mountinfo), str(tmp_path / "missing"))
+
+    assert index.is_external("/srv/games") is False
+
+    mountinfo.write_text(MOUNTINFO + "\n50 28 8:1 / /srv/games rw - ext4 /dev/sda1 rw")
+
+    assert index.is_external("/srv/games") is True
+
+
+def test_index_is_cached_until_mount_table_changes(tmp_path):
+    index = MountIndex(str(write_mountinfo(tmp_path, MOUNTINFO)))
+
+    index.find_mount("/")
+    index.find_mount("/home")
+    index.find_mount("/tmp")
+
+    assert index.reload_count == 1
+    index.close()
+
+
+def test_drive_root_by_device(tmp_path, monkeypatch):
+    monkeypatch.setattr("filesystem.os.access", lambda *_: True)
+    index = MountIndex(str(write_mountinfo(tmp_path, MOUNTINFO)), str(tmp_path / "missing"))
+
+    class FakeStat:
+        st_dev = os.makedev(179, 1)
+
+    monkeypatch.setattr("filesystem.os.stat", lambda _: FakeStat())
+
+    assert index.drive_root("/run/media/deck/SD Card/roms/game.iso") == "/run/media/deck/SD Card"
+
+
+def test_drive_root_falls_back_to_longest_prefix(tmp_path, monkeypatch):
+    monkeypatch.setattr("filesystem.os.access", lambda *_: True)
+    index = MountIndex(str(write_mountinfo(tmp_path, MOUNTINFO)), str(tmp_path / "missing"))
+
+    # Missing paths and unknown devices still resolve to the containing mount
+    assert index.drive_root("/home/deck/does-not-exist") == "/home"
+
+
+def test_get_drive_root_of_real_path(tmp_path):
+    root = get_drive_root(tmp_path)
+
+    assert root.is_absolute()
+    assert tmp_path.resolve().is_relative_to(root)
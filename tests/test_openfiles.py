@@ -0,0 +1,100 @@
+import os
+import pytest
+
+from filesystem import NotAFileError
+from openfiles import OpenFileCache
+
+
+def read_all(handle) -> bytes:
+    return os.pread(handle.file.fileno(), handle.st.st_size, 0)
+
+
+def test_open_file_is_cached(fs):
+    fs.create_file("clip.mp4", b"frames")
+
+    first = fs.open_file("clip.mp4")
+    first.release()
+    second = fs.open_file("clip.mp4")
+
+    assert second is first
+    assert second.mime == "video/mp4"
+    assert read_all(second) == b"frames"
+    assert fs.open_files.stats()["hits"] == 1
+    second.release()
+
+
+def test_open_file_sees_in_place_writes(fs, tmp_path):
+    fs.create_file("clip.mp4", b"frames")
+    fs.open_file("clip.mp4").release()
+
+    with open(tmp_path / "clip.mp4", "ab") as f:
+        f.write(b" and more")
+
+    handle = fs.open_file("clip.mp4")
+    assert handle.st.st_size == len(b"frames and more")
+    handle.release()
+
+
+def test_open_file_invalidated_on_writes(fs):
+    fs.create_file("clip.mp4", b"old")
+    old = fs.open_file("clip.mp4")
+    old.release()
+
+    fs.delete_file("clip.mp4")
+    assert old.file.closed
+
+    fs.create_file("clip.mp4", b"new")
+    new = fs.open_file("clip.mp4")
+    assert new is not old
+    assert read_all(new) == b"new"
+    new.release()
+
+
+def test_open_file_rejects_directories(fs):
+    fs.create_dir("dir")
+    with pytest.raises(NotAFileError):
+        fs.open_file("dir")
+
+
+def test_open_file_missing(fs):
+    with pytest.raises(FileNotFoundError):
+        fs.open_file("missing.mp4")
+
+
+def test_evicted_file_closes_after_last_release(fs):
+    fs.open_files = OpenFileCache(max_files=1)
+    fs.create_file("a.mp4", b"a")
+    fs.create_file("b.mp4", b"b")
+
+    a = fs.open_file("a.mp4")
+    b = fs.open_file("b.mp4")
+
+    # Evicted while still being served
+    assert not a.file.closed
+    assert read_all(a) == b"a"
+    a.release()
+    assert a.file.closed
+
+    b.release()
+    assert not b.file.closed
+
+
+def test_expired_file_is_reopened(fs):
+    fs.open_files = OpenFileCache(ttl=0)
+    fs.create_file("clip.mp4", b"frames")
+
+    first = fs.open_file("clip.mp4")
+    first.release()
+    second = fs.open_file("clip.mp4")
+
+    assert second is not first
+    assert first.file.closed
+    second.release()
+
+
+def test_will_need_past_the_end(fs):
+    fs.create_file("clip.mp4", b"frames")
+    handle = fs.open_file("clip.mp4")
+    handle.will_need(0, 1024 * 1024)
+    handle.will_need(100, 1024)
+    handle.release()
@@ -0,0 +1,59 @@
+import io
+import os
+import zipfile
+import zlib
+
+from parallelzip import ParallelZipWriter, crc32_combine
+
+TEXT = b"[Settings]\nResolution=1280x800\nVSync=true\n"
+
+
+def test_crc32_combine():
+    a = os.urandom(1000)
+    b = os.urandom(3 * 1024 * 1024 + 7)
+
+    assert crc32_combine(zlib.crc32(a), zlib.crc32(b), len(b)) == zlib.crc32(a + b)
+    assert crc32_combine(zlib.crc32(a), zlib.crc32(b""), 0) == zlib.crc32(a)
+
+
+def test_parallel_zip_matches_input(tmp_path):
+    files = {
+        "saves/slot1.sav": TEXT * 50_000 + os.urandom(1000),  # several chunks
+        "saves/slot2.sav": TEXT * 10,
+        "saves/empty.sav": b"",
+        "shots/shot.png": b"\x89PNG\r\n\x1a\n" + os.urandom(200_000),  # stored
+        "saves/noise.bin": os.urandom(300_000),  # stored after the probe
+    }
+    for name, data in files.items():
+        path = tmp_path / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(data)
+
+    writer = ParallelZipWriter(workers=2, max_inflight=256 * 1024, chunk_size=128 * 1024)
+    chunks = list(writer.write((tmp_path / name, name) for name in files))
+
+    with zipfile.ZipFile(io.BytesIO(b"".join(chunks))) as z:
+        assert z.testzip() is None
+        assert z.namelist() == list(files)  # in order
+        for name, data in files.items():
+            assert z.read(name) == data
+        assert z.getinfo("saves/slot1.sav").compress_type == zipfile.ZIP_DEFLATED
+        assert z.getinfo("shots/shot.png").compress_type == zipfile.ZIP_STORED
+
+
+def test_parallel_zip_skips_missing_files(tmp_path):
+    (tmp_path / "a.txt").write_bytes(TEXT * 100)
+
+    chunks = ParallelZipWriter(workers=2).write([(tmp_path / "gone.txt", "gone.txt"), (tmp_path / "a.txt", "a.txt")])
+
+    with zipfile.ZipFile(io.BytesIO(b"".join(chunks))) as z:
+        assert z.namelist() == ["a.txt"]
+
+
+def test_stream_zip_with_workers(fs):
+    fs.create_file("saves/a.sav", TEXT * 1000)
+    fs.create_file("saves/b.sav", TEXT * 2000)
+
+    with zipfile.ZipFile(io.BytesIO(b"".join(fs.stream_zip(["saves"], workers=2)))) as z:
+        assert sorted(z.namelist()) == ["saves/a.sav", "saves/b.sav"]
+        assert z.read("saves/b.sav") == TEXT * 2000
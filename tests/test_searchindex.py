@@ -0,0 +1,159 @@
+import os
+import shutil
+import time
+import pytest
+from pathlib import Path
+
+from searchindex import SearchIndex, normalize_roots
+
+
+@pytest.fixture
+def root(tmp_path: Path) -> Path:
+    root = tmp_path / "sdcard"
+    (root / "Emulation/roms/gc").mkdir(parents=True)
+    (root / "Emulation/roms/gc/Zelda Wind Waker.ISO").write_bytes(b"")
+    (root / "Emulation/roms/gc/metroid_prime.rvz").write_bytes(b"")
+    (root / "notes.txt").write_bytes(b"")
+    return root
+
+
+@pytest.fixture
+def index(tmp_path: Path, root: Path):
+    index = SearchIndex(tmp_path / "index/search_index.sqlite3", lambda: [root])
+    index.index_all()
+    yield index
+    index.close()
+
+
+def names(rows) -> set[str]:
+    return {name for _parent, name, _is_dir in rows}
+
+
+def test_substring_is_case_insensitive(index):
+    assert names(index.search("wind wak")) == {"Zelda Wind Waker.ISO"}
+    assert names(index.search("ROM")) == {"roms"}
+
+
+def test_short_substring_matches_prefix(index):
+    assert names(index.search("no")) == {"notes.txt"}
+    assert names(index.search("es")) == set()
+
+
+def test_prefix(index):
+    assert names(index.search("emu", mode="prefix")) == {"Emulation"}
+    assert names(index.search("ulation", mode="prefix")) == set()
+
+
+def test_extension(index):
+    assert names(index.search("iso", mode="extension")) == {"Zelda Wind Waker.ISO"}
+    assert names(index.search("", extension=".rvz")) == {"metroid_prime.rvz"}
+    assert names(index.search("zelda", extension=".rvz")) == set()
+    assert names(index.search("prime", extension="RVZ")) == {"metroid_prime.rvz"}
+
+
+def test_search_under_directory(index, root):
+    assert names(index.search("zel", under=str(root / "Emulation"))) == {"Zelda Wind Waker.ISO"}
+    assert names(index.search("roms", under=str(root / "Emulation/roms"))) == set()
+
+
+def test_invalid_mode(index):
+    with pytest.raises(ValueError):
+        index.search("x", mode="regex")
+
+
+def test_update_dirs_tracks_changes(index, root):
+    (root / "notes.txt").unlink()
+    (root / "saves/psp").mkdir(parents=True)
+    (root / "saves/psp/SLOT1.bin").write_bytes(b"")
+
+    index.update_dirs([str(root)])
+
+    assert names(index.search("notes")) == set()
+    assert names(index.search("slot1")) == {"SLOT1.bin"}
+
+
+def test_full_pass_skips_unchanged_and_purges_removed(index, root):
+    shutil.rmtree(root / "Emulation")
+    index.index_all()
+
+    assert names(index.search("zelda")) == set()
+    assert index.stats()["directories"] == 1
+
+
+def test_mount_points_are_not_walked(tmp_path, root, monkeypatch):
+    mount = root / "media"
+    (mount / "usb").mkdir(parents=True)
+    (mount / "usb/backup.iso").write_bytes(b"")
+
+    real_stat = os.stat
+
+    def stat(path, *args, **kwargs):
+        st = real_stat(path, *args, **kwargs)
+        if os.fspath(path) == str(mount):
+            # Another filesystem mounted on "media"
+            return os.stat_result((st.st_mode, st.st_ino, st.st_dev + 1) + tuple(st)[3:])
+        return st
+
+    monkeypatch.setattr("searchindex.os.stat", stat)
+    index = SearchIndex(tmp_path / "index/search_index.sqlite3", lambda: [root])
+    try:
+        index.index_all()
+        assert names(index.search("media")) == {"media"}
+        assert names(index.search("backup")) == set()
+
+        # A second full pass lists "media" from the index, and still does not walk it
+        index.index_all()
+        assert names(index.search("backup")) == set()
+    finally:
+        index.close()
+
+
+def test_removed_roots_are_purged(tmp_path, root):
+    roots = [root]
+    index = SearchIndex(tmp_path / "index.sqlite3", lambda: roots)
+    try:
+        index.index_all()
+        assert names(index.search("notes"))
+
+        roots.clear()
+        index.index_all()
+        assert names(index.search("notes")) == set()
+        assert index.stats()["roots"] == []
+    finally:
+        index.close()
+
+
+def test_index_is_persistent(tmp_path, root):
+    db = tmp_path / "index.sqlite3"
+
+    first = SearchIndex(db, lambda: [root])
+    first.index_all()
+    first.close()
+
+    second = SearchIndex(db, lambda: [root])
+    try:
+        assert names(second.search("zelda")) == {"Zelda Wind Waker.ISO"}
+    finally:
+        second.close()
+
+
+def test_background_thread_follows_inotify(tmp_path, root):
+    index = SearchIndex(tmp_path / "index.sqlite3", lambda: [root])
+    index.start()
+    try:
+        deadline = time.monotonic() + 5
+        while not index.ready and time.monotonic() < deadline:
+            time.sleep(0.05)
+        assert index.ready
+
+        (root / "Emulation/roms/gc/Pikmin.iso").write_bytes(b"")
+
+        while not index.search("pikmin") and time.monotonic() < deadline:
+            time.sleep(0.05)
+        assert names(index.search("pikmin")) == {"Pikmin.iso"}
+    finally:
+        index.close()
+
+
+def test_normalize_roots(tmp_path, root):
+    assert normalize_roots(["/", root / "Emulation", root, tmp_path / "missing"]) == [str(root)]
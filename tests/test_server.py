@@ -1,3 +1,7 @@
+import io
+import json
+import tarfile
+import zipfile
 import pytest
 import pytest_asyncio
 from pathlib import Path
@@ -6,6 +10,8 @@ from aiohttp.test_utils import TestClient
 
 from filesystem import FileSystemService
 from server import WebServer, AUTH_COOKIE
+from tarstream import zstd_available
+import filesend
 
 # ------------------------
 # FIXTURES
@@ -20,9 +26,9 @@ def fs(tmp_path: Path):
 
 
 @pytest_asyncio.fixture
-async def client(aiohttp_client, fs, tmp_path, monkeypatch):
+async def client(aiohttp_client, fs, tmp_path, tmp_path_factory, monkeypatch):
     """
-    WebServer instance using temp filesystem and temp webui dir
+    WebServer instance using temp filesystem, temp webui dir and temp caches
     """
     webui = tmp_path / "webui"
     webui.mkdir()
@@ -33,6 +39,12 @@ async def client(aiohttp_client, fs, tmp_path, monkeypatch):
         webui
     )
 
+    # Outside the served tree, so the search index does not list its own database
+    settings = tmp_path_factory.mktemp("settings")
+    monkeypatch.setattr("server.DIR_SIZE_CACHE_FILE", settings / "dir_sizes.sqlite3")
+    monkeypatch.setattr("server.SEARCH_INDEX_FILE", settings / "search_index.sqlite3")
+    monkeypatch.setattr("server.HASH_CACHE_FILE", settings / "file_hashes.sqlite3")
+
     server = WebServer(
         fs=fs,
         host="127.0.0.1",
@@ -133,6 +145,208 @@ async def test_list_dir(client, fs):
 
     assert data["selectedDir"]["isDir"] is True
     assert len(data["dirContent"]) == 1
+    assert data["selectedDir"]["itemsCount"] == 1
+
+
+@pytest.mark.asyncio
+async def test_list_dir_lazy_counts(client, fs):
+    await login(client)
+
+    fs.create_file("docs/sub/file.txt", b"hello")
+
+    res = await client.post(
+        "/api/dir/list",
+        json={"path": "docs", "lazyCounts": True},
+    )
+    assert res.status == 200
+    data = await res.json()
+    (entry,) = data["dirContent"]
+    assert entry["itemsCount"] is None
+    # The listed directory is not counted on every page either
+    assert data["selectedDir"]["itemsCount"] is None
+
+    res = await client.post(
+        "/api/dir/counts",
+        json={"paths": [entry["path"]]},
+    )
+    assert res.status == 200
+    (count,) = (await res.json())["counts"]
+    assert count["itemsCount"] == 1
+    assert count["complete"] is True
+
+
+@pytest.mark.asyncio
+async def test_list_dir_columnar(client, fs):
+    await login(client)
+
+    fs.create_file("docs/b.txt", b"hello")
+    fs.create_file("docs/a.png", b"x")
+
+    res = await client.post(
+        "/api/dir/list",
+        json={"path": "docs", "format": "columnar", "limit": 10},
+    )
+    assert res.status == 200
+    data = await res.json()
+    assert data["format"] == "columnar"
+
+    columns = data["dirContent"]
+    assert columns["names"] == ["a.png", "b.txt"]
+    assert columns["sizes"] == [1, 5]
+    assert [columns["typeNames"][t] for t in columns["types"]] == ["image", "text"]
+    assert data["total"] == 2
+
+    res = await client.post(
+        "/api/dir/list",
+        json={"path": "docs", "format": "xml"},
+    )
+    assert res.status == 400
+
+
+@pytest.mark.asyncio
+async def test_dir_size(client, fs):
+    await login(client)
+
+    fs.create_file("games/a/save.dat", b"x" * 10)
+    fs.create_file("games/b.txt", b"x" * 5)
+
+    res = await client.post("/api/dir/size", json={"path": "games"})
+    assert res.status == 200
+    assert res.headers["Content-Type"] == "application/x-ndjson"
+
+    events = [json.loads(line) for line in (await res.text()).splitlines()]
+    end = events[-1]
+    assert end["event"] == "end"
+    assert end["size"] == 15
+    assert end["children"] == {"a": 10}
+
+    res = await client.post("/api/dir/size", json={"path": "games/b.txt"})
+    assert res.status == 400
+
+
+@pytest.mark.asyncio
+async def test_search(client, fs):
+    await login(client)
+
+    fs.create_file("games/zelda.iso", b"x")
+    fs.create_file("games/zelda-notes.txt", b"x")
+
+    index = client.app["server"].search_index
+    index.roots_provider = lambda: [fs.base_dir]
+    index.index_all()
+
+    # Removed since indexing: skipped
+    (fs.base_dir / "games/zelda-notes.txt").unlink()
+
+    res = await client.post("/api/search", json={"query": "zelda"})
+    assert res.status == 200
+    data = await res.json()
+    assert [r["name"] for r in data["results"]] == ["zelda.iso"]
+    assert data["results"][0]["size"] == 1
+    assert data["ready"] is True
+
+    res = await client.post("/api/search", json={"query": "zelda", "mode": "fuzzy"})
+    assert res.status == 400
+
+    index.close()
+
+
+@pytest.mark.asyncio
+async def test_grep(client, fs):
+    await login(client)
+
+    fs.create_file("pfx/user.reg", b'"Version"="win10"\n')
+    fs.create_file("pfx/system.reg", b"nothing here\n")
+
+    res = await client.post("/api/dir/grep", json={"path": "pfx", "pattern": "version", "ignoreCase": True})
+    assert res.status == 200
+    assert res.headers["Content-Type"] == "application/x-ndjson"
+
+    *events, end = [json.loads(line) for line in (await res.text()).splitlines()]
+    assert [e["path"].endswith("user.reg") for e in events] == [True]
+    assert events[0]["matches"] == [{"line": 1, "text": '"Version"="win10"'}]
+    assert end["files"] == 2
+
+    res = await client.post("/api/dir/grep", json={"path": "pfx", "pattern": "(", "regex": True})
+    assert res.status == 400
+
+
+@pytest.mark.asyncio
+async def test_find_duplicates(client, fs):
+    await login(client)
+
+    fs.create_file("clips/a.mp4", b"same video")
+    fs.create_file("clips/old/a.mp4", b"same video")
+    fs.create_file("clips/b.mp4", b"other clip")
+
+    res = await client.post("/api/dir/duplicates", json={"path": "clips"})
+    assert res.status == 200
+
+    events = [json.loads(line) for line in (await res.text()).splitlines()]
+    (group,) = [e for e in events if e["event"] == "group"]
+    assert len(group["paths"]) == 2
+    assert group["reclaimable"] == 10
+    assert events[-1]["reclaimable"] == 10
+
+
+@pytest.mark.asyncio
+async def test_list_dir_paginated(client, fs):
+    await login(client)
+
+    for name in ["c.txt", "a.txt", "b.txt", ".hidden"]:
+        fs.create_file(f"docs/{name}", b"x")
+
+    res = await client.post(
+        "/api/dir/list",
+        json={"path": "docs", "limit": 2, "showHidden": False},
+    )
+    assert res.status == 200
+    data = await res.json()
+    assert [e["name"] for e in data["dirContent"]] == ["a.txt", "b.txt"]
+    assert data["total"] == 3
+
+    res = await client.post(
+        "/api/dir/list",
+        json={"path": "docs", "limit": 2, "showHidden": False, "cursor": data["nextCursor"]},
+    )
+    data = await res.json()
+    assert [e["name"] for e in data["dirContent"]] == ["c.txt"]
+    assert data["nextCursor"] is None
+
+
+@pytest.mark.asyncio
+async def test_list_dir_stream(client, fs):
+    await login(client)
+
+    fs.create_file("docs/a.txt", b"hello")
+    fs.create_dir("docs/sub")
+
+    res = await client.post(
+        "/api/dir/list",
+        json={"path": "docs", "stream": True},
+    )
+    assert res.status == 200
+    assert res.headers["Content-Type"] == "application/x-ndjson"
+
+    lines = [json.loads(line) for line in (await res.text()).splitlines()]
+    events = [line["event"] for line in lines]
+
+    assert events == ["dir", "entries", "meta", "end"]
+    assert lines[0]["selectedDir"]["isDir"] is True
+    assert {i["name"] for i in lines[1]["items"]} == {"a.txt", "sub"}
+    assert lines[-1]["total"] == 2
+
+
+@pytest.mark.asyncio
+async def test_list_dir_stream_invalid(client):
+    await login(client)
+
+    res = await client.post(
+        "/api/dir/list",
+        json={"path": "missing", "stream": True},
+    )
+
+    assert res.status == 400
 
 
 @pytest.mark.asyncio
@@ -147,6 +361,32 @@ async def test_list_dir_invalid(client):
     assert res.status == 400
 
 
+@pytest.mark.asyncio
+async def test_watch_dir(client, fs):
+    await login(client)
+
+    fs.create_dir("docs")
+
+    async with client.ws_connect("/api/dir/watch") as ws:
+        await ws.send_json({"action": "watch", "path": "docs"})
+        assert (await ws.receive_json(timeout=5))["type"] == "watching"
+
+        (fs.base_dir / "docs" / "new.txt").write_text("x")
+
+        delta = await ws.receive_json(timeout=5)
+        assert delta["type"] == "delta"
+        assert [e["name"] for e in delta["added"]] == ["new.txt"]
+
+
+@pytest.mark.asyncio
+async def test_watch_dir_forbidden_path(client):
+    await login(client)
+
+    async with client.ws_connect("/api/dir/watch") as ws:
+        await ws.send_json({"action": "watch", "path": "/etc"})
+        assert (await ws.receive_json(timeout=5))["type"] == "error"
+
+
 # ------------------------
 # CREATE / DELETE
 # ------------------------
@@ -359,6 +599,46 @@ async def test_download_single_file(client, fs):
     assert await res.read() == b"download"
 
 
+@pytest.mark.asyncio
+@pytest.mark.parametrize("nosendfile", [False, True])
+async def test_download_single_file_send_paths(client, fs, monkeypatch, nosendfile):
+    # sendfile(2) on the plain test connection, and the copy loop used under TLS
+    monkeypatch.setattr(filesend, "NOSENDFILE", nosendfile)
+    await login(client)
+
+    content = bytes(range(256)) * 4096
+    fs.create_file("rom.bin", content)
+
+    res = await client.post("/api/dir/download", json={"paths": ["rom.bin"]})
+    assert res.status == 200
+    assert int(res.headers["Content-Length"]) == len(content)
+    assert await res.read() == content
+
+    res = await client.get("/api/file/view?path=rom.bin", headers={"Range": "bytes=1000-300000"})
+    assert res.status == 206
+    assert await res.read() == content[1000:300001]
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("nosendfile", [False, True])
+async def test_download_with_transfer_limit(client, fs, monkeypatch, nosendfile):
+    # Sliced sendfile and the throttled copy loop still send every byte
+    monkeypatch.setattr(filesend, "NOSENDFILE", nosendfile)
+    await login(client)
+    client.server.app["server"].qos.set_limits(64 * 1024 * 1024, 32 * 1024 * 1024)
+
+    content = bytes(range(256)) * 4096
+    fs.create_file("rom.bin", content)
+
+    res = await client.post("/api/dir/download", json={"paths": ["rom.bin"]})
+    assert res.status == 200
+    assert await res.read() == content
+
+    stats = await (await client.get("/api/stats")).json()
+    assert stats["transferQos"]["globalRate"] == 64 * 1024 * 1024
+    assert stats["transferQos"]["transfers"] == 0
+
+
 @pytest.mark.asyncio
 async def test_download_missing_paths(client):
     await login(client)
@@ -382,6 +662,172 @@ async def test_download_zip(client, fs):
     assert res.status == 200
     assert res.headers["Content-Type"] == "application/zip"
 
+    with zipfile.ZipFile(io.BytesIO(await res.read())) as z:
+        assert sorted(z.namelist()) == ["a.txt", "b.txt"]
+        assert z.read("b.txt") == b"b"
+
+
+@pytest.mark.asyncio
+async def test_download_tar(client, fs):
+    await login(client)
+
+    fs.create_file("saves/a.sav", b"a" * 1000)
+    fs.create_file("saves/b.sav", b"b")
+
+    res = await client.post("/api/dir/download", json={"paths": ["saves"], "format": "tar"})
+    assert res.status == 200
+    assert res.headers["Content-Type"] == "application/x-tar"
+
+    data = await res.read()
+    assert int(res.headers["Content-Length"]) == len(data)
+    with tarfile.open(fileobj=io.BytesIO(data)) as tar:
+        assert tar.getnames() == ["saves", "saves/a.sav", "saves/b.sav"]
+
+    res = await client.post("/api/dir/download", json={"paths": ["saves"], "format": "rar"})
+    assert res.status == 400
+
+
+@pytest.mark.asyncio
+@pytest.mark.skipif(not zstd_available(), reason="zstd is not available")
+async def test_download_tar_zst(client, fs):
+    await login(client)
+
+    fs.create_file("saves/a.sav", b"a" * 100_000)
+
+    res = await client.post("/api/dir/download", json={"paths": ["saves"], "format": "tar.zst"})
+    assert res.status == 200
+    assert res.headers["Content-Type"] == "application/zstd"
+    assert (await res.read())[:4] == b"\x28\xb5\x2f\xfd"
+
+
+@pytest.mark.asyncio
+async def test_download_zip_compression(client, fs):
+    await login(client)
+
+    fs.create_file("a.txt", b"a" * 1000)
+    fs.create_file("b.txt", b"b" * 1000)
+
+    res = await client.post(
+        "/api/dir/download",
+        json={"paths": ["a.txt", "b.txt"], "compression": "smallest"},
+    )
+    assert res.status == 200
+    with zipfile.ZipFile(io.BytesIO(await res.read())) as z:
+        assert z.getinfo("a.txt").compress_type == zipfile.ZIP_DEFLATED
+
+    res = await client.post(
+        "/api/dir/download",
+        json={"paths": ["a.txt", "b.txt"], "compression": "ultra"},
+    )
+    assert res.status == 400
+
+
+@pytest.mark.asyncio
+async def test_download_store_zip_resumes_with_range(client, fs):
+    await login(client)
+
+    fs.create_file("saves/a.sav", b"a" * 100_000)
+    fs.create_file("saves/b.sav", b"b" * 1000)
+    body = {"paths": ["saves"], "compression": "store"}
+
+    res = await client.post("/api/dir/download", json=body)
+    assert res.status == 200
+    assert res.headers["Accept-Ranges"] == "bytes"
+    full = await res.read()
+    assert int(res.headers["Content-Length"]) == len(full)
+    etag = res.headers["ETag"]
+
+    res = await client.post("/api/dir/download", json=body, headers={"Range": "bytes=5000-", "If-Range": etag})
+    assert res.status == 206
+    assert res.headers["Content-Range"] == f"bytes 5000-{len(full) - 1}/{len(full)}"
+    assert await res.read() == full[5000:]
+
+    res = await client.post("/api/dir/download", json=body, headers={"Range": "bytes=-22"})
+    assert res.status == 206
+    assert await res.read() == full[-22:]
+
+    res = await client.post("/api/dir/download", json=body, headers={"Range": f"bytes={len(full)}-"})
+    assert res.status == 416
+    assert res.headers["Content-Range"] == f"bytes */{len(full)}"
+
+
+@pytest.mark.asyncio
+async def test_download_link_resumes_with_get(client, fs):
+    await login(client)
+
+    fs.create_file("saves/a.sav", b"a" * 100_000)
+    fs.create_file("saves/b.sav", b"b" * 1000)
+
+    res = await client.post("/api/dir/download/link", json={"paths": ["saves"], "format": "tar"})
+    assert res.status == 200
+    url = (await res.json())["url"]
+
+    res = await client.get(url)
+    assert res.status == 200
+    assert res.headers["Content-Disposition"] == 'attachment; filename="download.tar"'
+    full = await res.read()
+    etag = res.headers["ETag"]
+
+    # A download manager resumes without the session cookie
+    client.session.cookie_jar.clear()
+    res = await client.get(url, headers={"Range": "bytes=70000-", "If-Range": etag})
+    assert res.status == 206
+    assert await res.read() == full[70000:]
+
+
+@pytest.mark.asyncio
+async def test_download_link_single_file_ranges(client, fs):
+    await login(client)
+
+    content = bytes(range(256)) * 1024
+    fs.create_file("rom.bin", content)
+
+    res = await client.post("/api/dir/download/link", json={"paths": ["rom.bin"]})
+    url = (await res.json())["url"]
+
+    res = await client.get(url, headers={"Range": "bytes=1000-"})
+    assert res.status == 206
+    assert res.headers["Content-Range"] == f"bytes 1000-{len(content) - 1}/{len(content)}"
+    assert await res.read() == content[1000:]
+
+    res = await client.get(url)
+    assert res.headers["Content-Disposition"] == 'attachment; filename="rom.bin"'
+    assert await res.read() == content
+
+
+@pytest.mark.asyncio
+async def test_download_link_validation(client):
+    await login(client)
+
+    res = await client.post("/api/dir/download/link", json={"paths": ["a"], "format": "rar"})
+    assert res.status == 400
+
+    res = await client.get("/api/download/unknown")
+    assert res.status == 404
+
+
+@pytest.mark.asyncio
+async def test_download_layout_detects_changed_files(client, fs):
+    await login(client)
+
+    fs.create_file("saves/a.sav", b"a" * 1000)
+    body = {"paths": ["saves"], "format": "tar"}
+
+    res = await client.post("/api/dir/download", json=body)
+    etag = res.headers["ETag"]
+    await res.read()
+
+    fs.create_file("saves/a.sav", b"changed")
+
+    # A stale If-Range gets the whole new archive
+    res = await client.post("/api/dir/download", json=body, headers={"Range": "bytes=512-", "If-Range": etag})
+    assert res.status == 200
+    assert res.headers["ETag"] != etag
+    await res.read()
+
+    res = await client.post("/api/dir/download", json={**body, "snapshot": etag.strip('"')})
+    assert res.status == 412
+
 
 # ------------------------
 # VIEW FILE + RANGE
@@ -440,6 +886,73 @@ async def test_view_file_range_out_of_bounds(client, fs):
     )
 
     assert res.status == 416
+    assert res.headers["Content-Range"] == "bytes */3"
+
+
+@pytest.mark.asyncio
+async def test_view_file_conditional_requests(client, fs):
+    await login(client)
+
+    fs.create_file("clip.mp4", b"0123456789")
+
+    res = await client.get("/api/file/view?path=clip.mp4")
+    assert res.status == 200
+    etag = res.headers["ETag"]
+    last_modified = res.headers["Last-Modified"]
+    await res.read()
+
+    res = await client.get("/api/file/view?path=clip.mp4", headers={"If-None-Match": etag})
+    assert res.status == 304
+    assert res.headers["ETag"] == etag
+
+    res = await client.get("/api/file/view?path=clip.mp4", headers={"If-Modified-Since": last_modified})
+    assert res.status == 304
+
+    res = await client.get("/api/file/view?path=clip.mp4", headers={"If-None-Match": '"other"'})
+    assert res.status == 200
+
+    # If-Range: the range only while the file is unchanged
+    res = await client.get("/api/file/view?path=clip.mp4", headers={"Range": "bytes=-3", "If-Range": etag})
+    assert res.status == 206
+    assert await res.read() == b"789"
+
+    res = await client.get("/api/file/view?path=clip.mp4", headers={"Range": "bytes=-3", "If-Range": '"other"'})
+    assert res.status == 200
+    assert await res.read() == b"0123456789"
+
+
+@pytest.mark.asyncio
+async def test_view_file_reuses_open_file(client, fs):
+    await login(client)
+
+    fs.create_file("clip.mp4", b"0123456789")
+
+    for start in (0, 4, 8):
+        res = await client.get("/api/file/view?path=clip.mp4", headers={"Range": f"bytes={start}-"})
+        assert await res.read() == b"0123456789"[start:]
+
+    stats = await (await client.get("/api/stats")).json()
+    assert stats["openFiles"]["misses"] == 1
+    assert stats["openFiles"]["hits"] == 2
+
+
+@pytest.mark.asyncio
+async def test_view_file_multiple_ranges(client, fs):
+    await login(client)
+
+    fs.create_file("clip.mp4", b"0123456789")
+
+    res = await client.get("/api/file/view?path=clip.mp4", headers={"Range": "bytes=0-1,-2"})
+    assert res.status == 206
+    content_type = res.headers["Content-Type"]
+    assert content_type.startswith("multipart/byteranges; boundary=")
+    boundary = content_type.split("boundary=")[1]
+
+    body = await res.read()
+    assert int(res.headers["Content-Length"]) == len(body)
+    parts = body.split(f"--{boundary}".encode())[1:-1]
+    assert [part.split(b"\r\n\r\n", 1)[1].rstrip(b"\r\n") for part in parts] == [b"01", b"89"]
+    assert b"Content-Range: bytes 8-9/10" in parts[1]
 
 
 # ------------------------
@@ -0,0 +1,96 @@
+import io
+import os
+import subprocess
+import shutil
+import tarfile
+import pytest
+
+from tarstream import tar_members, tar_size, stream_tar, zstd_available, zstd_compress
+
+
+@pytest.fixture
+def prefix(fs, tmp_path):
+    fs.create_file("prefix/drive_c/users/steamuser/save.dat", b"save" * 1000)
+    fs.create_file("prefix/system.reg", b"WINE REGISTRY Version 2\n")
+    fs.create_dir("prefix/drive_c/empty")
+    os.chmod(tmp_path / "prefix/system.reg", 0o600)
+    os.symlink("drive_c", tmp_path / "prefix/dosdevices_c")
+    os.symlink("/outside/the/root", tmp_path / "prefix/link_out")
+    return tmp_path / "prefix"
+
+
+def read_tar(data: bytes) -> tarfile.TarFile:
+    return tarfile.open(fileobj=io.BytesIO(data), mode="r:")
+
+
+def test_stream_tar_keeps_modes_and_symlinks(fs, prefix):
+    size, chunks = fs.stream_tar(["prefix"])
+    data = b"".join(chunks)
+
+    assert len(data) == size
+    with read_tar(data) as tar:
+        members = {m.name: m for m in tar.getmembers()}
+        assert members["prefix/drive_c/empty"].isdir()
+        assert members["prefix/system.reg"].mode == 0o600
+        assert members["prefix/dosdevices_c"].issym()
+        assert members["prefix/dosdevices_c"].linkname == "drive_c"
+        assert members["prefix/link_out"].linkname == "/outside/the/root"
+        assert tar.extractfile("prefix/drive_c/users/steamuser/save.dat").read() == b"save" * 1000
+
+
+def test_tar_members_are_in_name_order(prefix):
+    names = [m.arcname for m in tar_members([prefix])]
+
+    assert names[:5] == ["prefix", "prefix/dosdevices_c", "prefix/drive_c", "prefix/link_out", "prefix/system.reg"]
+    assert names.index("prefix/drive_c/empty") < names.index("prefix/drive_c/users")
+
+
+def test_tar_size_holds_when_files_change(tmp_path):
+    (tmp_path / "grows.log").write_bytes(b"a" * 1000)
+    (tmp_path / "shrinks.log").write_bytes(b"b" * 1000)
+    (tmp_path / "gone.log").write_bytes(b"c" * 1000)
+    members = tar_members([tmp_path / "grows.log", tmp_path / "shrinks.log", tmp_path / "gone.log"])
+    size = tar_size(members)
+
+    (tmp_path / "grows.log").write_bytes(b"a" * 5000)
+    (tmp_path / "shrinks.log").write_bytes(b"b" * 10)
+    (tmp_path / "gone.log").unlink()
+    data = b"".join(stream_tar(members))
+
+    assert len(data) == size
+    with read_tar(data) as tar:
+        assert tar.extractfile("grows.log").read() == b"a" * 1000
+        assert tar.extractfile("shrinks.log").read() == b"b" * 10 + bytes(990)
+
+
+def test_long_and_unicode_names(tmp_path):
+    name = "ゲーム_" + "x" * 200 + ".sav"
+    (tmp_path / name).write_bytes(b"data")
+
+    data = b"".join(stream_tar(tar_members([tmp_path / name])))
+
+    with read_tar(data) as tar:
+        assert tar.extractfile(name).read() == b"data"
+
+
+@pytest.mark.skipif(not zstd_available(), reason="zstd is not available")
+def test_zstd_compress(tmp_path):
+    payload = [b"shader cache " * 10_000, b"", b"more" * 5000]
+
+    compressed = b"".join(zstd_compress(iter(payload), 3))
+
+    assert compressed[:4] == b"\x28\xb5\x2f\xfd"
+    if shutil.which("zstd"):
+        out = subprocess.run(["zstd", "-d", "-c"], input=compressed, capture_output=True, check=True).stdout
+        assert out == b"".join(payload)
+
+
+@pytest.mark.skipif(not zstd_available(), reason="zstd is not available")
+def test_zstd_cancel_stops_the_encoder():
+    def endless():
+        while True:
+            yield os.urandom(64 * 1024)
+
+    chunks = zstd_compress(endless(), 1)
+    next(chunks)
+    chunks.close()
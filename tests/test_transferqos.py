@@ -0,0 +1,115 @@
+import asyncio
+import time
+import pytest
+
+from transferqos import TokenBucket, TransferScheduler, THROTTLE_SLICE
+
+
+def test_token_bucket_unlimited_never_waits():
+    bucket = TokenBucket()
+    bucket.take(10 * 1024 * 1024)
+    assert bucket.delay() == 0
+
+
+def test_token_bucket_debt():
+    bucket = TokenBucket(1024 * 1024)
+    bucket.take(2 * 1024 * 1024)
+    # Two seconds of debt, less what refilled since
+    assert 1.5 < bucket.delay() <= 2
+
+
+@pytest.mark.asyncio
+async def test_unlimited_scheduler_does_not_wait():
+    scheduler = TransferScheduler()
+    assert not scheduler.limited
+
+    with scheduler.transfer("10.0.0.2", "download") as transfer:
+        await asyncio.wait_for(transfer.throttle(100 * 1024 * 1024), 0.1)
+        assert transfer.sent == 100 * 1024 * 1024
+
+
+@pytest.mark.asyncio
+async def test_global_rate_caps_throughput():
+    rate = 8 * 1024 * 1024
+    scheduler = TransferScheduler(global_rate=rate)
+
+    start = time.monotonic()
+    with scheduler.transfer("10.0.0.2", "download") as transfer:
+        for _ in range(8):
+            await transfer.throttle(THROTTLE_SLICE)
+    elapsed = time.monotonic() - start
+
+    # The first slice goes at once, the seven others wait for the bucket
+    assert elapsed >= 7 * THROTTLE_SLICE / rate * 0.9
+
+
+@pytest.mark.asyncio
+async def test_client_rate_is_per_client():
+    rate = 8 * 1024 * 1024
+    scheduler = TransferScheduler(client_rate=rate)
+
+    async def send(client: str):
+        with scheduler.transfer(client, "download") as transfer:
+            for _ in range(4):
+                await transfer.throttle(THROTTLE_SLICE)
+
+    start = time.monotonic()
+    await asyncio.gather(send("10.0.0.2"), send("10.0.0.3"))
+    elapsed = time.monotonic() - start
+
+    # Each client has its own bucket: two clients take as long as one
+    assert 3 * THROTTLE_SLICE / rate * 0.9 <= elapsed < 6 * THROTTLE_SLICE / rate
+    assert scheduler.stats()["clients"] == 0
+
+
+@pytest.mark.asyncio
+async def test_weighted_sharing():
+    scheduler = TransferScheduler(global_rate=16 * 1024 * 1024)
+    grants = []
+
+    async def send(kind: str):
+        with scheduler.transfer("10.0.0.2", kind) as transfer:
+            for _ in range(10):
+                await transfer.throttle(64 * 1024)
+                grants.append(kind)
+
+    await asyncio.gather(send("download"), send("view"))
+
+    # A preview weighs four downloads: it gets most of the first grants
+    assert grants[:10].count("view") >= 7
+    assert len(grants) == 20
+
+
+@pytest.mark.asyncio
+async def test_set_limits_releases_waiters():
+    scheduler = TransferScheduler(global_rate=1024)
+
+    with scheduler.transfer("10.0.0.2", "upload") as transfer:
+        await transfer.throttle(1024 * 1024)  # ~17 minutes of debt
+        waiter = asyncio.create_task(transfer.throttle(1024))
+        await asyncio.sleep(0.01)
+        assert scheduler.stats()["waiting"] == 1
+
+        scheduler.set_limits(0, 0)
+        await asyncio.wait_for(waiter, 1)
+
+    assert scheduler.stats() == {"globalRate": 0, "clientRate": 0, "transfers": 0, "clients": 0, "waiting": 0}
+
+
+@pytest.mark.asyncio
+async def test_cancelled_waiter_is_skipped():
+    scheduler = TransferScheduler(global_rate=1024)
+
+    with scheduler.transfer("10.0.0.2", "download") as first, scheduler.transfer("10.0.0.3", "download") as second:
+        await first.throttle(1024 * 1024)
+        cancelled = asyncio.create_task(first.throttle(1024))
+        await asyncio.sleep(0.01)
+        cancelled.cancel()
+
+        waiter = asyncio.create_task(second.throttle(1024))
+        await asyncio.sleep(0.01)
+        assert scheduler.stats()["waiting"] == 1
+
+        scheduler.set_limits(0, 0)
+        await asyncio.wait_for(waiter, 1)
+        assert cancelled.cancelled()
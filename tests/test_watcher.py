@@ -0,0 +1,106 @@
+import asyncio
+import pytest
+
+from watcher import ADDED, CHANGED, REMOVED, DirectoryWatcher, coalesce
+
+
+def test_coalesce():
+    assert coalesce(ADDED, CHANGED) == ADDED
+    assert coalesce(ADDED, REMOVED) == ADDED
+    assert coalesce(REMOVED, ADDED) == CHANGED
+    assert coalesce(CHANGED, REMOVED) == REMOVED
+
+
+async def next_message(queue: asyncio.Queue) -> dict:
+    return await asyncio.wait_for(queue.get(), timeout=5)
+
+
+@pytest.mark.asyncio
+async def test_watcher_pushes_coalesced_delta(tmp_path):
+    changed_dirs = []
+    watcher = DirectoryWatcher(on_change=changed_dirs.append, coalesce_delay=0.05)
+    queue: asyncio.Queue = asyncio.Queue()
+
+    (tmp_path / "old.txt").write_text("x")
+    (tmp_path / "keep.txt").write_text("x")
+
+    try:
+        await watcher.subscribe(tmp_path, queue.put_nowait)
+
+        (tmp_path / "new.txt").write_text("hello")
+        (tmp_path / "new.txt").write_text("hello again")
+        (tmp_path / "old.txt").unlink()
+        (tmp_path / "keep.txt").write_text("longer")
+        (tmp_path / "tmp.part").write_text("x")
+        (tmp_path / "tmp.part").unlink()
+
+        delta = await next_message(queue)
+    finally:
+        watcher.close()
+
+    assert delta["type"] == "delta"
+    assert [e["name"] for e in delta["added"]] == ["new.txt"]
+    assert delta["added"][0]["size"] == len("hello again")
+    assert delta["removed"] == [str(tmp_path / "old.txt")]
+    assert [e["name"] for e in delta["changed"]] == ["keep.txt"]
+    assert changed_dirs == [str(tmp_path)]
+
+
+@pytest.mark.asyncio
+async def test_watcher_reports_deleted_directory(tmp_path):
+    watched = tmp_path / "dir"
+    watched.mkdir()
+
+    watcher = DirectoryWatcher(coalesce_delay=0.05)
+    queue: asyncio.Queue = asyncio.Queue()
+
+    try:
+        await watcher.subscribe(watched, queue.put_nowait)
+        watched.rmdir()
+
+        message = await next_message(queue)
+    finally:
+        watcher.close()
+
+    assert message == {"type": "gone", "path": str(watched)}
+    assert watcher.watched_dirs() == []
+
+
+@pytest.mark.asyncio
+async def test_unsubscribe_removes_watch(tmp_path):
+    watcher = DirectoryWatcher()
+    callback = lambda _: None
+
+    try:
+        await watcher.subscribe(tmp_path, callback)
+        await watcher.subscribe(tmp_path, print)
+        watcher.unsubscribe(tmp_path, callback)
+        assert watcher.watched_dirs() == [str(tmp_path)]
+
+        watcher.unsubscribe(tmp_path, print)
+        assert watcher.watched_dirs() == []
+    finally:
+        watcher.close()
+
+
+@pytest.mark.asyncio
+async def test_watcher_reads_changes_off_the_loop(tmp_path):
+    calls = []
+
+    async def run(func, *args):
+        calls.append(func.__name__)
+        return await asyncio.to_thread(func, *args)
+
+    watcher = DirectoryWatcher(coalesce_delay=0.05, run=run)
+    queue: asyncio.Queue = asyncio.Queue()
+
+    try:
+        await watcher.subscribe(tmp_path, queue.put_nowait)
+        (tmp_path / "new.txt").write_text("hello")
+
+        delta = await next_message(queue)
+    finally:
+        watcher.close()
+
+    assert calls == ["add_watch", "build_delta"]
+    assert [e["name"] for e in delta["added"]] == ["new.txt"]
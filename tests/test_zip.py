@@ -1,11 +1,18 @@
+import io
+import os
 import zipfile
 
+from zipstream import ZipStreamWriter, ZIP_WRITE_SIZE
+
+
+def read_zip(chunks) -> zipfile.ZipFile:
+    return zipfile.ZipFile(io.BytesIO(b"".join(chunks)))
+
+
 def test_stream_zip_single_file(fs):
     fs.create_file("a.txt", b"zipme")
 
-    buffer = fs.stream_zip(["a.txt"])
-
-    with zipfile.ZipFile(buffer) as z:
+    with read_zip(fs.stream_zip(["a.txt"])) as z:
         assert z.namelist() == ["a.txt"]
         assert z.read("a.txt") == b"zipme"
 
@@ -15,8 +22,56 @@ def test_stream_zip_directory(fs):
     fs.create_file("docs/a.txt", b"A")
     fs.create_file("docs/b.txt", b"B")
 
-    buffer = fs.stream_zip(["docs"])
-
-    with zipfile.ZipFile(buffer) as z:
+    with read_zip(fs.stream_zip(["docs"])) as z:
         names = set(z.namelist())
         assert names == {"docs/a.txt", "docs/b.txt"}
+
+
+def test_stream_zip_chunks_are_bounded(fs):
+    data = os.urandom(1024 * 1024) + bytes(3 * 1024 * 1024)
+    fs.create_file("clips/clip.mp4", data)
+    fs.create_file("clips/empty.txt", b"")
+    fs.create_file("clips/ünïcode.txt", b"text")
+
+    chunks = list(fs.stream_zip(["clips"]))
+
+    # Nothing close to the file size is ever buffered
+    assert max(map(len, chunks)) < 2 * ZIP_WRITE_SIZE
+    with read_zip(chunks) as z:
+        assert z.testzip() is None
+        assert z.read("clips/clip.mp4") == data
+        assert z.read("clips/empty.txt") == b""
+        assert z.read("clips/ünïcode.txt") == b"text"
+
+
+def test_zip64_members(tmp_path):
+    path = tmp_path / "save.bin"
+    path.write_bytes(b"state" * 1000)
+
+    writer = ZipStreamWriter()
+    chunks = []
+    with open(path, "rb") as f:
+        chunks += writer.add_file(f, "save.bin", os.fstat(f.fileno()), force_zip64=True)
+    with open(path, "rb") as f:
+        chunks += writer.add_file(f, "stored.bin", os.fstat(f.fileno()), compress=False)
+    chunks += writer.finish()
+
+    with read_zip(chunks) as z:
+        assert z.testzip() is None
+        assert z.getinfo("stored.bin").compress_type == zipfile.ZIP_STORED
+        assert z.read("save.bin") == z.read("stored.bin") == b"state" * 1000
+
+
+def test_file_growing_while_zipped(tmp_path):
+    path = tmp_path / "game.log"
+    path.write_bytes(b"line\n" * 10)
+
+    writer = ZipStreamWriter()
+    with open(path, "rb") as f:
+        st = os.fstat(f.fileno())
+        with open(path, "ab") as log:
+            log.write(b"more\n")
+        chunks = list(writer.add_file(f, "game.log", st)) + list(writer.finish())
+
+    with read_zip(chunks) as z:
+        assert z.read("game.log") == b"line\n" * 10